@@ -0,0 +1,168 @@
+"""
+Ограничение частоты запросов пользователей
+
+Каждый пользователь получает корзину токенов: емкость burst, пополнение
+rate токенов в секунду. Действие списывает из корзины свою стоимость
+(статистика и поиск по каталогу дороже нажатия кнопки). Дорогие действия
+дополнительно ограничены общим числом одновременно выполняемых - это
+защищает БД, даже если запросы идут от многих пользователей сразу.
+
+Отказ не должен стоить дороже самого запроса: ответ "подождите" уходит
+пользователю не чаще одного раза за notice_interval, остальные отказы
+молча отбрасываются.
+
+Корзины хранятся в ограниченном LRU. Корзина, простоявшая дольше времени
+полного пополнения, ничем не отличается от новой и удаляется.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Итоги проверки
+ADMITTED = 'admitted'
+RATE_LIMITED = 'rate_limited'
+BUSY = 'busy'
+
+
+def parse_costs(text):
+    """Стоимости действий из строки "stats=5,search=3" """
+    costs = {}
+    for item in (text or '').split(','):
+        name, sep, value = item.partition('=')
+        if sep and name.strip():
+            costs[name.strip()] = float(value)
+    return costs
+
+
+def parse_names(text):
+    return frozenset(name.strip() for name in (text or '').split(',') if name.strip())
+
+
+class Decision:
+    """Результат проверки: истинен, если действие разрешено"""
+
+    __slots__ = ('status', 'retry_after', 'notify')
+
+    def __init__(self, status, retry_after=0.0, notify=False):
+        self.status = status
+        # Через сколько секунд в корзине наберется нужное число токенов
+        self.retry_after = retry_after
+        # Отправлять ли пользователю ответ об отказе
+        self.notify = notify
+
+    def __bool__(self):
+        return self.status == ADMITTED
+
+    def __repr__(self):
+        return f"Decision({self.status!r}, retry_after={self.retry_after:.1f})"
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated', 'noticed_at')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.noticed_at = None
+
+
+class AdmissionControl:
+    """Корзины токенов по пользователям и общий лимит дорогих действий"""
+
+    def __init__(self, rate=1.0, burst=10.0, costs=None, expensive=(), max_concurrent=4,
+                 wait_timeout=0.5, notice_interval=10.0, max_users=50000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.costs = dict(costs or {})
+        self.expensive = frozenset(expensive)
+        self.wait_timeout = wait_timeout
+        self.notice_interval = notice_interval
+        self.max_users = max_users
+        # Через это время простоя корзина снова полна и хранить ее незачем
+        self.idle_ttl = max(burst / rate if rate > 0 else float('inf'), notice_interval)
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.counters = {ADMITTED: 0, RATE_LIMITED: 0, BUSY: 0}
+
+    def cost(self, action):
+        return self.costs.get(action, 1.0)
+
+    def _expire(self, now):
+        """Удаление простаивающих корзин и корзин сверх max_users (вызывать под блокировкой)"""
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if len(buckets) <= self.max_users and now - oldest.updated < self.idle_ttl:
+                break
+            buckets.popitem(last=False)
+
+    def _take(self, user_id, cost):
+        """Списание токенов; None - успешно, иначе Decision с отказом"""
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = _Bucket(self.burst, now)
+            else:
+                self._buckets.move_to_end(user_id)
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._expire(now)
+
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return None
+            retry_after = (cost - bucket.tokens) / self.rate if self.rate > 0 else float('inf')
+            return Decision(RATE_LIMITED, retry_after, self._should_notify(bucket, now))
+
+    def _refund(self, user_id, cost):
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is not None:
+                bucket.tokens = min(self.burst, bucket.tokens + cost)
+
+    def _should_notify(self, bucket, now):
+        if bucket.noticed_at is not None and now - bucket.noticed_at < self.notice_interval:
+            return False
+        bucket.noticed_at = now
+        return True
+
+    def _notify_busy(self, user_id):
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            return bucket is not None and self._should_notify(bucket, now)
+
+    @contextmanager
+    def admit(self, user_id, action):
+        """Проверка действия пользователя; слот дорогого действия освобождается на выходе.
+
+        Возвращает Decision: в теле with действие выполняется, только если
+        решение истинно.
+        """
+        cost = self.cost(action)
+        decision = self._take(user_id, cost)
+        slot = False
+        if decision is None:
+            if action in self.expensive:
+                slot = self._slots.acquire(timeout=self.wait_timeout)
+                if not slot:
+                    # Действие не выполнено - токены возвращаются
+                    self._refund(user_id, cost)
+                    decision = Decision(BUSY, self.wait_timeout, self._notify_busy(user_id))
+            if decision is None:
+                decision = Decision(ADMITTED)
+        with self._lock:
+            self.counters[decision.status] += 1
+        try:
+            yield decision
+        finally:
+            if slot:
+                self._slots.release()
+
+    def __len__(self):
+        return len(self._buckets)
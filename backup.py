@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Резервные копии базы данных без остановки бота
+
+Копия снимается через online backup API SQLite небольшими порциями
+страниц с паузами между ними. В режиме WAL на время копирования
+открывается транзакция чтения: она фиксирует снимок БД, писатели при
+этом не блокируются, а их изменения не заставляют SQLite начинать
+копирование заново. Без WAL при перезапусках копирования порция
+увеличивается, чтобы копия все-таки завершилась.
+
+Каждая копия сначала пишется во временный файл, проверяется
+PRAGMA integrity_check и только потом получает имя
+<имя БД>-<дата-время>.db. Старые копии сверх BACKUP_KEEP удаляются.
+
+Запуск:
+    python backup.py create             # снять копию сейчас
+    python backup.py list               # список копий
+    python backup.py verify FILE        # проверить копию
+    python backup.py restore FILE       # восстановить БД из копии (бот должен быть остановлен)
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Сколько перезапусков копирования допускается, прежде чем порция увеличится
+MAX_RESTARTS = 3
+
+
+class BackupRestarted(Exception):
+    """Источник слишком часто меняется во время копирования"""
+
+
+def _copy(source, target, pages, pause):
+    """Копирование source -> target порциями по pages страниц с паузой между ними"""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise BackupRestarted(f"копирование начиналось заново {state['restarts']} раз")
+        state['remaining'] = remaining
+        if remaining and pause:
+            # sleep в backup() срабатывает только при SQLITE_BUSY, паузу делаем сами
+            time.sleep(pause)
+
+    source.backup(target, pages=pages, progress=progress)
+
+
+def copy_database(source_path, target_path, pages=256, pause=0.005, busy_timeout=10):
+    """Онлайн-копия БД; без WAL при частых перезапусках порция увеличивается в 4 раза"""
+    source = sqlite3.connect(source_path, timeout=busy_timeout, isolation_level=None)
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        while True:
+            target = sqlite3.connect(target_path)
+            try:
+                if wal:
+                    # Снимок БД на все время копирования (писателей не блокирует)
+                    source.execute("BEGIN")
+                    source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                _copy(source, target, pages, pause)
+                # Копия - один самодостаточный файл, без -wal/-shm
+                target.execute("PRAGMA journal_mode=DELETE")
+                return
+            except BackupRestarted as e:
+                # pages=-1 - все страницы за один шаг
+                new_pages = pages * 4 if 0 < pages < 65536 else -1
+                logger.info("Резервная копия: %s, порция %s -> %s страниц", e, pages, new_pages)
+                pages = new_pages
+            finally:
+                if source.in_transaction:
+                    source.execute("COMMIT")
+                target.close()
+    finally:
+        source.close()
+
+
+def verify(path):
+    """Проверка копии: список ошибок integrity_check (пустой - копия целая)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if rows == ['ok'] else rows
+
+
+def list_backups(db_path, backup_dir):
+    """Копии БД от новых к старым"""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return sorted(glob.glob(os.path.join(backup_dir, f"{stem}-????????-??????.db")), reverse=True)
+
+
+def create_backup(db_path, backup_dir, keep=7, pages=256, pause=0.005, busy_timeout=10):
+    """Снятие, проверка и ротация копии; возвращает путь к новой копии"""
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(backup_dir, f"{stem}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    tmp_path = path + '.tmp'
+
+    started = time.perf_counter()
+    try:
+        copy_database(db_path, tmp_path, pages, pause, busy_timeout)
+        errors = verify(tmp_path)
+        if errors:
+            raise sqlite3.DatabaseError(f"копия не прошла integrity_check: {'; '.join(errors[:5])}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    for old in list_backups(db_path, backup_dir)[keep:]:
+        os.remove(old)
+        logger.info("Удалена старая резервная копия %s", old)
+
+    logger.info("Резервная копия %s (%.1f МБ) за %.1f с", path, os.path.getsize(path) / 2 ** 20,
+                time.perf_counter() - started)
+    return path
+
+
+def restore(backup_path, db_path, backup_dir=None):
+    """Восстановление БД из проверенной копии.
+
+    Текущая БД перед восстановлением сохраняется в backup_dir (если указан).
+    Запись идет через backup API, поэтому WAL-файлы текущей БД остаются
+    согласованными.
+    """
+    errors = verify(backup_path)
+    if errors:
+        raise sqlite3.DatabaseError(f"копия повреждена: {'; '.join(errors[:5])}")
+    if backup_dir and os.path.exists(db_path):
+        stem, ext = os.path.splitext(os.path.basename(db_path))
+        saved = os.path.join(backup_dir, f"{stem}-before-restore-{datetime.now():%Y%m%d-%H%M%S}{ext}")
+        os.makedirs(backup_dir, exist_ok=True)
+        copy_database(db_path, saved, pages=-1)
+        logger.info("Текущая БД сохранена в %s", saved)
+
+    source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    target = sqlite3.connect(db_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    logger.info("БД %s восстановлена из %s", db_path, backup_path)
+
+
+class BackupScheduler:
+    """Фоновый поток, снимающий копию раз в interval секунд"""
+
+    def __init__(self, db_path, backup_dir, interval, keep=7, pages=256, pause=0.005, busy_timeout=10):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.busy_timeout = busy_timeout
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        try:
+            return create_backup(self.db_path, self.backup_dir, self.keep, self.pages, self.pause,
+                                 self.busy_timeout)
+        except Exception as e:
+            logger.error("Ошибка резервного копирования: %s", e)
+            return None
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='db-backup', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка; начатое копирование дожидается завершения"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    import config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=config.DB_PATH, help="путь к файлу БД")
+    parser.add_argument('--dir', default=config.BACKUP_DIR, help="каталог резервных копий")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('create', help="снять копию")
+    commands.add_parser('list', help="список копий")
+    commands.add_parser('verify', help="проверить копию").add_argument('file')
+    commands.add_parser('restore', help="восстановить БД из копии").add_argument('file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'create':
+        path = create_backup(args.db, args.dir, config.BACKUP_KEEP, config.BACKUP_STEP_PAGES,
+                             config.BACKUP_STEP_PAUSE, config.DB_BUSY_TIMEOUT)
+        print(f"✅ Резервная копия: {path}")
+    elif args.command == 'list':
+        for path in list_backups(args.db, args.dir):
+            print(f"💾 {path} ({os.path.getsize(path) / 2 ** 20:.1f} МБ)")
+    elif args.command == 'verify':
+        errors = verify(args.file)
+        if errors:
+            print(f"❌ Копия повреждена: {'; '.join(errors[:5])}")
+            return 1
+        print("✅ Копия целая")
+    elif args.command == 'restore':
+        restore(args.file, args.db, args.dir)
+        print(f"✅ БД {args.db} восстановлена из {args.file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Влияние резервного копирования на задержку обработчиков
+
+Поток нагрузки непрерывно выполняет операции записи и чтения бота
+(create_order, update_user_activity, get_store_statistics) и замеряет их
+время: сначала без копирования, затем во время копирования с разными
+размерами порции (копирование повторяется, пока идет замер). Выводит
+перцентили задержки и среднее время одной копии.
+
+Запуск:
+    python benchmarks/bench_backup.py --products 100000 --orders 400000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backup  # noqa: E402
+import computer_parts_bot  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _workload(stop, samples):
+    bot = computer_parts_bot
+    user_id = 3 * 10 ** 9
+    operations = [
+        lambda: bot.create_order(user_id, 'bench', [{'id': 1, 'name': 'x', 'price': 1, 'quantity': 1}], 1),
+        lambda: bot.update_user_activity(user_id, 'bench', 'bench', None),
+        lambda: bot.get_store_statistics(use_cache=False),
+    ]
+    n = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        operations[n % len(operations)]()
+        samples.append((time.perf_counter() - started) * 1000)
+        n += 1
+        time.sleep(0.002)
+
+
+def measure(during, duration):
+    """Задержки операций за duration секунд, пока повторяется during() (None - без копирования).
+
+    Возвращает (отсортированные задержки, среднее время during() в секундах).
+    """
+    stop = threading.Event()
+    samples = []
+    thread = threading.Thread(target=_workload, args=(stop, samples))
+    thread.start()
+    started = time.perf_counter()
+    runs = 0
+    if during is None:
+        time.sleep(duration)
+    else:
+        while time.perf_counter() - started < duration:
+            during()
+            runs += 1
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    samples.sort()
+    return samples, elapsed / runs if runs else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=400000)
+    parser.add_argument('--db', default='scaling_data/backup_bench.db')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    if not os.path.exists(args.db):
+        print("⏳ Генерация БД...")
+        generate(args.db, args.products, args.products, args.orders, quiet=True)
+    computer_parts_bot.DB_PATH = args.db
+    computer_parts_bot.setup_database()
+    print(f"💾 БД: {os.path.getsize(args.db) / 2 ** 20:.0f} МБ")
+
+    target_dir = tempfile.mkdtemp()
+    target = os.path.join(target_dir, 'copy.db')
+    cases = [
+        ('без копирования', None),
+        ('порция 256 стр., пауза 5 мс', lambda: backup.copy_database(args.db, target, 256, 0.005)),
+        ('порция 1024 стр., без паузы', lambda: backup.copy_database(args.db, target, 1024, 0)),
+        ('вся БД одним шагом', lambda: backup.copy_database(args.db, target, -1, 0)),
+    ]
+
+    print()
+    print("| Режим | операций | p50 мс | p99 мс | max мс | одна копия, с |")
+    print("|---|---|---|---|---|---|")
+    for name, during in cases:
+        samples, copy_seconds = measure(during, 5.0)
+        copy_time = f"{copy_seconds:.2f}" if copy_seconds else "-"
+        print(f"| {name} | {len(samples)} | {_percentile(samples, 0.5):.2f} | {_percentile(samples, 0.99):.2f}"
+              f" | {samples[-1]:.2f} | {copy_time} |")
+        if os.path.exists(target):
+            os.remove(target)
+    os.rmdir(target_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Размер и скорость разбора корзины Web App
+
+Сравнивает прежний формат (JSON с полными позициями: id, название, цена,
+количество) с компактными строками cart_codec версий 1 и 2: размер
+сообщения sendData и время разбора (json.loads сообщения плюс
+decode_cart для компактных версий).
+
+Запуск:
+    python benchmarks/bench_cart_codec.py --items 100
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cart_codec import decode_cart, encode_cart  # noqa: E402
+
+# Ограничение Telegram.WebApp.sendData
+SEND_DATA_LIMIT = 4096
+
+
+def make_cart(rng, items):
+    cart = []
+    for product_id in sorted(rng.sample(range(1, 100000), items)):
+        cart.append({
+            'id': product_id,
+            'name': f"ASUS ROG Strix GeForce RTX 4070 Ti OC #{product_id}",
+            'price': float(rng.randrange(1000, 200000)),
+            'quantity': rng.randint(1, 3),
+        })
+    return cart
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100)
+    args = parser.parse_args()
+
+    cart = make_cart(random.Random(1), args.items)
+    entries = [(item['id'], item['quantity']) for item in cart]
+    key = 'f3b1c2d4-0000-4000-8000-123456789abc'
+    messages = {
+        'JSON (прежний)': json.dumps({'action': 'create_order',
+                                      'order_data': {'items': cart, 'total': 1.0, 'idempotency_key': key}},
+                                     ensure_ascii=False),
+    }
+    for version in ('1', '2'):
+        messages[f"cart_codec v{version}"] = json.dumps({'action': 'create_order', 'order_data': {
+            'cart': encode_cart(entries, version), 'idempotency_key': key}})
+
+    def parse(message):
+        order_data = json.loads(message)['order_data']
+        if 'cart' in order_data:
+            return decode_cart(order_data['cart'])
+        return [(item['id'], item['quantity']) for item in order_data['items']]
+
+    print(f"| Формат ({args.items} позиций) | байт | в лимите 4096 | разбор, мкс |")
+    print("|---|---|---|---|")
+    for name, message in messages.items():
+        size = len(message.encode('utf-8'))
+        assert sorted(parse(message)) == sorted(entries)
+        number = 2000
+        seconds = min(timeit.repeat(lambda: parse(message), number=number, repeat=5)) / number
+        print(f"| {name} | {size} | {'да' if size <= SEND_DATA_LIMIT else 'нет'} | {seconds * 1e6:.1f} |")
+
+
+if __name__ == '__main__':
+    main()
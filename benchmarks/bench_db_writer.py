@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Очередь записи: фиксаций в секунду без очереди и с групповой фиксацией
+
+Несколько потоков одновременно оформляют заказы (create_order) и
+отмечают активность пользователей (update_user_activity), как обработчики
+под нагрузкой. Сравниваются режимы:
+    без очереди     каждая запись - свое соединение и свой COMMIT
+    очередь FULL    поток записи, группы, synchronous=FULL
+    очередь NORMAL  то же, synchronous=NORMAL
+    очередь FULL + задержка  группа ждет операции до --delay-ms
+Выводятся заказов в секунду, число транзакций, средний размер группы,
+задержка оформления заказа (p50/p99) и число ошибок.
+
+Запуск:
+    python benchmarks/bench_db_writer.py --threads 16 --orders 200
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+
+ITEMS = [{'id': 1, 'name': 'bench', 'price': 1, 'quantity': 1}]
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _client(bot, user_id, orders, latencies, errors):
+    for _ in range(orders):
+        bot.update_user_activity(user_id, 'bench', 'Bench', '')
+        started = time.perf_counter()
+        order_id = bot.create_order(user_id, 'bench', ITEMS, 1, idempotency_key=str(uuid.uuid4()))
+        latencies.append((time.perf_counter() - started) * 1000)
+        if order_id is None:
+            errors.append(user_id)
+
+
+def run(bot, threads, orders, writer_settings):
+    """Один прогон; writer_settings - (synchronous, задержка в мс) или None без очереди"""
+    writer = None
+    if writer_settings is not None:
+        bot.config.DB_WRITER_SYNCHRONOUS, bot.config.DB_WRITER_MAX_DELAY_MS = writer_settings
+        writer = bot.start_db_writer()
+
+    latencies = []
+    errors = []
+    clients = [threading.Thread(target=_client, args=(bot, 10 ** 6 + i, orders, latencies, errors))
+               for i in range(threads)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    if writer is not None:
+        # Дописывание отметок активности входит в замер
+        bot.stop_db_writer()
+        commits = writer.commits
+    else:
+        commits = threads * orders * 2
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = threads * orders
+    return {
+        'orders': total / elapsed,
+        'commits': commits,
+        'group': total * 2 / max(commits, 1),
+        'p50': _percentile(latencies, 0.5),
+        'p99': _percentile(latencies, 0.99),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=200, help="заказов на поток")
+    parser.add_argument('--delay-ms', type=float, default=2.0)
+    parser.add_argument('--dir', default='scaling_data', help="каталог для БД (на реальном диске)")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    bot = computer_parts_bot
+    bot.DB_PATH = os.path.join(work_dir, 'writer.db')
+    bot.config.DB_WRITER_ENABLED = True
+    bot.setup_database()
+
+    modes = [
+        ('без очереди', None),
+        ('очередь FULL', ('FULL', 0)),
+        ('очередь NORMAL', ('NORMAL', 0)),
+        (f"очередь FULL + задержка {args.delay_ms:g} мс", ('FULL', args.delay_ms)),
+    ]
+    print(f"| Режим ({args.threads} потоков) | заказов/с | транзакций | операций на транзакцию "
+          f"| заказ p50, мс | заказ p99, мс | ошибок |")
+    print("|---|---|---|---|---|---|---|")
+    for name, settings in modes:
+        r = run(bot, args.threads, args.orders, settings)
+        print(f"| {name} | {r['orders']:.0f} | {r['commits']} | {r['group']:.1f} | {r['p50']:.2f} "
+              f"| {r['p99']:.2f} | {r['errors']} |")
+
+    shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Задержка inline-поиска
+
+Имитирует набор запросов по буквам ("r", "ry", "ryz", ...) по снимку
+каталога и выводит перцентили времени ответа на одно нажатие: с кэшем
+префиксов (повторяющиеся запросы) и с холодным кэшем (кэш очищается
+перед каждым нажатием - каждый запрос ищется по всему каталогу).
+Затем - задержка запросов во время фоновой перестройки индекса после
+полной смены снимка.
+
+Запуск:
+    python benchmarks/bench_inline.py --products 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CatalogSnapshot  # noqa: E402
+from catalog_memory import synthetic_rows  # noqa: E402
+from inline_search import InlineSearch, InlineSearchIndex  # noqa: E402
+
+WORDS = ['ryzen', 'rtx 4060', 'samsung', 'kingston', 'model 12', 'corsair', 'intel', 'asus', 'razer', 'msi']
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]  # noqa: E731
+    return (f"p50 {p(0.50):.3f} мс | p95 {p(0.95):.3f} мс | p99 {p(0.99):.3f} мс | max {samples[-1]:.3f} мс"
+            f" | среднее {statistics.mean(samples):.3f} мс")
+
+
+def typing_run(search, queries, before=None):
+    """Время ответа на каждое нажатие (before() вызывается перед нажатием)"""
+    samples = []
+    for word in queries:
+        for length in range(1, len(word) + 1):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            search(word[:length], 0, 20)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=300, help="число набранных запросов")
+    args = parser.parse_args()
+
+    products, categories = synthetic_rows(args.products)
+    snapshot = CatalogSnapshot(products, categories)
+    started = time.perf_counter()
+    index = InlineSearchIndex(snapshot)
+    print(f"Индекс на {args.products} товаров: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    rng = random.Random(1)
+    queries = [rng.choice(WORDS) for _ in range(args.sessions)]
+
+    samples = typing_run(index.search, queries)
+    print(f"С кэшем: нажатий {len(samples)}, попаданий в кэш {index.hits}, промахов {index.misses},"
+          f" id в кэше {index._cached_ids}")
+    print(f"  {percentiles(samples)}")
+
+    cold = InlineSearchIndex(snapshot)
+    samples = typing_run(cold.search, queries[:max(1, args.sessions // 10)], before=cold._cache.clear)
+    print(f"Холодный кэш: нажатий {len(samples)}, промахов {cold.misses}")
+    print(f"  {percentiles(samples)}")
+
+    # Полная смена снимка: запросы продолжают обслуживаться старым индексом
+    current = [snapshot]
+    search = InlineSearch(lambda: current[0])
+    search.index()
+    current[0] = CatalogSnapshot(products, categories)
+    started = time.perf_counter()
+    samples = []
+    while search.rebuilds == 0:
+        samples.extend(typing_run(search.search, [rng.choice(WORDS)]))
+    print(f"Во время перестройки ({(time.perf_counter() - started) * 1000:.0f} мс): нажатий {len(samples)}")
+    print(f"  {percentiles(samples)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Архивация заказов: размер таблицы и задержка запросов до и после
+
+Генерирует БД (generate_dataset.py, заказы за 3 года), замеряет размер
+orders с индексами и задержку горячих запросов: статистика магазина
+(без кэша), первая страница /myorders самого активного пользователя,
+оформление заказа. Затем переносит в архив заказы старше --days дней в
+завершенных статусах, параллельно оформляя заказы и замеряя их
+задержку, и повторяет замеры - сразу и после VACUUM.
+
+Запуск:
+    python benchmarks/bench_order_archive.py --products 20000 --orders 400000 --days 180
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+import order_archive  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+ITEMS = [{'id': 1, 'name': 'bench', 'price': 1, 'quantity': 1}]
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def timed(func, repeat):
+    """Медиана времени вызова в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return _percentile(samples, 0.5)
+
+
+def measure(bot, user_id):
+    conn = bot.get_db_connection()
+    sizes = order_archive.table_sizes(conn)
+    live = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    conn.close()
+    return {
+        'live': live,
+        'size': sizes.get('orders', 0) / 2 ** 20,
+        'stats': timed(lambda: bot.get_store_statistics(use_cache=False), 20),
+        'history': timed(lambda: bot.get_user_orders(user_id, None, 10), 200),
+        'insert': timed(lambda: bot.create_order(user_id, 'bench', ITEMS, 1), 200),
+    }
+
+
+def _writer(bot, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        bot.create_order(2 * 10 ** 9, 'bench', ITEMS, 1)
+        samples.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=400000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--db', default='scaling_data/archive_bench.db')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    if not os.path.exists(args.db):
+        print("⏳ Генерация БД...")
+        generate(args.db, args.products, args.products, args.orders, quiet=True)
+    work_dir = tempfile.mkdtemp()
+    work_db = os.path.join(work_dir, 'archive.db')
+    shutil.copy(args.db, work_db)
+    bot = computer_parts_bot
+    bot.DB_PATH = work_db
+    bot.setup_database()
+
+    conn = bot.get_db_connection()
+    user_id = conn.execute("SELECT user_id FROM users ORDER BY total_orders DESC LIMIT 1").fetchone()[0]
+    newest = conn.execute("SELECT MAX(created_at) FROM orders").fetchone()[0]
+    conn.close()
+    before = order_archive.cutoff(args.days, datetime.strptime(newest, '%Y-%m-%d %H:%M:%S'))
+    statuses = ['delivered', 'cancelled']
+
+    results = [('до архивации', measure(bot, user_id))]
+
+    stop = threading.Event()
+    samples = []
+    writer = threading.Thread(target=_writer, args=(bot, stop, samples))
+    writer.start()
+    started = time.perf_counter()
+    moved = order_archive.archive_orders(bot.write_transaction, bot.get_db_connection, before, statuses,
+                                         args.batch_size, 0.05)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    samples.sort()
+    print(f"🗄️ Перенесено {moved} заказов за {elapsed:.1f} с (пачка {args.batch_size}); оформление заказа "
+          f"во время переноса: p50 {_percentile(samples, 0.5):.2f} мс, p99 {_percentile(samples, 0.99):.2f} мс, "
+          f"max {samples[-1]:.2f} мс")
+
+    results.append(('после архивации', measure(bot, user_id)))
+    started = time.perf_counter()
+    order_archive.compact(bot.get_db_connection)
+    print(f"🧹 VACUUM за {time.perf_counter() - started:.1f} с")
+    results.append(('после VACUUM', measure(bot, user_id)))
+    print()
+    print("| Состояние | заказов в orders | orders + индексы, МБ | статистика, мс | /myorders, мс "
+          "| оформление заказа, мс |")
+    print("|---|---|---|---|---|---|")
+    for name, r in results:
+        print(f"| {name} | {r['live']} | {r['size']:.1f} | {r['stats']:.2f} | {r['history']:.3f} | {r['insert']:.2f} |")
+
+    shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
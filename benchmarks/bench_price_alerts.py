@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Сопоставление подписок при полном обновлении цен каталога
+
+Генерирует БД (generate_dataset.py), создает подписки со случайными
+порогами и применяет обновление цен и наличия для всех товаров сразу,
+как при выгрузке прайса поставщика. Выводит время пакета и число
+поставленных в очередь уведомлений.
+
+Запуск:
+    python benchmarks/bench_price_alerts.py --products 100000 --subscriptions 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+import price_alerts  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+
+def create_subscriptions(conn, rng, count, products):
+    """Подписки: порог на 5-20% ниже текущей цены, часть - только на наличие"""
+    now = int(time.time())
+    seen = set()
+    rows = []
+    while len(rows) < count:
+        product_id, price, _ = rng.choice(products)
+        user_id = 10 ** 9 + rng.randrange(max(1, count // 5))
+        if (user_id, product_id) in seen:
+            continue
+        seen.add((user_id, product_id))
+        max_price = round(price * rng.uniform(0.80, 0.95)) if rng.random() < 0.8 else None
+        rows.append((user_id, product_id, max_price, int(rng.random() < 0.5), now))
+    with conn:
+        conn.executemany(
+            "INSERT INTO subscriptions (user_id, product_id, max_price, notify_in_stock, created_at)"
+            " VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+
+def price_refresh(rng, products):
+    """Новый прайс: у трети товаров меняется цена (от -25% до +10%), у части - наличие"""
+    updates = []
+    for product_id, price, in_stock in products:
+        if rng.random() < 0.33:
+            price = round(price * rng.uniform(0.75, 1.10))
+        if rng.random() < 0.05:
+            in_stock = 1 - in_stock
+        updates.append((product_id, price, in_stock))
+    return updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--subscriptions', type=int, default=1000000)
+    parser.add_argument('--db', default='scaling_data/price_alerts.db')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    generate(args.db, args.products, 1000, 1000, quiet=True)
+    computer_parts_bot.DB_PATH = args.db
+    computer_parts_bot.setup_database()
+
+    rng = random.Random(7)
+    conn = sqlite3.connect(args.db)
+    products = conn.execute("SELECT id, price, in_stock FROM products").fetchall()
+    started = time.perf_counter()
+    create_subscriptions(conn, rng, args.subscriptions, products)
+    conn.close()
+    print(f"Подписок: {args.subscriptions}, создание {time.perf_counter() - started:.1f} с")
+
+    updates = price_refresh(rng, products)
+    started = time.perf_counter()
+    changed, queued = computer_parts_bot.apply_catalog_batch(updates)
+    elapsed = time.perf_counter() - started
+    print(f"Обновление {len(updates)} товаров: изменено {len(changed)}, уведомлений {queued},"
+          f" {elapsed * 1000:.0f} мс")
+
+    started = time.perf_counter()
+    computer_parts_bot.apply_catalog_batch(updates)
+    print(f"Повтор того же прайса (нет изменений): {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Инкрементальная синхронизация прайса поставщика
+
+Генерирует БД (generate_dataset.py) и прайс по всем товарам, в котором
+у доли товаров изменены цена или остаток. Сравнивает:
+  - полную запись прайса (UPDATE каждой строки, как при простом импорте);
+  - supplier_sync.sync_feed (пишутся только строки с изменившимся хэшем);
+  - обновление снимка каталога в памяти: полная перезагрузка против
+    частичного обновления по журналу изменений.
+
+Запуск:
+    python benchmarks/bench_supplier_sync.py --products 100000 --changed 0.01
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog  # noqa: E402
+import computer_parts_bot  # noqa: E402
+import supplier_sync  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+
+def make_feed(rows, rng, fraction):
+    """Записи прайса; у доли fraction товаров меняется цена или остаток"""
+    feed = []
+    changed = set()
+    for product_id, price, stock_quantity, in_stock in rows:
+        if rng.random() < fraction:
+            changed.add(product_id)
+            if rng.random() < 0.5:
+                price = round(price * rng.uniform(0.85, 1.1), 2)
+            else:
+                stock_quantity += rng.randint(1, 20)
+        feed.append({'id': product_id, 'price': price, 'stock_quantity': stock_quantity,
+                     'in_stock': in_stock})
+    return feed, changed
+
+
+def full_import(feed):
+    """Простой импорт: UPDATE всех строк прайса одной транзакцией"""
+    with computer_parts_bot.write_transaction() as conn:
+        conn.executemany(
+            "UPDATE products SET price = ?, stock_quantity = ?, in_stock = ? WHERE id = ?",
+            ((r['price'], r['stock_quantity'], r['in_stock'], r['id']) for r in feed)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--changed', type=float, default=0.01, help="доля измененных товаров")
+    parser.add_argument('--db', default='scaling_data/sync_bench.db')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    if not os.path.exists(args.db):
+        print("⏳ Генерация БД...")
+        generate(args.db, args.products, 1000, 1000, quiet=True)
+    work_dir = tempfile.mkdtemp()
+    work_db = os.path.join(work_dir, 'sync.db')
+    shutil.copy(args.db, work_db)
+    computer_parts_bot.DB_PATH = work_db
+    computer_parts_bot.setup_database()
+
+    conn = sqlite3.connect(work_db)
+    rows = conn.execute("SELECT id, price, stock_quantity, in_stock FROM products").fetchall()
+    conn.close()
+    rng = random.Random(7)
+    sync = supplier_sync.sync_feed
+    write, connect = computer_parts_bot.write_transaction, computer_parts_bot.get_db_connection
+
+    started = time.perf_counter()
+    report = sync([dict(zip(('id', 'price', 'stock_quantity', 'in_stock'), r)) for r in rows], write, connect)
+    print(f"🧮 Первый прогон (хэши по текущим значениям): {time.perf_counter() - started:.2f} с, "
+          f"изменено {len(report.changed_ids)}")
+
+    replica = catalog.CatalogReplica(connect, check_interval=0)
+    replica.refresh(force=True)
+    feed, expected = make_feed(rows, rng, args.changed)
+
+    report = sync(feed, write, connect)
+    print(f"🔄 Инкрементальная синхронизация: {report.elapsed:.2f} с, изменено {len(report.changed_ids)}"
+          f" (ожидалось {len(expected)}), транзакций {report.transactions}")
+
+    started = time.perf_counter()
+    snapshot = replica.refresh()
+    patch_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    replica.refresh(force=True)
+    full_ms = (time.perf_counter() - started) * 1000
+    print(f"🧠 Снимок каталога: частичное обновление {patch_ms:.1f} мс "
+          f"({len(snapshot.changed_ids or ())} товаров), полная перезагрузка {full_ms:.1f} мс")
+
+    feed, _ = make_feed(rows, rng, args.changed)
+    started = time.perf_counter()
+    full_import(feed)
+    print(f"📝 Полная запись прайса: {time.perf_counter() - started:.2f} с")
+
+    shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
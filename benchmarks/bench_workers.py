@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк многопроцессного режима
+
+Прогоняет синтетические обновления через Supervisor с реальными запросами
+к БД (статистика магазина и топ товаров) и выводит пропускную способность
+для разного числа рабочих процессов.
+
+Запуск:
+    python benchmarks/bench_workers.py --updates 2000 --workers 1 2 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+
+def _query_handler():
+    """Обработчик без Telegram: те же запросы и форматирование, что у /stats и /top"""
+    def handle(raw_update):
+        stats = computer_parts_bot.get_store_statistics(use_cache=False)
+        conn = computer_parts_bot.get_db_connection()
+        rows = conn.execute("""
+            SELECT p.name, p.price, p.rating, p.brand, c.name as category_name
+            FROM products p
+            JOIN categories c ON p.category_id = c.id
+            WHERE p.rating > 0
+            ORDER BY p.rating DESC, p.popularity DESC
+            LIMIT 10
+        """).fetchall()
+        conn.close()
+        text = "".join(f"{row['name']} {row['price']:,.0f}₽ {row['rating']}\n" for row in rows)
+        return len(text) + stats['total_products']
+
+    return handle
+
+
+def run(num_workers, num_updates):
+    supervisor = Supervisor(num_workers, handler_factory=_query_handler)
+    supervisor.start()
+    time.sleep(0.5)  # запуск процессов не входит в замер
+
+    started = time.perf_counter()
+    for update_id in range(num_updates):
+        chat_id = 100000 + update_id % 997
+        supervisor.dispatch({'update_id': update_id, 'message': {'chat': {'id': chat_id}}})
+    supervisor.stop(timeout=600)
+    return num_updates / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--db', default=computer_parts_bot.DB_PATH)
+    args = parser.parse_args()
+
+    computer_parts_bot.DB_PATH = args.db
+    computer_parts_bot.setup_database()
+
+    baseline = None
+    print(f"{'процессов':>10} {'обн./с':>10} {'ускорение':>10}")
+    for num_workers in args.workers:
+        throughput = run(num_workers, args.updates)
+        baseline = baseline or throughput
+        print(f"{num_workers:>10} {throughput:>10.0f} {throughput / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Память реплики каталога
+
+Сравнивает объем CatalogSnapshot со списком словарей (как после
+[dict(row) for row in cursor]) для одного и того же набора товаров.
+
+Запуск:
+    python benchmarks/catalog_memory.py --products 100000
+    python benchmarks/catalog_memory.py --db computer_parts.db
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CatalogSnapshot  # noqa: E402
+
+BRANDS = ['AMD', 'Intel', 'ASUS', 'MSI', 'GIGABYTE', 'Kingston', 'Corsair', 'Samsung', 'NZXT', 'Razer']
+
+
+def synthetic_rows(count, seed=42):
+    """Товары и категории без обращения к БД"""
+    rng = random.Random(seed)
+    categories = [{'id': i, 'name': f'Категория {i}', 'description': '', 'icon': '📦', 'slug': f'cat{i}'}
+                  for i in range(1, 14)]
+    products = []
+    for product_id in range(1, count + 1):
+        brand = rng.choice(BRANDS)
+        products.append({
+            'id': product_id,
+            'name': f'{brand} Model {product_id}',
+            'description': 'Описание товара для тестирования памяти',
+            'price': round(rng.uniform(1000, 200000), 0),
+            'category_id': rng.randint(1, 13),
+            'image_url': f'https://example.com/{product_id}.jpg',
+            'specs': f'Параметр: {rng.randint(1, 64)} | Частота: {rng.randint(1000, 6000)} МГц',
+            'in_stock': rng.random() > 0.1,
+            'rating': round(rng.uniform(3, 5), 1),
+            'brand': brand,
+            'stock_quantity': rng.randint(0, 50),
+            'popularity': rng.randint(0, 500),
+        })
+    return products, categories
+
+
+def deep_size(rows):
+    """Размер списка словарей вместе с ключами-значениями"""
+    seen = set()
+    total = sys.getsizeof(rows)
+    for row in rows:
+        total += sys.getsizeof(row)
+        for value in row.values():
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--db', help="взять товары из БД вместо синтетических")
+    args = parser.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        conn.row_factory = sqlite3.Row
+        products = [dict(row) for row in conn.execute("SELECT * FROM products")]
+        categories = [dict(row) for row in conn.execute("SELECT * FROM categories")]
+        conn.close()
+    else:
+        products, categories = synthetic_rows(args.products)
+
+    started = time.perf_counter()
+    snapshot = CatalogSnapshot(products, categories)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    columnar = snapshot.memory_usage()
+    dicts = deep_size(products)
+    per_100k = 100000 / max(len(products), 1)
+
+    print(f"Товаров: {len(products)}, построение снимка: {build_ms:.0f} мс")
+    print(f"Снимок:            {columnar / 2 ** 20:8.1f} МБ ({columnar * per_100k / 2 ** 20:.1f} МБ на 100k)")
+    print(f"Список словарей:   {dicts / 2 ** 20:8.1f} МБ ({dicts * per_100k / 2 ** 20:.1f} МБ на 100k)")
+    print(f"Экономия:          {dicts / columnar:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
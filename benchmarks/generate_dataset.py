@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических данных магазина
+
+Создает БД с той же схемой, что и бот, и заполняет ее детерминированными
+данными (одинаковый --seed дает одинаковую БД): товары с характеристиками
+в формате "Ключ: Значение | ...", пользователи и заказы. Запись идет
+пакетами через executemany.
+
+Запуск:
+    python benchmarks/generate_dataset.py --db big.db --products 300000 --users 1000000 --orders 3000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+
+BATCH_SIZE = 20000
+
+# Шаблоны товаров по slug категории: бренды, модели, характеристики, диапазон цен
+CATEGORY_TEMPLATES = {
+    'cpu': (['AMD', 'Intel'], ['Ryzen 5 {n}600X', 'Ryzen 7 {n}700X', 'Ryzen 9 {n}900X', 'Core i5-{n}400F', 'Core i7-{n}700K'],
+            [('Сокет', ['AM5', 'AM4', 'LGA1700']), ('Ядра', ['6', '8', '12', '16']), ('Потоки', ['12', '16', '24', '32']),
+             ('Частота', ['3.8-5.1 ГГц', '4.2-5.4 ГГц', '4.5-5.7 ГГц']), ('TDP', ['65W', '105W', '125W'])],
+            (9000, 90000)),
+    'gpu': (['ASUS', 'MSI', 'GIGABYTE', 'Palit', 'Sapphire'], ['RTX {n}060', 'RTX {n}070 Ti', 'RTX {n}080', 'RX {n}700 XT', 'RX {n}800 XT'],
+            [('Память', ['8 ГБ GDDR6', '12 ГБ GDDR6X', '16 ГБ GDDR6']), ('Частота', ['2310 МГц', '2520 МГц', '2610 МГц']),
+             ('Разъемы', ['3xDP, 1xHDMI', '2xDP, 2xHDMI']), ('Длина', ['250 мм', '300 мм', '336 мм'])],
+            (20000, 200000)),
+    'motherboards': (['ASUS', 'MSI', 'GIGABYTE', 'ASRock'], ['B{n}50-A', 'X{n}70E', 'Z{n}90 Hero', 'B{n}60M'],
+                     [('Сокет', ['AM5', 'LGA1700']), ('Форм-фактор', ['ATX', 'mATX', 'ITX']), ('Память', ['DDR4', 'DDR5']),
+                      ('Слоты M.2', ['2', '3', '4']), ('Wi-Fi', ['Да', 'Нет'])],
+                     (8000, 70000)),
+    'ram': (['Kingston', 'Corsair', 'G.SKILL', 'Crucial'], ['FURY {n}GB', 'Vengeance {n}GB', 'Trident Z5 {n}GB'],
+            [('Объем', ['16 ГБ (2x8)', '32 ГБ (2x16)', '64 ГБ (2x32)']), ('Частота', ['3200 МГц', '5600 МГц', '6000 МГц']),
+             ('Тайминги', ['CL16', 'CL30', 'CL36'])],
+            (3000, 35000)),
+    'storage': (['Samsung', 'Western Digital', 'Crucial', 'Kingston'], ['{n}0 Pro 1TB', 'SN{n}80 2TB', 'P{n} Plus 1TB'],
+                [('Форм-фактор', ['M.2 2280', '2.5"']), ('Интерфейс', ['PCIe 4.0', 'PCIe 5.0', 'SATA III']),
+                 ('Скорость чтения', ['3500 МБ/с', '7000 МБ/с', '12000 МБ/с'])],
+                (3000, 45000)),
+    'psu': (['be quiet!', 'Seasonic', 'Corsair'], ['Pure Power {n}50W', 'Focus GX-{n}50', 'RM{n}50x'],
+            [('Мощность', ['650 Вт', '750 Вт', '850 Вт', '1000 Вт']), ('Сертификат', ['80+ Bronze', '80+ Gold', '80+ Platinum'])],
+            (5000, 30000)),
+    'cases': (['NZXT', 'Fractal Design', 'Lian Li'], ['H{n} Flow', 'North {n}', 'O11 Dynamic {n}'],
+              [('Форм-фактор', ['Mid-Tower', 'Full-Tower']), ('Вентиляторы', ['2x120 мм', '3x140 мм'])],
+              (4000, 25000)),
+    'cooling': (['DeepCool', 'Noctua', 'Arctic'], ['AK{n}20', 'NH-D{n}', 'Liquid Freezer {n}'],
+                [('Тип', ['Воздушное', 'Жидкостное']), ('TDP', ['180 Вт', '260 Вт', '300 Вт'])],
+                (2000, 15000)),
+    'monitors': (['Samsung', 'LG', 'AOC', 'Dell'], ['Odyssey G{n}', 'UltraGear {n}GP', 'Q{n}G2'],
+                 [('Диагональ', ['24"', '27"', '32"']), ('Разрешение', ['1920x1080', '2560x1440', '3840x2160']),
+                  ('Частота', ['144 Гц', '165 Гц', '240 Гц'])],
+                 (12000, 120000)),
+    'keyboards': (['Logitech', 'Razer', 'HyperX'], ['G Pro {n}', 'BlackWidow V{n}', 'Alloy Origins {n}'],
+                  [('Тип', ['Механическая', 'Мембранная']), ('Подсветка', ['RGB', 'Нет'])],
+                  (2000, 20000)),
+    'mice': (['Razer', 'Logitech', 'SteelSeries'], ['DeathAdder V{n}', 'G{n}02', 'Rival {n}'],
+             [('DPI', ['16000', '26000', '30000']), ('Вес', ['59 г', '63 г', '80 г'])],
+             (1500, 15000)),
+    'audio': (['HyperX', 'Sennheiser', 'JBL'], ['Cloud {n}', 'HD {n}60', 'Quantum {n}'],
+              [('Тип', ['Наушники', 'Колонки']), ('Подключение', ['USB', 'Bluetooth', '3.5 мм'])],
+              (2000, 40000)),
+    'network': (['TP-Link', 'ASUS', 'Keenetic'], ['Archer AX{n}', 'RT-AX{n}U', 'Giga {n}'],
+                [('Стандарт', ['Wi-Fi 6', 'Wi-Fi 6E', 'Wi-Fi 7']), ('Порты', ['4x1 Гбит', '4x2.5 Гбит'])],
+                (2000, 30000)),
+}
+
+FIRST_NAMES = ['Алексей', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга', 'Никита', 'Дарья']
+STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'delivered', 'delivered', 'cancelled']
+# Заказы старше месяца уже завершены
+CLOSED_STATUSES = ['delivered', 'delivered', 'delivered', 'delivered', 'cancelled']
+CLOSED_AFTER = 30 * 86400
+
+
+def _batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_products(rng, category_map, count):
+    """Строки товаров для INSERT"""
+    slugs = sorted(CATEGORY_TEMPLATES)
+    for number in range(count):
+        slug = slugs[number % len(slugs)]
+        brands, models, specs, (low, high) = CATEGORY_TEMPLATES[slug]
+        brand = rng.choice(brands)
+        model = rng.choice(models).format(n=rng.randint(1, 9))
+        spec_text = ' | '.join(f"{key}: {rng.choice(values)}" for key, values in specs)
+        yield (
+            f"{brand} {model} #{number + 1}",
+            f"{model} от {brand}",
+            float(rng.randint(low // 10, high // 10) * 10 - 1),
+            category_map[slug],
+            f"https://example.com/{slug}/{number + 1}.jpg",
+            spec_text,
+            rng.random() > 0.1,
+            round(rng.uniform(3.0, 5.0), 1),
+            brand,
+            rng.randint(0, 60),
+            rng.randint(0, 1000),
+        )
+
+
+def generate_users(rng, count, first_user_id):
+    for number in range(count):
+        name = rng.choice(FIRST_NAMES)
+        yield (first_user_id + number, f"user{first_user_id + number}", name, None)
+
+
+def generate_orders(rng, count, user_ids, products, totals, now):
+    """Строки заказов; totals накапливает число заказов и сумму по пользователю.
+
+    Заказы идут по возрастанию даты, как при оформлении (id растет вместе с created_at).
+    """
+    ages = sorted((rng.randint(0, 3 * 365 * 86400) for _ in range(count)), reverse=True)
+    for age in ages:
+        user_id = rng.choice(user_ids)
+        items = []
+        for product_id, name, price in rng.sample(products, rng.randint(1, 4)):
+            items.append({'id': product_id, 'name': name, 'price': price, 'quantity': rng.randint(1, 2)})
+        total = sum(item['price'] * item['quantity'] for item in items)
+        created_at = now - timedelta(seconds=age)
+        stat = totals.setdefault(user_id, [0, 0.0])
+        stat[0] += 1
+        stat[1] += total
+        items_count, summary = computer_parts_bot.order_summary(items)
+        status = rng.choice(CLOSED_STATUSES if age > CLOSED_AFTER else STATUSES)
+        yield (user_id, None, None, json.dumps(items), total, status,
+               'г. Москва', '', created_at.strftime('%Y-%m-%d %H:%M:%S'), items_count, summary)
+
+
+def generate(db_path, products, users, orders, seed=42, quiet=False):
+    """Создание и заполнение БД; возвращает время генерации в секундах"""
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+
+    computer_parts_bot.DB_PATH = db_path
+    computer_parts_bot.setup_database()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    category_map = dict(conn.execute("SELECT slug, id FROM categories"))
+
+    def log(text):
+        if not quiet:
+            print(text)
+
+    for batch in _batched(generate_products(rng, category_map, products)):
+        with conn:
+            conn.executemany("""
+                INSERT INTO products (name, description, price, category_id, image_url, specs,
+                                      in_stock, rating, brand, stock_quantity, popularity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+    log(f"📦 Товаров: {products}")
+
+    first_user_id = 10 ** 9
+    for batch in _batched(generate_users(rng, users, first_user_id)):
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)", batch
+            )
+    log(f"👤 Пользователей: {users}")
+
+    if orders and users:
+        catalog = conn.execute("SELECT id, name, price FROM products").fetchall()
+        user_ids = range(first_user_id, first_user_id + users)
+        totals = {}
+        for batch in _batched(generate_orders(rng, orders, user_ids, catalog, totals, now)):
+            with conn:
+                conn.executemany("""
+                    INSERT INTO orders (user_id, user_name, user_phone, products, total_price, status,
+                                        address, notes, created_at, items_count, summary)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+        for batch in _batched((count, spent, user_id) for user_id, (count, spent) in totals.items()):
+            with conn:
+                conn.executemany(
+                    "UPDATE users SET total_orders = ?, total_spent = ? WHERE user_id = ?", batch
+                )
+        log(f"🧾 Заказов: {orders}")
+
+    conn.execute("ANALYZE")
+    conn.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help="путь к создаваемой БД")
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--orders', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="перезаписать существующую БД")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"❌ Файл {args.db} уже существует (используйте --force)")
+            return 1
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    elapsed = generate(args.db, args.products, args.users, args.orders, args.seed)
+    print(f"✅ Готово за {elapsed:.1f} с: {args.db}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
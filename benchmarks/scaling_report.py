@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Отчет о масштабировании запросов бота
+
+Для нескольких размеров данных генерирует БД (generate_dataset.py) и
+замеряет настоящие функции бота. Для каждой пары соседних размеров
+считается показатель роста k в t ~ n^k: k около 0 - время не зависит от
+объема, около 1 - линейный рост, заметно больше 1 - сверхлинейный рост.
+
+Запуск:
+    python benchmarks/scaling_report.py --sizes 10000 40000 160000 --workdir /tmp/scaling
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import computer_parts_bot  # noqa: E402
+from catalog import load_snapshot  # noqa: E402
+from generate_dataset import generate  # noqa: E402
+
+# Порог показателя роста, начиная с которого рост считается сверхлинейным
+SUPERLINEAR = 1.15
+
+
+def _measure(func, repeat):
+    """Медиана времени вызова в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def _cases():
+    """Замеряемые операции: имя -> (функция, число повторов)"""
+    bot = computer_parts_bot
+    state = {'user': 2 * 10 ** 9}
+
+    def load_catalog():
+        conn = bot.get_db_connection()
+        try:
+            return load_snapshot(conn)
+        finally:
+            conn.close()
+
+    snapshot = load_catalog()
+
+    def new_order():
+        state['user'] += 1
+        bot.create_order(state['user'], 'bench', [{'id': 1, 'name': 'x', 'price': 1, 'quantity': 1}], 1)
+
+    def user_activity():
+        state['user'] += 1
+        bot.update_user_activity(state['user'], 'bench', 'bench', None)
+
+    return {
+        'get_store_statistics': (lambda: bot.get_store_statistics(use_cache=False), 5),
+        'find_products (есть)': (lambda: bot.find_products('RTX'), 5),
+        'find_products (нет)': (lambda: bot.find_products('несуществующий'), 3),
+        'load_snapshot': (load_catalog, 3),
+        'snapshot.top_products': (lambda: snapshot.top_products(10), 50),
+        'snapshot.products_by_category': (lambda: snapshot.products_by_category('gpu', 15), 50),
+        'snapshot.products_by_price': (lambda: snapshot.products_by_price(10000, 20000, 15), 50),
+        'create_order': (new_order, 20),
+        'update_user_activity': (user_activity, 20),
+    }
+
+
+def run(sizes, workdir, users_per_product, orders_per_product):
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    for size in sizes:
+        db_path = os.path.join(workdir, f"scale_{size}.db")
+        if not os.path.exists(db_path):
+            print(f"⏳ Генерация {size} товаров...")
+            generate(db_path, size, size * users_per_product, size * orders_per_product, quiet=True)
+        computer_parts_bot.DB_PATH = db_path
+        for name, (func, repeat) in _cases().items():
+            results.setdefault(name, {})[size] = _measure(func, repeat)
+        print(f"✅ Размер {size} измерен")
+    return results
+
+
+def report(results, sizes):
+    """Таблица в формате Markdown"""
+    lines = [
+        "| Операция | " + " | ".join(f"{size:,} мс" for size in sizes) + " | k (рост) |",
+        "|---" * (len(sizes) + 2) + "|",
+    ]
+    for name, timings in results.items():
+        exponents = []
+        for small, large in zip(sizes, sizes[1:]):
+            if timings[small] > 0 and timings[large] > 0:
+                exponents.append(math.log(timings[large] / timings[small]) / math.log(large / small))
+        worst = max(exponents) if exponents else 0
+        flag = " ⚠️ сверхлинейно" if worst > SUPERLINEAR else ""
+        lines.append(
+            f"| {name} | " + " | ".join(f"{timings[size]:.2f}" for size in sizes)
+            + f" | {', '.join(f'{k:.2f}' for k in exponents)}{flag} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 40000, 160000],
+                        help="число товаров для каждого прогона")
+    parser.add_argument('--users-per-product', type=int, default=2)
+    parser.add_argument('--orders-per-product', type=int, default=4)
+    parser.add_argument('--workdir', default='scaling_data')
+    parser.add_argument('--output', help="сохранить отчет в файл")
+    args = parser.parse_args()
+
+    sizes = sorted(args.sizes)
+    results = run(sizes, args.workdir, args.users_per_product, args.orders_per_product)
+    text = report(results, sizes)
+    print()
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+if __name__ == '__main__':
+    main()
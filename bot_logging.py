@@ -0,0 +1,235 @@
+"""
+Подсистема логирования бота
+
+Записи уходят из обработчиков в очередь (QueueHandler), а на диск и в консоль
+их пишет фоновый поток QueueListener. Поэтому задержка обработчика не зависит
+от скорости диска.
+"""
+
+import contextvars
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import config
+import profiling_state
+
+# Контекст текущего обновления Telegram (chat_id, action и т.п.); None - вне обработки.
+# Словарь создается на каждое обновление: общий изменяемый default делили бы все потоки
+_update_context = contextvars.ContextVar('update_context', default=None)
+
+_listener = None
+
+# Стандартные атрибуты LogRecord, которые не попадают в JSON как extra-поля
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+# ========== КОНТЕКСТ ОБНОВЛЕНИЯ ==========
+
+@contextmanager
+def bound_context(**fields):
+    """Привязка полей ко всем записям внутри блока (без итоговой записи)"""
+    context = dict(_update_context.get() or {})
+    context.update(fields)
+    token = _update_context.set(context)
+    try:
+        yield context
+    finally:
+        _update_context.reset(token)
+
+
+@contextmanager
+def update_context(**fields):
+    """Привязка полей (chat_id, action) ко всем записям внутри блока.
+
+    trace_id - случайный идентификатор обработки, связывающий ее записи
+    (update_id Telegram обработчику не передается; его добавляет
+    supervisor.py через bound_context). На выходе пишет итоговую запись
+    с latency_ms обработки.
+    """
+    if 'trace_id' not in (_update_context.get() or {}):
+        fields.setdefault('trace_id', '%x' % random.getrandbits(48))
+    with bound_context(**fields) as context:
+        started = time.perf_counter()
+        try:
+            yield context
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            logging.getLogger('bot.updates').info(
+                "Обработка завершена за %.1f мс", latency_ms,
+                extra={'latency_ms': round(latency_ms, 2)}
+            )
+
+
+def set_context(**fields):
+    """Дополнение контекста текущего обновления (например, action после разбора данных)"""
+    context = _update_context.get()
+    if context is not None:
+        context.update(fields)
+    session = profiling_state.active
+    if session is not None and 'action' in fields:
+        session.label(fields['action'])
+
+
+def traced(action):
+    """Декоратор обработчика обновлений: контекст chat_id/action и замер задержки.
+
+    Для обновлений без чата (inline-запросы) в chat_id пишется id пользователя.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(update, *args, **kwargs):
+            chat = getattr(update, 'chat', None)
+            chat_id = chat.id if chat is not None else update.from_user.id
+            with update_context(chat_id=chat_id, action=action):
+                session = profiling_state.active
+                if session is not None:
+                    return session.call(action, func, update, *args, **kwargs)
+                return func(update, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет поля контекста обновления в каждую запись"""
+
+    def filter(self, record):
+        for key, value in (_update_context.get() or {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю записей уровня INFO и ниже.
+
+    Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+# ========== ФОРМАТИРОВАНИЕ ==========
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записей в JSON lines"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+# ========== РОТАЦИЯ ==========
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def _gzip_rotator(source, dest):
+    """Сжатие ротированного файла лога"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _build_file_handler(log_file):
+    """Файловый обработчик с ротацией по размеру или по времени"""
+    if config.LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=config.LOG_ROTATE_WHEN,
+            backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    if config.LOG_COMPRESS:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+# ========== НАСТРОЙКА ==========
+
+def setup_logging(level=logging.INFO, log_file=None):
+    """Настройка неблокирующего логирования.
+
+    log_file переопределяет config.LOG_FILE (например, отдельный файл для
+    каждого рабочего процесса). Повторный вызов ничего не делает.
+    Возвращает запущенный QueueListener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = JsonFormatter() if config.LOG_JSON else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = _build_file_handler(log_file or config.LOG_FILE)
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    if config.LOG_SAMPLE_RATE < 1:
+        queue_handler.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [queue_handler]
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    return _listener
+
+
+def reset_after_fork():
+    """Сброс состояния, унаследованного рабочим процессом при fork.
+
+    Поток QueueListener родителя в дочерний процесс не копируется: без
+    сброса setup_logging() считал бы логирование настроенным, а записи
+    копились бы в очереди, которую никто не читает.
+    """
+    global _listener
+    _listener = None
+    logging.getLogger().handlers[:] = []
+
+
+def shutdown_logging():
+    """Остановка фонового потока с дозаписью очереди"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,151 @@
+"""
+Компактная кодировка корзины для Web App
+
+Telegram.WebApp.sendData ограничен 4096 байтами, поэтому корзина
+передается только как пары (id товара, количество); название и цену бот
+берет из каталога. Строка корзины начинается с номера версии:
+
+    1.12x2,15,40x3      текст: id и количество через "x" (1 не пишется)
+    2.<base64url>       varint(число позиций), затем для позиций по
+                        возрастанию id: varint(разница с предыдущим id),
+                        varint(количество)
+
+Web App отправляет версию 2: корзина из 100 позиций занимает несколько
+сотен байт.
+"""
+
+import base64
+
+# Ограничения на содержимое корзины (защита от слишком больших заказов)
+MAX_ITEMS = 500
+MAX_QUANTITY = 999
+
+
+class CartDecodeError(ValueError):
+    """Строка корзины повреждена или в неизвестной версии"""
+
+
+def _check(entries):
+    if not entries:
+        raise CartDecodeError("корзина пуста")
+    if len(entries) > MAX_ITEMS:
+        raise CartDecodeError(f"в корзине больше {MAX_ITEMS} позиций")
+    for product_id, quantity in entries:
+        if product_id <= 0 or not 0 < quantity <= MAX_QUANTITY:
+            raise CartDecodeError(f"некорректная позиция {product_id}x{quantity}")
+    return entries
+
+
+def _merge(pairs):
+    """Пары (id, количество) без повторов id, в порядке первого появления"""
+    merged = {}
+    for product_id, quantity in pairs:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return list(merged.items())
+
+
+# ========== ВЕРСИЯ 1: ТЕКСТ ==========
+
+def _encode_v1(entries):
+    return ','.join(f"{product_id}x{quantity}" if quantity != 1 else str(product_id)
+                    for product_id, quantity in entries)
+
+
+def _decode_v1(body):
+    pairs = []
+    for item in body.split(','):
+        product_id, _, quantity = item.partition('x')
+        pairs.append((int(product_id), int(quantity) if quantity else 1))
+    return pairs
+
+
+# ========== ВЕРСИЯ 2: VARINT + BASE64 ==========
+
+def _varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode_v2(entries):
+    out = bytearray()
+    _varint(len(entries), out)
+    previous = 0
+    for product_id, quantity in sorted(entries):
+        _varint(product_id - previous, out)
+        _varint(quantity, out)
+        previous = product_id
+    return base64.urlsafe_b64encode(bytes(out)).rstrip(b'=').decode('ascii')
+
+
+def _read_varints(data):
+    if max(data, default=0) < 0x80:
+        # Обычный случай: все числа меньше 128, байт = число
+        return list(data)
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            if shift > 63:
+                raise CartDecodeError("слишком длинное число")
+        else:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        raise CartDecodeError("обрезанное число")
+    return values
+
+
+def _decode_v2(body):
+    data = base64.urlsafe_b64decode(body + '=' * (-len(body) % 4))
+    values = _read_varints(data)
+    if not values or len(values) != 1 + 2 * values[0]:
+        raise CartDecodeError("число позиций не совпадает с данными")
+    pairs = []
+    product_id = 0
+    for i in range(1, len(values), 2):
+        product_id += values[i]
+        pairs.append((product_id, values[i + 1]))
+    return pairs
+
+
+_ENCODERS = {'1': _encode_v1, '2': _encode_v2}
+_DECODERS = {'1': _decode_v1, '2': _decode_v2}
+CURRENT_VERSION = '2'
+
+
+def encode_cart(entries, version=CURRENT_VERSION):
+    """Строка корзины из пар (id товара, количество)"""
+    return f"{version}.{_ENCODERS[version](_check(_merge(entries)))}"
+
+
+def entries_from_items(items):
+    """Пары (id товара, количество) из позиций прежнего формата Web App ([{'id', 'quantity', ...}]).
+
+    Названия и цены клиента отбрасываются: бот берет их из каталога.
+    """
+    try:
+        pairs = [(int(item['id']), int(item.get('quantity') or 1)) for item in items]
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise CartDecodeError(f"некорректная позиция: {e}") from e
+    return _check(_merge(pairs))
+
+
+def decode_cart(payload):
+    """Пары (id товара, количество) из строки корзины; CartDecodeError при ошибке"""
+    if not isinstance(payload, str):
+        raise CartDecodeError("корзина должна быть строкой")
+    version, sep, body = payload.partition('.')
+    decoder = _DECODERS.get(version)
+    if not sep or decoder is None:
+        raise CartDecodeError(f"неизвестная версия корзины {version!r}")
+    try:
+        pairs = decoder(body)
+    except CartDecodeError:
+        raise
+    except (ValueError, TypeError) as e:
+        raise CartDecodeError(str(e)) from e
+    return _check(_merge(pairs))
@@ -0,0 +1,384 @@
+"""
+Реплика каталога в памяти
+
+Весь каталог товаров хранится в компактных столбцах (array.array) с
+заранее отсортированными индексами: топ по рейтингу, товары по категориям,
+товары по цене. Чтение не обращается к SQLite и не создает sqlite3.Row.
+
+SQLite остается основным хранилищем: снимок перестраивается, когда меняется
+catalog_meta.version (триггеры на products и categories), и подменяется
+атомарно - читатели всегда видят целый снимок, старый или новый.
+
+Пакетные обновления цен и остатков записывают в catalog_change_log
+список измененных товаров. Если журнал покрывает весь промежуток версий,
+реплика перечитывает только эти товары и копирует числовые столбцы со
+старого снимка; названия и тексты остаются общими.
+"""
+
+import copy
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+SQL_CATALOG_VERSION = register_query('catalog_version', "SELECT version FROM catalog_meta", allow_scan=True)
+
+SQL_CATALOG_CATEGORIES = register_query('catalog_categories', """
+    SELECT id, name, description, icon, slug FROM categories ORDER BY id
+""", allow_scan=True)
+
+SQL_CATALOG_PRODUCTS = register_query('catalog_products', """
+    SELECT id, name, description, price, category_id, image_url, specs,
+           in_stock, rating, brand, stock_quantity, popularity
+    FROM products
+""", allow_scan=True)
+
+SQL_CATALOG_CHANGES = register_query('catalog_changes_since', """
+    SELECT version_from, version_to, product_ids FROM catalog_change_log
+    WHERE version_to > ? ORDER BY version_to
+""", params=(0,))
+
+# Просматривается только JSON-список id, товары ищутся по первичному ключу
+SQL_CATALOG_CHANGED_PRODUCTS = register_query('catalog_changed_products', """
+    SELECT id, price, in_stock, stock_quantity FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+""", params=('[1, 2]',), allow_scan=True)
+
+# Журнал пакетных изменений цен и остатков (применяется миграцией в боте)
+CHANGE_LOG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS catalog_change_log (
+        version_to INTEGER PRIMARY KEY,
+        version_from INTEGER NOT NULL,
+        created_at INTEGER NOT NULL,
+        product_ids TEXT NOT NULL
+    )""",
+]
+
+# Сколько секунд хранятся записи журнала изменений
+CHANGE_LOG_TTL = 86400
+
+# Доля измененных товаров, выше которой выгоднее перечитать каталог целиком
+PATCH_MAX_FRACTION = 0.25
+
+# Столбцы для деталей товара: читаются редко, хранятся упакованными в UTF-8
+_TEXT_COLUMNS = ('description', 'specs', 'image_url')
+
+
+class PackedStrings:
+    """Столбец строк: один буфер UTF-8 и массив смещений"""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self._nulls = set()
+
+    def append(self, value):
+        if value is None:
+            self._nulls.add(len(self._offsets) - 1)
+        else:
+            self._data += value.encode('utf-8')
+        self._offsets.append(len(self._data))
+
+    def __getitem__(self, i):
+        if i in self._nulls:
+            return None
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def memory_usage(self):
+        return sys.getsizeof(self._data) + sys.getsizeof(self._offsets) + sys.getsizeof(self._nulls)
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок каталога в столбцовом виде"""
+
+    def __init__(self, product_rows, category_rows, version=0):
+        self.version = version
+        # Товары, измененные относительно предыдущего снимка (None - полная загрузка)
+        self.changed_ids = None
+
+        # Категории: код категории - позиция в списке
+        self.categories = [dict(row) for row in category_rows]
+        category_code = {category['id']: code for code, category in enumerate(self.categories)}
+        self._slug_code = {category['slug']: code for code, category in enumerate(self.categories)}
+
+        self.ids = array('q')
+        self.prices = array('d')
+        self.ratings = array('d')
+        self.popularity = array('q')
+        self.stock_quantity = array('q')
+        self.in_stock = array('b')
+        self.category_codes = array('H')
+        self.brand_codes = array('I')
+        self.brands = []
+        self.names = []
+        self.texts = {column: PackedStrings() for column in _TEXT_COLUMNS}
+
+        brand_code = {}
+        for row in sorted(product_rows, key=lambda r: r['id']):
+            self.ids.append(row['id'])
+            self.prices.append(row['price'] or 0.0)
+            self.ratings.append(row['rating'] or 0.0)
+            self.popularity.append(row['popularity'] or 0)
+            self.stock_quantity.append(row['stock_quantity'] or 0)
+            self.in_stock.append(1 if row['in_stock'] else 0)
+            self.category_codes.append(category_code.get(row['category_id'], 0))
+            brand = row['brand'] or ''
+            if brand not in brand_code:
+                brand_code[brand] = len(self.brands)
+                self.brands.append(sys.intern(brand))
+            self.brand_codes.append(brand_code[brand])
+            self.names.append(sys.intern(row['name']))
+            for column in _TEXT_COLUMNS:
+                self.texts[column].append(row[column])
+
+        count = len(self.ids)
+        by_rating = sorted(range(count), key=lambda i: (-self.ratings[i], -self.popularity[i]))
+
+        # Топ: только товары с рейтингом, в порядке rating DESC, popularity DESC
+        self.top_order = array('I', (i for i in by_rating if self.ratings[i] > 0))
+
+        # Товары категории в том же порядке
+        per_category = [array('I') for _ in self.categories]
+        for i in by_rating:
+            per_category[self.category_codes[i]].append(i)
+        self.category_order = per_category
+        for code, category in enumerate(self.categories):
+            category['product_count'] = len(per_category[code])
+
+        # Индекс по цене для фильтров диапазона
+        self.price_order = array('I', sorted(range(count), key=lambda i: self.prices[i]))
+        self.sorted_prices = array('d', (self.prices[i] for i in self.price_order))
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ========== ЧТЕНИЕ ==========
+
+    def row(self, i, with_text=False):
+        category = self.categories[self.category_codes[i]]
+        row = {
+            'id': self.ids[i],
+            'name': self.names[i],
+            'price': self.prices[i],
+            'rating': self.ratings[i],
+            'popularity': self.popularity[i],
+            'stock_quantity': self.stock_quantity[i],
+            'in_stock': bool(self.in_stock[i]),
+            'brand': self.brands[self.brand_codes[i]],
+            'category_name': category['name'],
+            'category_slug': category['slug'],
+        }
+        if with_text:
+            for column in _TEXT_COLUMNS:
+                row[column] = self.texts[column][i]
+        return row
+
+    def index_of(self, product_id):
+        """Позиция товара в столбцах (ids отсортированы) или None"""
+        i = bisect_left(self.ids, product_id)
+        if i < len(self.ids) and self.ids[i] == product_id:
+            return i
+        return None
+
+    def image_url(self, product_id):
+        """Адрес изображения товара или None"""
+        i = self.index_of(product_id)
+        return self.texts['image_url'][i] if i is not None else None
+
+    def top_products(self, limit=10):
+        """Топ товаров по рейтингу и популярности"""
+        return [self.row(i) for i in self.top_order[:limit]]
+
+    def products_by_category(self, slug, limit=15):
+        """Товары категории по рейтингу и популярности"""
+        code = self._slug_code.get(slug)
+        if code is None:
+            return []
+        return [self.row(i) for i in self.category_order[code][:limit]]
+
+    def product_details(self, product_id):
+        """Полная карточка товара или None"""
+        try:
+            i = self.index_of(int(product_id))
+        except (TypeError, ValueError):
+            return None
+        return self.row(i, with_text=True) if i is not None else None
+
+    def products_by_price(self, min_price=None, max_price=None, limit=15):
+        """Товары в диапазоне цен, от дешевых к дорогим"""
+        lo = 0 if min_price is None else bisect_left(self.sorted_prices, min_price)
+        hi = len(self.sorted_prices) if max_price is None else bisect_right(self.sorted_prices, max_price)
+        return [self.row(i) for i in self.price_order[lo:min(hi, lo + limit)]]
+
+    def categories_with_counts(self):
+        """Категории с количеством товаров, по названию"""
+        return sorted(self.categories, key=lambda c: c['name'])
+
+    # ========== ЧАСТИЧНОЕ ОБНОВЛЕНИЕ ==========
+
+    def patched(self, rows, version):
+        """Новый снимок с измененными ценой, наличием и остатком товаров.
+
+        rows - (id, price, in_stock, stock_quantity). Столбцы, которые не
+        изменились, названия, тексты и порядок по рейтингу общие со старым
+        снимком. None, если среди строк есть товар, которого нет в снимке.
+        """
+        positions = []
+        for product_id, price, in_stock, stock_quantity in rows:
+            i = self.index_of(product_id)
+            if i is None:
+                return None
+            positions.append((i, price or 0.0, 1 if in_stock else 0, stock_quantity or 0))
+
+        snapshot = copy.copy(self)
+        snapshot.version = version
+        snapshot.changed_ids = frozenset(self.ids[i] for i, *_ in positions)
+        for column, n in (('prices', 1), ('in_stock', 2), ('stock_quantity', 3)):
+            values = getattr(self, column)
+            changed = [(p[0], p[n]) for p in positions if values[p[0]] != p[n]]
+            if changed:
+                values = array(values.typecode, values)
+                for i, value in changed:
+                    values[i] = value
+                setattr(snapshot, column, values)
+        if snapshot.prices is not self.prices:
+            prices = snapshot.prices
+            snapshot.price_order = array('I', sorted(range(len(prices)), key=prices.__getitem__))
+            snapshot.sorted_prices = array('d', (prices[i] for i in snapshot.price_order))
+        return snapshot
+
+    # ========== ПАМЯТЬ ==========
+
+    def memory_usage(self):
+        """Приблизительный объем памяти снимка в байтах"""
+        total = 0
+        for column in (self.ids, self.prices, self.ratings, self.popularity, self.stock_quantity,
+                       self.in_stock, self.category_codes, self.brand_codes, self.top_order,
+                       self.price_order, self.sorted_prices, *self.category_order):
+            total += sys.getsizeof(column)
+        # Интернированные строки считаются один раз
+        unique = {id(value): value for value in self.names + self.brands}
+        total += sys.getsizeof(self.names) + sys.getsizeof(self.brands)
+        total += sum(sys.getsizeof(value) for value in unique.values())
+        total += sum(column.memory_usage() for column in self.texts.values())
+        return total
+
+
+def load_snapshot(conn):
+    """Чтение каталога из SQLite в новый снимок"""
+    conn.row_factory = sqlite3.Row
+    # Версия и строки читаются в одной транзакции, чтобы снимок был согласованным
+    conn.execute("BEGIN")
+    version = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+    categories = conn.execute(SQL_CATALOG_CATEGORIES).fetchall()
+    products = conn.execute(SQL_CATALOG_PRODUCTS).fetchall()
+    conn.execute("COMMIT")
+    return CatalogSnapshot(products, categories, version)
+
+
+def load_changes(conn, snapshot):
+    """Снимок с изменениями из журнала или None, если нужна полная загрузка.
+
+    Журнал должен без пропусков связывать версию снимка с текущей: любое
+    изменение каталога мимо журнала (правка товара, категории) разрывает
+    цепочку.
+    """
+    conn.execute("BEGIN")
+    try:
+        version = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+        expected = snapshot.version
+        product_ids = set()
+        for version_from, version_to, ids in conn.execute(SQL_CATALOG_CHANGES, (snapshot.version,)):
+            if version_from != expected or version_to > version:
+                return None
+            product_ids.update(int(product_id) for product_id in ids.split(','))
+            expected = version_to
+        if expected != version or len(product_ids) > PATCH_MAX_FRACTION * len(snapshot):
+            return None
+        rows = conn.execute(SQL_CATALOG_CHANGED_PRODUCTS, (json.dumps(sorted(product_ids)),)).fetchall()
+    finally:
+        conn.execute("COMMIT")
+    if len(rows) != len(product_ids):
+        # Товар удален - меняется состав столбцов
+        return None
+    return snapshot.patched(rows, version)
+
+
+def record_catalog_changes(conn, version_from, product_ids, now=None):
+    """Запись измененных товаров в журнал (внутри той же транзакции записи)"""
+    now = int(now or time.time())
+    version_to = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+    if version_to == version_from:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO catalog_change_log (version_to, version_from, created_at, product_ids)"
+        " VALUES (?, ?, ?, ?)",
+        (version_to, version_from, now, ','.join(map(str, product_ids)))
+    )
+    conn.execute("DELETE FROM catalog_change_log WHERE created_at < ?", (now - CHANGE_LOG_TTL,))
+
+
+class CatalogReplica:
+    """Актуальный снимок каталога с проверкой версии не чаще check_interval"""
+
+    def __init__(self, connect, check_interval=2.0):
+        self._connect = connect
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        conn = self._connect()
+        try:
+            return conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+        finally:
+            conn.close()
+
+    def refresh(self, force=False):
+        """Перестроение снимка, если версия каталога изменилась"""
+        with self._lock:
+            if not force and self._snapshot is not None:
+                # Другой поток мог только что проверить версию
+                if time.monotonic() - self._checked_at < self.check_interval:
+                    return self._snapshot
+                self._checked_at = time.monotonic()
+                if self._current_version() == self._snapshot.version:
+                    return self._snapshot
+            self._checked_at = time.monotonic()
+            started = time.perf_counter()
+            conn = self._connect()
+            try:
+                snapshot = None
+                if not force and self._snapshot is not None:
+                    snapshot = load_changes(conn, self._snapshot)
+                if snapshot is None:
+                    snapshot = load_snapshot(conn)
+            finally:
+                conn.close()
+            self._snapshot = snapshot
+            if snapshot.changed_ids is None:
+                logger.info("Снимок каталога v%s: %s товаров за %.1f мс",
+                            snapshot.version, len(snapshot), (time.perf_counter() - started) * 1000)
+            else:
+                logger.info("Снимок каталога v%s: обновлено %s товаров за %.1f мс",
+                            snapshot.version, len(snapshot.changed_ids), (time.perf_counter() - started) * 1000)
+            return snapshot
+
+    def get(self):
+        """Текущий снимок (одна ссылка - подмена атомарна для читателей)"""
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+            return self.refresh()
+        return snapshot
@@ -7,23 +7,35 @@ Telegram бот магазина компьютерных комплектующ
 """
 
 import sqlite3
-import telebot
 import json
-from telebot import types
 import os
 import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
 from datetime import datetime
 import config  # Импорт конфигурации
-
-# ========== НАСТРОЙКА ЛОГИРОВАНИЯ ==========
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('parts_bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+from bot_logging import setup_logging, shutdown_logging, set_context, traced
+from conversation_state import SCHEMA as STATE_SCHEMA, MemoryStateStore, SQLiteStateStore
+from catalog import CHANGE_LOG_SCHEMA, CatalogReplica
+from inline_search import InlineSearch
+from fuzzy_search import FuzzySearch
+from idempotency import RecentKeys
+from admission import AdmissionControl, parse_costs, parse_names
+from cart_codec import CartDecodeError, decode_cart, entries_from_items
+from db_writer import WriteQueue
+import price_alerts
+import product_photos
+import backup
+import supplier_sync
+import order_archive
+import profiling_state
+from queries import register_query, connect as db_connect, log_audit
+
+# telebot импортируется лениво в create_bot(): модуль можно импортировать
+# из воркеров, тестов и утилит без токена и без сетевой библиотеки
 logger = logging.getLogger(__name__)
 
 # ========== КОНФИГУРАЦИЯ ==========
@@ -33,19 +45,8 @@ WEB_APP_URL = config.WEB_APP_URL
 BOT_NAME = config.BOT_NAME
 BOT_VERSION = config.BOT_VERSION
 
-# Проверка токена
-if not TOKEN or ':' not in TOKEN:
-    logger.error("❌ Неправильный формат токена!")
-    print("❌ ОШИБКА: Добавьте токен в файл .env")
-    exit(1)
-
-# Инициализация бота
-bot = telebot.TeleBot(TOKEN)
-print("=" * 60)
-print(f"🖥️ {BOT_NAME} v{BOT_VERSION}")
-print("=" * 60)
-print(f"🌐 Web App URL: {WEB_APP_URL}")
-print(f"📁 База данных: {DB_PATH}")
+# Экземпляр бота создается фабрикой create_bot()
+bot = None
 
 
 # ========== ФУНКЦИИ БАЗЫ ДАННЫХ ==========
@@ -260,139 +261,670 @@ def init_database():
         return True
 
     except Exception as e:
-        logger.error(f"❌ Ошибка при инициализации БД: {e}")
+        logger.error("❌ Ошибка при инициализации БД: %s", e)
         return False
 
 
-def get_db_connection():
+def get_db_connection(**kwargs):
     """Создание соединения с базой данных"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db_connect(DB_PATH, config.SLOW_QUERY_MS, timeout=config.DB_BUSY_TIMEOUT, **kwargs)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def update_user_activity(user_id, username, first_name, last_name):
-    """Обновление активности пользователя"""
+# Очередь записи процесса (start_db_writer); без нее каждая запись открывает свое соединение
+_db_writer = None
+
+
+def start_db_writer():
+    """Поток записи с групповой фиксацией (DB_WRITER_ENABLED)"""
+    global _db_writer
+    if not config.DB_WRITER_ENABLED:
+        return None
+    _db_writer = WriteQueue(
+        lambda: get_db_connection(check_same_thread=False), config.DB_WRITER_MAX_BATCH, config.DB_WRITER_MAX_DELAY_MS / 1000,
+        config.DB_WRITER_SYNCHRONOUS, config.DB_WRITER_QUEUE_SIZE, config.DB_WRITER_TIMEOUT
+    ).start()
+    return _db_writer
+
+
+def stop_db_writer():
+    """Остановка после всех остальных писателей: очередь дописывается до конца"""
+    global _db_writer
+    if _db_writer is not None:
+        _db_writer.stop()
+        _db_writer = None
+
+
+def _active_writer():
+    # После fork в рабочий процесс попадает очередь родителя без потока записи
+    if _db_writer is not None and _db_writer.running:
+        return _db_writer
+    return None
+
+
+def submit_write(func, *args):
+    """Запись func(conn, *args) через очередь; Future с результатом после COMMIT.
+
+    Без очереди (утилиты, DB_WRITER_ENABLED=0) выполняется сразу в
+    отдельной транзакции.
+    """
+    writer = _active_writer()
+    if writer is not None:
+        return writer.submit(func, *args)
+    future = Future()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with write_transaction() as conn:
+            future.set_result(func(conn, *args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
 
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
+def run_write(func, *args):
+    """Запись func(conn, *args) с ожиданием фиксации; возвращает результат func"""
+    writer = _active_writer()
+    if writer is not None:
+        return writer.execute(func, *args)
+    with write_transaction() as conn:
+        return func(conn, *args)
 
-        if user:
-            cursor.execute(
-                "UPDATE users SET last_activity = ?, username = ?, first_name = ?, last_name = ? WHERE user_id = ?",
-                (now, username, first_name, last_name, user_id)
-            )
-        else:
-            cursor.execute(
-                """INSERT INTO users (user_id, username, first_name, last_name, last_activity) 
-                   VALUES (?, ?, ?, ?, ?)""",
-                (user_id, username, first_name, last_name, now)
-            )
 
-        conn.commit()
+@contextmanager
+def write_transaction():
+    """Транзакция записи для блока кода (пакетные задачи, утилиты).
+
+    При работающей очереди записи блок выполняется на ее соединении между
+    группами операций. Без очереди транзакция открывается на новом
+    соединении через BEGIN IMMEDIATE: блокировка записи берется сразу, и
+    конкурирующие процессы ждут в пределах busy timeout, а не получают
+    "database is locked" посреди транзакции.
+    """
+    writer = _active_writer()
+    if writer is not None:
+        with writer.transaction() as conn:
+            yield conn
+        return
+
+    conn = get_db_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
         conn.close()
+
+
+# Миграции схемы: номер версии -> список SQL-выражений.
+# Применяются по порядку, текущая версия хранится в PRAGMA user_version.
+MIGRATIONS = {
+    1: [
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id, rating DESC, popularity DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_products_rating ON products (rating DESC, popularity DESC)",
+    ],
+    2: [
+        # Версия каталога для реплики в памяти: меняется при любой записи в каталог
+        "CREATE TABLE IF NOT EXISTS catalog_meta (version INTEGER NOT NULL)",
+        "INSERT INTO catalog_meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM catalog_meta)",
+    ] + [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version AFTER {event} ON {table}
+            BEGIN UPDATE catalog_meta SET version = version + 1; END"""
+        for table in ('products', 'categories')
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ],
+    3: [
+        # Ключ идемпотентности заказа из Web App: повтор не создает второй заказ
+        "ALTER TABLE orders ADD COLUMN idempotency_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency ON orders (idempotency_key)",
+    ],
+    4: [
+        # Индексы по замечаниям аудитора планов для статистики магазина:
+        # COUNT(DISTINCT brand) без временного B-дерева, MIN/MAX цены без просмотра
+        "CREATE INDEX IF NOT EXISTS idx_products_brand ON products (brand)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_in_stock ON products (in_stock)",
+    ],
+    5: [
+        # История цен, подписки на снижение цены / поступление и очередь уведомлений
+        *price_alerts.SCHEMA,
+    ],
+    6: [
+        # file_id загруженных в Telegram фотографий товаров
+        *product_photos.SCHEMA,
+    ],
+    7: [
+        # Краткое описание заказа для истории (без разбора JSON товаров при чтении)
+        "ALTER TABLE orders ADD COLUMN items_count INTEGER",
+        "ALTER TABLE orders ADD COLUMN summary TEXT",
+        """UPDATE orders SET
+               items_count = (SELECT SUM(COALESCE(json_extract(value, '$.quantity'), 1))
+                              FROM json_each(orders.products)),
+               summary = json_extract(products, '$[0].name') || CASE
+                   WHEN json_array_length(products) > 1
+                   THEN ' и еще ' || (json_array_length(products) - 1) ELSE '' END
+           WHERE json_valid(products) AND json_type(products) = 'array'""",
+        # Покрывающий индекс для истории заказов пользователя с постраничным выводом
+        """CREATE INDEX IF NOT EXISTS idx_orders_user_history
+           ON orders (user_id, created_at DESC, id DESC, total_price, status, items_count, summary)""",
+    ],
+    8: [
+        # Журнал пакетных изменений для частичного обновления реплик и хэши синхронизации прайса
+        *CHANGE_LOG_SCHEMA,
+        *supplier_sync.SCHEMA,
+    ],
+    9: [
+        # Архив старых заказов и представление orders_all со всей историей
+        *order_archive.SCHEMA,
+    ],
+    10: [
+        # Состояние диалогов (раньше таблица создавалась хранилищем при первом обращении)
+        *STATE_SCHEMA,
+    ],
+    11: [
+        # Ключи идемпотентности архивных заказов: повтор старого заказа не создает новый
+        "CREATE INDEX IF NOT EXISTS idx_orders_archive_idempotency ON orders_archive (idempotency_key)",
+    ],
+}
+
+
+def apply_migrations(conn):
+    """Применение недостающих миграций схемы"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version in sorted(v for v in MIGRATIONS if v > current):
+        with conn:
+            for statement in MIGRATIONS[version]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+        logger.info("Применена миграция схемы v%s", version)
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# ========== SQL-ЗАПРОСЫ ==========
+# Именованные запросы проверяются аудитором планов (python queries.py --db ...)
+
+SQL_USER_ACTIVITY = register_query('user_activity', """
+    INSERT INTO users (user_id, username, first_name, last_name, last_activity)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_activity = excluded.last_activity,
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name
+""")
+
+SQL_STORE_STATISTICS = register_query('store_statistics', """
+    SELECT
+        (SELECT COUNT(*) FROM products) AS total_products,
+        (SELECT COUNT(*) FROM products WHERE in_stock = 1) AS in_stock_products,
+        (SELECT COUNT(DISTINCT brand) FROM products) AS total_brands,
+        (SELECT COUNT(*) FROM categories) AS total_categories,
+        (SELECT COUNT(*) FROM orders)
+            + (SELECT archived_orders FROM order_archive_meta WHERE id = 1) AS total_orders,
+        (SELECT COUNT(*) FROM users) AS total_users,
+        (SELECT MIN(price) FROM products) AS min_price,
+        (SELECT MAX(price) FROM products) AS max_price,
+        (SELECT AVG(price) FROM products) AS avg_price
+""", allow_scan=True)
+
+SQL_ORDER_INSERT = register_query('order_insert', """
+    INSERT INTO orders (user_id, user_name, user_phone, products, total_price, status,
+                        address, notes, idempotency_key, items_count, summary)
+    VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?, ?)
+    ON CONFLICT (idempotency_key) DO NOTHING
+""")
+
+SQL_ORDER_BY_KEY = register_query('order_by_key', """
+    SELECT id FROM orders WHERE idempotency_key = ?
+""")
+
+# Ключ заказа, уже перенесенного в архив (в orders его уникальный индекс больше не видит)
+SQL_ARCHIVED_ORDER_BY_KEY = register_query('archived_order_by_key', """
+    SELECT id FROM orders_archive WHERE idempotency_key = ?
+""")
+
+SQL_USER_ORDER_TOTALS = register_query('user_order_totals', """
+    UPDATE users
+    SET total_orders = total_orders + 1,
+        total_spent = total_spent + ?,
+        last_activity = CURRENT_TIMESTAMP
+    WHERE user_id = ?
+""")
+
+# История заказов: постранично по ключу (created_at, id), только по индексам.
+# Живые и архивные заказы читаются слиянием двух упорядоченных индексов.
+SQL_USER_ORDERS_PAGE = register_query('user_orders_page', """
+    SELECT id, created_at, total_price, status, items_count, summary
+    FROM orders
+    WHERE user_id = ?1 AND (created_at, id) < (?2, ?3)
+    UNION ALL
+    SELECT id, created_at, total_price, status, items_count, summary
+    FROM orders_archive
+    WHERE user_id = ?1 AND (created_at, id) < (?2, ?3)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?4
+""", params=(1, '9999-12-31', 0, 10))
+
+SQL_USER_TOTALS = register_query('user_totals', """
+    SELECT total_orders, total_spent FROM users WHERE user_id = ?
+""")
+
+# Товары корзины одним запросом: просматривается только JSON-список id
+SQL_CART_PRODUCTS = register_query('cart_products', """
+    SELECT id, name, price FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+""", params=('[1, 2]',), allow_scan=True)
+
+# Поиск по подстроке (LIKE '%...%') не может использовать индекс
+SQL_FIND_PRODUCTS = register_query('find_products', """
+    SELECT p.id, p.name, p.brand, p.price, p.in_stock, p.rating, c.name as category_name
+    FROM products p
+    JOIN categories c ON p.category_id = c.id
+    WHERE p.name LIKE ? OR p.brand LIKE ? OR p.description LIKE ? OR c.name LIKE ?
+    ORDER BY p.rating DESC, p.price
+    LIMIT ?
+""", params=('%x%', '%x%', '%x%', '%x%', 15), allow_scan=True)
+
+
+def update_user_activity(user_id, username, first_name, last_name):
+    """Обновление активности пользователя"""
+    try:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # Обработчик не ждет фиксации: потеря отметки активности при сбое не критична
+        future = submit_write(_write_user_activity, (user_id, username, first_name, last_name, now))
+        future.add_done_callback(_log_write_error)
         return True
 
     except Exception as e:
-        logger.error(f"Ошибка обновления пользователя: {e}")
+        logger.error("Ошибка обновления пользователя: %s", e)
         return False
 
 
-def get_store_statistics():
-    """Получение статистики магазина"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def _write_user_activity(conn, params):
+    conn.execute(SQL_USER_ACTIVITY, params)
 
-        cursor.execute("SELECT COUNT(*) FROM products")
-        total_products = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(*) FROM products WHERE in_stock = 1")
-        in_stock_products = cursor.fetchone()[0]
+def _log_write_error(future):
+    if future.exception() is not None:
+        logger.error("Ошибка обновления пользователя: %s", future.exception())
 
-        cursor.execute("SELECT COUNT(DISTINCT brand) FROM products")
-        total_brands = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(*) FROM categories")
-        total_categories = cursor.fetchone()[0]
+# Кэш статистики: (время получения, данные)
+_stats_cache = None
 
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
+def get_store_statistics(use_cache=True):
+    """Получение статистики магазина (одним запросом, с кэшированием)"""
+    global _stats_cache
+    if use_cache and _stats_cache and time.monotonic() - _stats_cache[0] < config.STATS_CACHE_TTL:
+        return _stats_cache[1]
 
-        cursor.execute("SELECT MIN(price), MAX(price), AVG(price) FROM products")
-        price_stats = cursor.fetchone()
-        min_price, max_price, avg_price = price_stats
+    try:
+        conn = get_db_connection()
+        stats = dict(conn.execute(SQL_STORE_STATISTICS).fetchone())
 
         conn.close()
 
-        return {
-            'total_products': total_products,
-            'in_stock_products': in_stock_products,
-            'total_brands': total_brands,
-            'total_categories': total_categories,
-            'total_orders': total_orders,
-            'total_users': total_users,
-            'min_price': min_price,
-            'max_price': max_price,
-            'avg_price': avg_price
-        }
+        _stats_cache = (time.monotonic(), stats)
+        return stats
 
     except Exception as e:
-        logger.error(f"Ошибка получения статистики: {e}")
+        logger.error("Ошибка получения статистики: %s", e)
         return None
 
 
-def create_order(user_id, user_name, products_data, total_price, address="", phone="", notes=""):
-    """Создание нового заказа"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def order_summary(products_data):
+    """Число товаров и краткое описание заказа ("Название и еще N")"""
+    items = [item for item in products_data if isinstance(item, dict)]
+    if not items:
+        return 0, ""
+    count = sum(int(item.get('quantity') or 1) for item in items)
+    summary = str(items[0].get('name') or "Товар")[:60]
+    if len(items) > 1:
+        summary += f" и еще {len(items) - 1}"
+    return count, summary
+
+
+# Недавние ключи идемпотентности заказов: ключ -> номер заказа
+recent_order_keys = RecentKeys(config.IDEMPOTENCY_CACHE_SIZE)
 
+
+def create_order(user_id, user_name, products_data, total_price, address="", phone="", notes="",
+                 idempotency_key=None):
+    """Создание нового заказа.
+
+    Повторный вызов с тем же idempotency_key возвращает номер уже созданного
+    заказа и не меняет статистику пользователя.
+    """
+    if idempotency_key:
+        order_id = recent_order_keys.get(idempotency_key)
+        if order_id:
+            logger.info("Повтор заказа #%s (ключ %s) пропущен", order_id, idempotency_key)
+            return order_id
+
+    try:
         # Преобразуем продукты в строку
         products_str = json.dumps(products_data)
+        items_count, summary = order_summary(products_data)
 
-        cursor.execute("""
-            INSERT INTO orders (user_id, user_name, user_phone, products, total_price, status, address, notes)
-            VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)
-        """, (user_id, user_name, phone, products_str, total_price, address, notes))
+        order_id, created = run_write(
+            _insert_order,
+            (user_id, user_name, phone, products_str, total_price, address, notes, idempotency_key,
+             items_count, summary),
+            (total_price, user_id)
+        )
 
-        order_id = cursor.lastrowid
+        if not created:
+            # Заказ с этим ключом уже есть в БД (например, до перезапуска)
+            recent_order_keys.add(idempotency_key, order_id)
+            logger.info("Повтор заказа #%s (ключ %s) пропущен", order_id, idempotency_key)
+            return order_id
 
-        # Обновляем статистику пользователя
-        cursor.execute("""
-            UPDATE users 
-            SET total_orders = total_orders + 1, 
-                total_spent = total_spent + ?,
-                last_activity = CURRENT_TIMESTAMP
-            WHERE user_id = ?
-        """, (total_price, user_id))
+        if idempotency_key:
+            recent_order_keys.add(idempotency_key, order_id)
+        logger.info("✅ Создан заказ #%s для пользователя %s", order_id, user_id)
+        return order_id
 
-        conn.commit()
+    except Exception as e:
+        logger.error("Ошибка создания заказа: %s", e)
+        return None
+
+
+def _insert_order(conn, order_params, totals_params):
+    """Вставка заказа и обновление статистики пользователя: (номер заказа, создан ли)"""
+    # Пропускается только повтор по ключу идемпотентности; остальные ошибки
+    # ограничений (NOT NULL, CHECK) пробрасываются
+    idempotency_key = order_params[7]
+    if idempotency_key:
+        row = conn.execute(SQL_ARCHIVED_ORDER_BY_KEY, (idempotency_key,)).fetchone()
+        if row is not None:
+            return row[0], False
+    cursor = conn.execute(SQL_ORDER_INSERT, order_params)
+    if cursor.rowcount == 0:
+        row = conn.execute(SQL_ORDER_BY_KEY, (idempotency_key,)).fetchone()
+        if row is None:
+            raise sqlite3.IntegrityError(f"заказ с ключом {idempotency_key} не вставлен и не найден")
+        return row[0], False
+
+    # Обновляем статистику пользователя
+    conn.execute(SQL_USER_ORDER_TOTALS, totals_params)
+    return cursor.lastrowid, True
+
+
+def hydrate_cart(entries):
+    """Позиции заказа по парам (id товара, количество): название и цена из каталога.
+
+    Возвращает (позиции в порядке корзины, id товаров, которых нет в каталоге).
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(SQL_CART_PRODUCTS, (json.dumps([product_id for product_id, _ in entries]),)).fetchall()
+    finally:
         conn.close()
+    products = {row['id']: row for row in rows}
+    items = []
+    missing = []
+    for product_id, quantity in entries:
+        row = products.get(product_id)
+        if row is None:
+            missing.append(product_id)
+        else:
+            items.append({'id': product_id, 'name': row['name'], 'price': row['price'], 'quantity': quantity})
+    return items, missing
+
+
+def apply_catalog_batch(updates):
+    """Пакетное обновление цен и наличия: история цен и очередь уведомлений.
+
+    updates - итерация (product_id, price, in_stock[, stock_quantity]).
+    Возвращает (список измененных product_id, число уведомлений в очереди).
+    """
+    global _stats_cache
+    result = run_write(price_alerts.apply_catalog_updates, updates)
+    if result[0]:
+        _stats_cache = None
+    return result
+
+
+# Курсор страницы истории: "created_at|id" последнего показанного заказа
+_FIRST_PAGE = ('9999-12-31', 0)
+
+
+def get_user_orders(user_id, cursor=None, limit=None):
+    """Страница истории заказов: (заказы, курсор следующей страницы или None)"""
+    limit = limit or config.ORDERS_PAGE_SIZE
+    after = _FIRST_PAGE
+    if cursor:
+        created_at, _, order_id = cursor.rpartition('|')
+        after = (created_at, int(order_id))
+
+    conn = get_db_connection()
+    try:
+        # Одна лишняя строка показывает, есть ли следующая страница
+        orders = conn.execute(SQL_USER_ORDERS_PAGE, (user_id, *after, limit + 1)).fetchall()
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = f"{orders[-1]['created_at']}|{orders[-1]['id']}"
+    return orders, next_cursor
+
+
+def get_user_totals(user_id):
+    conn = get_db_connection()
+    try:
+        return conn.execute(SQL_USER_TOTALS, (user_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+# ========== РЕПЛИКА КАТАЛОГА ==========
+
+_catalog = None
+
+
+def get_catalog():
+    """Актуальный снимок каталога в памяти"""
+    global _catalog
+    if _catalog is None:
+        _catalog = CatalogReplica(get_db_connection, config.CATALOG_CHECK_INTERVAL)
+    return _catalog.get()
+
+
+_inline_search = None
+
+
+def get_inline_search():
+    """Поиск для inline-режима поверх снимка каталога"""
+    global _inline_search
+    if _inline_search is None:
+        _inline_search = InlineSearch(get_catalog, config.INLINE_CACHE_IDS)
+    return _inline_search
+
+
+_fuzzy_search = None
+
+
+def get_fuzzy_search():
+    """Нечеткий поиск (опечатки, транслитерация, сленг) поверх снимка каталога"""
+    global _fuzzy_search
+    if _fuzzy_search is None:
+        _fuzzy_search = FuzzySearch(get_catalog, config.FUZZY_THRESHOLD)
+    return _fuzzy_search
 
-        logger.info(f"✅ Создан заказ #{order_id} для пользователя {user_id}")
-        return order_id
 
+# ========== ФОТОГРАФИИ ТОВАРОВ ==========
+
+_photo_sender = None
+_photo_warmer = None
+
+
+def get_photo_warmer():
+    """Фоновый поток загрузки фото по URL (обработчики сами не скачивают)"""
+    global _photo_warmer
+    if _photo_warmer is None:
+        thumbnails = product_photos.ThumbnailCache(
+            config.PHOTO_CACHE_DIR, config.PHOTO_SOURCE_DIR, config.PHOTO_MAX_SIZE,
+            config.PHOTO_QUALITY, config.PHOTO_DOWNLOAD_TIMEOUT
+        )
+        _photo_warmer = product_photos.ThumbnailWarmer(thumbnails).start()
+    return _photo_warmer
+
+
+def get_photo_sender():
+    """Отправка фото товаров через текущий экземпляр бота"""
+    global _photo_sender
+    if _photo_sender is None or _photo_sender.api is not bot:
+        warmer = get_photo_warmer()
+        file_ids = product_photos.FileIdStore(get_db_connection, write_transaction)
+        _photo_sender = product_photos.PhotoSender(bot, warmer.thumbnails, file_ids, warmer=warmer)
+    return _photo_sender
+
+
+def start_photo_warmup():
+    """Фоновая загрузка фото каталога с общим сроком PHOTO_WARMUP_DEADLINE"""
+    if not config.PHOTOS_ENABLED:
+        return 0
+    catalog = get_catalog()
+    image_urls = [url for url in map(catalog.image_url, catalog.ids) if url]
+    queued = get_photo_warmer().warm_up(image_urls, config.PHOTO_WARMUP_DEADLINE)
+    logger.info("Фото каталога: в очереди на загрузку %s", queued)
+    return queued
+
+
+def stop_photo_warmer():
+    global _photo_warmer, _photo_sender
+    if _photo_warmer is not None:
+        _photo_warmer.stop()
+        _photo_warmer = None
+        _photo_sender = None
+
+
+def send_products_album(chat_id, products):
+    """Альбом фотографий первых товаров списка (перед текстовым списком)"""
+    if not config.PHOTOS_ENABLED:
+        return None
+    catalog = get_catalog()
+    items = [
+        (product['id'], catalog.image_url(product['id']), f"*{product['name']}*\n💰 {product['price']:,.0f}₽")
+        for product in products[:product_photos.MAX_MEDIA_GROUP]
+    ]
+    try:
+        return get_photo_sender().send_album(chat_id, items, parse_mode='Markdown')
     except Exception as e:
-        logger.error(f"Ошибка создания заказа: {e}")
+        # Без фото список все равно отправляется текстом
+        logger.warning("Альбом товаров не отправлен: %s", e)
         return None
 
 
+# ========== СОСТОЯНИЕ ДИАЛОГОВ ==========
+
+STATE_AWAITING_SEARCH = 'awaiting_search'
+
+_state_store = None
+
+
+def get_state_store():
+    """Хранилище состояния диалогов (создается при первом обращении)"""
+    global _state_store
+    if _state_store is None:
+        if config.STATE_BACKEND == 'memory':
+            _state_store = MemoryStateStore(config.STATE_TTL, config.STATE_CACHE_SIZE)
+        else:
+            _state_store = SQLiteStateStore(
+                DB_PATH, config.STATE_TTL, config.STATE_CACHE_SIZE,
+                flush_interval=config.STATE_FLUSH_INTERVAL, busy_timeout=config.DB_BUSY_TIMEOUT,
+                write=run_write
+            )
+    return _state_store
+
+
+def close_state_store():
+    """Запись несохраненных состояний при остановке"""
+    global _state_store
+    if _state_store is not None:
+        _state_store.close()
+        _state_store = None
+
+
+# ========== ОГРАНИЧЕНИЕ ЗАПРОСОВ ==========
+
+_admission = None
+
+# Ответы об отказе (не зависят от запроса, поэтому отказ почти ничего не стоит)
+RATE_LIMITED_TEXT = "⏳ Слишком много запросов. Подождите {seconds} с и попробуйте снова."
+BUSY_TEXT = "⏳ Бот сейчас загружен. Попробуйте через несколько секунд."
+
+
+def get_admission():
+    """Лимиты запросов пользователей (настраиваются переменными ADMISSION_*)"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionControl(
+            rate=config.ADMISSION_RATE,
+            burst=config.ADMISSION_BURST,
+            costs=parse_costs(config.ADMISSION_COSTS),
+            expensive=parse_names(config.ADMISSION_EXPENSIVE),
+            max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+            wait_timeout=config.ADMISSION_WAIT_TIMEOUT,
+            notice_interval=config.ADMISSION_NOTICE_INTERVAL,
+            max_users=config.ADMISSION_MAX_USERS,
+        )
+    return _admission
+
+
+def reject_update(update, decision):
+    """Ответ об отказе: не чаще раза за ADMISSION_NOTICE_INTERVAL, остальное молча"""
+    logger.info("Запрос отклонен: %s", decision)
+    if not decision.notify:
+        return
+    if decision.status == 'busy':
+        text = BUSY_TEXT
+    else:
+        text = RATE_LIMITED_TEXT.format(seconds=max(1, round(decision.retry_after)))
+    if getattr(update, 'data', None) is not None and hasattr(update, 'message'):
+        # Нажатие inline-кнопки
+        bot.answer_callback_query(update.id, text)
+    else:
+        bot.send_message(update.chat.id, text)
+
+
+def run_admitted(action, func, update, *args, **kwargs):
+    """Вызов func, только если пользователь укладывается в лимиты действия action"""
+    if not config.ADMISSION_ENABLED:
+        return func(update, *args, **kwargs)
+    with get_admission().admit(update.from_user.id, action) as decision:
+        if not decision:
+            reject_update(update, decision)
+            return None
+        return func(update, *args, **kwargs)
+
+
+def admitted(action):
+    """Декоратор обработчика: выполняется, только если пользователь укладывается в лимиты"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(update, *args, **kwargs):
+            return run_admitted(action, func, update, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # ========== КОМАНДЫ БОТА ==========
 
-@bot.message_handler(commands=['start'])
+@traced('start')
+@admitted('start')
 def send_welcome(message):
     """Приветственное сообщение"""
     user = message.from_user
-    logger.info(f"Пользователь {user.id} запустил бота")
+    logger.info("Пользователь %s запустил бота", user.id)
 
     update_user_activity(user.id, user.username, user.first_name, user.last_name)
 
@@ -421,6 +953,8 @@ def send_welcome(message):
 *Начните с Web App для удобного выбора!*
     """
 
+    from telebot import types
+
     web_app = types.WebAppInfo(url=WEB_APP_URL)
 
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
@@ -443,8 +977,14 @@ def send_welcome(message):
     )
 
 
-@bot.message_handler(commands=['help'])
+@traced('help')
+@admitted('help')
 def help_command(message):
+    """Команда /help"""
+    show_help(message)
+
+
+def show_help(message):
     """Справка по боту"""
     stats = get_store_statistics()
 
@@ -459,6 +999,8 @@ def help_command(message):
 /top - Топ товаров
 /categories - Все категории
 /web - Web App интерфейс
+/subscriptions - Подписки на цены
+/myorders - Мои заказы
 
 *Категории товаров:*
 • ⚡ Процессоры (CPU)
@@ -483,6 +1025,14 @@ def help_command(message):
 `/search AMD Ryzen`
 `/search процессор`
 
+*Inline-поиск в любом чате:*
+`@имя_бота ryzen`
+
+*Уведомления о ценах:*
+`/subscribe 4 45000` - сообщить, когда товар #4 подешевеет до 45 000₽ или появится в наличии
+`/unsubscribe 4` - отменить подписку
+`/subscriptions` - мои подписки
+
 *Информация о магазине:*
 • Товаров в наличии: {stats['in_stock_products'] if stats else 'N/A'}
 • Категорий: {stats['total_categories'] if stats else 'N/A'}
@@ -492,8 +1042,14 @@ def help_command(message):
     bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
 
 
-@bot.message_handler(commands=['stats'])
+@traced('stats')
+@admitted('stats')
 def stats_command(message):
+    """Команда /stats"""
+    show_stats(message)
+
+
+def show_stats(message):
     """Статистика магазина"""
     stats = get_store_statistics()
 
@@ -526,7 +1082,7 @@ def stats_command(message):
 • Версия бота: {BOT_VERSION}
 • Web App: `{WEB_APP_URL}`
 • База данных: SQLite
-• Логирование: parts_bot.log
+• Логирование: {config.LOG_FILE}
 
 *Рекомендация:* Используйте Web App для удобного заказа!
     """
@@ -534,10 +1090,16 @@ def stats_command(message):
     bot.send_message(message.chat.id, response, parse_mode='Markdown')
 
 
-@bot.message_handler(commands=['search'])
+@traced('search')
+@admitted('search')
 def search_command(message):
+    """Команда /search"""
+    prompt_search(message)
+
+
+def prompt_search(message):
     """Команда поиска"""
-    msg = bot.send_message(
+    bot.send_message(
         message.chat.id,
         "🔍 *Введите запрос для поиска товаров:*\n\n"
         "Можно искать по:\n"
@@ -547,27 +1109,20 @@ def search_command(message):
         "• Характеристикам (DDR5, PCIe 4.0)",
         parse_mode='Markdown'
     )
-    bot.register_next_step_handler(msg, search_products)
+    get_state_store().set(message.chat.id, STATE_AWAITING_SEARCH)
 
 
-@bot.message_handler(commands=['top'])
+@traced('top')
+@admitted('top')
 def top_command(message):
-    """Топ-10 товаров по рейтингу"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """Команда /top"""
+    show_top(message)
 
-        cursor.execute("""
-            SELECT p.name, p.price, p.rating, p.brand, c.name as category_name
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-            WHERE p.rating > 0 
-            ORDER BY p.rating DESC, p.popularity DESC 
-            LIMIT 10
-        """)
 
-        products = cursor.fetchall()
-        conn.close()
+def show_top(message):
+    """Топ-10 товаров по рейтингу"""
+    try:
+        products = get_catalog().top_products(10)
 
         if not products:
             bot.send_message(message.chat.id, "❌ Нет данных о рейтингах")
@@ -587,30 +1142,25 @@ def top_command(message):
 
         response += "*Используйте /search для поиска других товаров*"
 
+        send_products_album(message.chat.id, products)
         bot.send_message(message.chat.id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка получения топа: {e}")
+        logger.error("Ошибка получения топа: %s", e)
         bot.send_message(message.chat.id, "❌ Ошибка получения рейтингов")
 
 
-@bot.message_handler(commands=['categories'])
+@traced('categories')
+@admitted('categories')
 def categories_command(message):
-    """Список всех категорий"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """Команда /categories"""
+    show_categories(message)
 
-        cursor.execute("""
-            SELECT c.name, c.description, c.icon, COUNT(p.id) as product_count
-            FROM categories c
-            LEFT JOIN products p ON c.id = p.category_id
-            GROUP BY c.id
-            ORDER BY c.name
-        """)
 
-        categories = cursor.fetchall()
-        conn.close()
+def show_categories(message):
+    """Список всех категорий"""
+    try:
+        categories = get_catalog().categories_with_counts()
 
         response = "📁 *Все категории компьютерных комплектующих:*\n\n"
 
@@ -625,13 +1175,16 @@ def categories_command(message):
         bot.send_message(message.chat.id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка получения категорий: {e}")
+        logger.error("Ошибка получения категорий: %s", e)
         bot.send_message(message.chat.id, "❌ Ошибка получения категорий")
 
 
-@bot.message_handler(commands=['web'])
+@traced('web')
+@admitted('web')
 def web_command(message):
     """Прямая ссылка на Web App"""
+    from telebot import types
+
     web_app = types.WebAppInfo(url=WEB_APP_URL)
 
     keyboard = types.InlineKeyboardMarkup()
@@ -665,70 +1218,197 @@ def web_command(message):
     )
 
 
+@traced('subscribe')
+@admitted('subscribe')
+def subscribe_command(message):
+    """Подписка на снижение цены и поступление товара: /subscribe <id> [цена]"""
+    args = message.text.split()[1:]
+    try:
+        product_id = int(args[0])
+        max_price = float(args[1].replace(',', '.')) if len(args) > 1 else None
+    except (IndexError, ValueError):
+        bot.send_message(
+            message.chat.id,
+            "❌ Формат: `/subscribe <номер товара> [цена]`\nНапример: `/subscribe 4 45000`",
+            parse_mode='Markdown'
+        )
+        return
+
+    product = get_catalog().product_details(product_id)
+    if not product:
+        bot.send_message(message.chat.id, "❌ Товар не найден")
+        return
+    if max_price is not None and max_price <= 0:
+        bot.send_message(message.chat.id, "❌ Цена должна быть больше нуля")
+        return
+
+    try:
+        run_write(price_alerts.subscribe, message.from_user.id, product_id, max_price)
+    except Exception as e:
+        logger.error("Ошибка оформления подписки: %s", e)
+        bot.send_message(message.chat.id, "❌ Ошибка оформления подписки")
+        return
+
+    response = f"🔔 *Подписка оформлена:* {product['name']}\n"
+    response += f"💰 Сейчас: {product['price']:,.0f}₽\n"
+    if max_price is not None:
+        response += f"📉 Сообщу, когда цена станет не выше {max_price:,.0f}₽\n"
+    response += "📦 Сообщу, когда товар снова появится в наличии"
+    bot.send_message(message.chat.id, response, parse_mode='Markdown')
+
+
+@traced('unsubscribe')
+@admitted('unsubscribe')
+def unsubscribe_command(message):
+    """Отмена подписки: /unsubscribe <id>"""
+    args = message.text.split()[1:]
+    try:
+        product_id = int(args[0])
+    except (IndexError, ValueError):
+        bot.send_message(message.chat.id, "❌ Формат: `/unsubscribe <номер товара>`", parse_mode='Markdown')
+        return
+
+    try:
+        removed = run_write(price_alerts.unsubscribe, message.from_user.id, product_id)
+    except Exception as e:
+        logger.error("Ошибка отмены подписки: %s", e)
+        bot.send_message(message.chat.id, "❌ Ошибка отмены подписки")
+        return
+
+    if removed:
+        bot.send_message(message.chat.id, f"🔕 Подписка на товар #{product_id} отменена")
+    else:
+        bot.send_message(message.chat.id, f"ℹ️ Подписки на товар #{product_id} нет")
+
+
+@traced('subscriptions')
+@admitted('subscriptions')
+def subscriptions_command(message):
+    """Список подписок пользователя"""
+    try:
+        conn = get_db_connection()
+        subscriptions = price_alerts.user_subscriptions(conn, message.from_user.id)
+        conn.close()
+    except Exception as e:
+        logger.error("Ошибка получения подписок: %s", e)
+        bot.send_message(message.chat.id, "❌ Ошибка получения подписок")
+        return
+
+    if not subscriptions:
+        bot.send_message(
+            message.chat.id,
+            "🔕 У вас нет подписок\n\nОформить: `/subscribe <номер товара> [цена]`",
+            parse_mode='Markdown'
+        )
+        return
+
+    response = "🔔 *Ваши подписки:*\n\n"
+    for subscription in subscriptions:
+        status = "✅ В наличии" if subscription['in_stock'] else "⏳ Нет в наличии"
+        response += f"*#{subscription['product_id']} {subscription['name']}*\n"
+        response += f"   💰 {subscription['price']:,.0f}₽ | {status}\n"
+        if subscription['max_price'] is not None:
+            response += f"   📉 Жду цену до {subscription['max_price']:,.0f}₽\n"
+        response += "\n"
+    response += "*Отменить:* `/unsubscribe <номер товара>`"
+    bot.send_message(message.chat.id, response, parse_mode='Markdown')
+
+
+@traced('myorders')
+@admitted('myorders')
+def my_orders_command(message):
+    """История заказов пользователя"""
+    send_my_orders(message.chat.id, message.from_user.id)
+
+
+@traced('myorders_page')
+@admitted('myorders_page')
+def my_orders_page_callback(call):
+    """Следующая страница истории заказов (кнопка "Еще заказы")"""
+    bot.answer_callback_query(call.id)
+    send_my_orders(call.message.chat.id, call.from_user.id, call.data.split(':', 1)[1])
+
+
 # ========== ОБРАБОТКА WEB APP ==========
 
-@bot.message_handler(content_types=['web_app_data'])
+# Недавно обработанные сообщения Web App: (chat_id, message_id)
+recent_web_app_messages = RecentKeys(config.IDEMPOTENCY_CACHE_SIZE)
+
+@traced('web_app_data')
 def handle_web_app_data(message):
     """Обработка данных из Web App"""
+    if recent_web_app_messages.check_and_add((message.chat.id, message.message_id)):
+        logger.info("Повторная доставка сообщения %s пропущена", message.message_id)
+        return
+
     try:
         user = message.from_user
         web_app_data = json.loads(message.web_app_data.data)
         action = web_app_data.get('action')
+        set_context(action=action)
 
-        logger.info(f"Web App данные от {user.id}: {action}")
+        logger.info("Web App данные от %s: %s", user.id, action)
 
-        if action == 'get_categories':
-            send_categories_list(message.chat.id)
+        if not config.ADMISSION_ENABLED:
+            dispatch_web_app_action(message, user, action, web_app_data)
+            return
+        with get_admission().admit(user.id, f"web_{action}") as decision:
+            if not decision:
+                reject_update(message, decision)
+                return
+            dispatch_web_app_action(message, user, action, web_app_data)
 
-        elif action == 'get_products_by_category':
-            category_slug = web_app_data.get('category')
-            send_products_by_category(message.chat.id, category_slug)
+    except Exception as e:
+        logger.error("Ошибка обработки Web App данных: %s", e)
+        bot.send_message(message.chat.id, "❌ Ошибка обработки запроса")
 
-        elif action == 'get_product_details':
-            product_id = web_app_data.get('product_id')
-            send_product_details(message.chat.id, product_id)
 
-        elif action == 'search_products':
-            query = web_app_data.get('query')
-            search_products_web(message.chat.id, query)
+def dispatch_web_app_action(message, user, action, web_app_data):
+    """Выполнение действия Web App"""
+    if action == 'get_categories':
+        send_categories_list(message.chat.id)
 
-        elif action == 'get_top_products':
-            send_top_products(message.chat.id)
+    elif action == 'get_products_by_category':
+        category_slug = web_app_data.get('category')
+        send_products_by_category(message.chat.id, category_slug)
 
-        elif action == 'create_order':
-            order_data = web_app_data.get('order_data')
-            create_order_web(message.chat.id, user, order_data)
+    elif action == 'get_product_details':
+        product_id = web_app_data.get('product_id')
+        send_product_details(message.chat.id, product_id)
 
-        elif action == 'test':
-            bot.send_message(
-                message.chat.id,
-                f"✅ Web App подключен!\nДействие: {web_app_data.get('message', 'test')}"
-            )
+    elif action == 'get_products_by_price':
+        send_products_by_price(
+            message.chat.id, web_app_data.get('min_price'), web_app_data.get('max_price')
+        )
 
-        else:
-            bot.send_message(message.chat.id, "✅ Данные получены от Web App")
+    elif action == 'search_products':
+        query = web_app_data.get('query')
+        search_products_web(message.chat.id, query)
 
-    except Exception as e:
-        logger.error(f"Ошибка обработки Web App данных: {e}")
-        bot.send_message(message.chat.id, "❌ Ошибка обработки запроса")
+    elif action == 'get_top_products':
+        send_top_products(message.chat.id)
+
+    elif action == 'get_my_orders':
+        send_my_orders(message.chat.id, user.id, web_app_data.get('cursor'))
+
+    elif action == 'create_order':
+        order_data = web_app_data.get('order_data')
+        create_order_web(message.chat.id, user, order_data)
+
+    elif action == 'test':
+        bot.send_message(
+            message.chat.id,
+            f"✅ Web App подключен!\nДействие: {web_app_data.get('message', 'test')}"
+        )
+
+    else:
+        bot.send_message(message.chat.id, "✅ Данные получены от Web App")
 
 
 def send_categories_list(chat_id):
     """Отправка списка категорий"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT c.name, c.description, c.icon, c.slug, COUNT(p.id) as product_count
-            FROM categories c
-            LEFT JOIN products p ON c.id = p.category_id
-            GROUP BY c.id
-            ORDER BY c.name
-        """)
-
-        categories = cursor.fetchall()
-        conn.close()
+        categories = get_catalog().categories_with_counts()
 
         if not categories:
             bot.send_message(chat_id, "❌ Категории не найдены")
@@ -747,27 +1427,14 @@ def send_categories_list(chat_id):
         bot.send_message(chat_id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка отправки категорий: {e}")
+        logger.error("Ошибка отправки категорий: %s", e)
         bot.send_message(chat_id, "❌ Ошибка получения категорий")
 
 
 def send_products_by_category(chat_id, category_slug):
     """Отправка товаров по категории"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT p.id, p.name, p.price, p.brand, p.in_stock, p.rating, p.stock_quantity, c.name as category_name
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-            WHERE c.slug = ? 
-            ORDER BY p.rating DESC, p.popularity DESC
-            LIMIT 15
-        """, (category_slug,))
-
-        products = cursor.fetchall()
-        conn.close()
+        products = get_catalog().products_by_category(category_slug, 15)
 
         if not products:
             bot.send_message(chat_id, f"❌ В категории '{category_slug}' не найдено товаров")
@@ -798,29 +1465,49 @@ def send_products_by_category(chat_id, category_slug):
         response += f"*Найдено товаров: {len(products)}*\n"
         response += "*Используйте поиск для нахождения конкретных товаров*"
 
+        send_products_album(chat_id, products)
         bot.send_message(chat_id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка отправки товаров по категории: {e}")
+        logger.error("Ошибка отправки товаров по категории: %s", e)
         bot.send_message(chat_id, f"❌ Ошибка: {str(e)[:100]}")
 
 
-def send_product_details(chat_id, product_id):
-    """Отправка детальной информации о товаре"""
+def send_products_by_price(chat_id, min_price=None, max_price=None):
+    """Отправка товаров в диапазоне цен"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        min_price = float(min_price) if min_price not in (None, '') else None
+        max_price = float(max_price) if max_price not in (None, '') else None
+        products = get_catalog().products_by_price(min_price, max_price, 15)
 
-        cursor.execute("""
-            SELECT p.name, p.description, p.price, p.brand, p.specs, p.rating, 
-                   p.in_stock, p.stock_quantity, c.name as category_name
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-            WHERE p.id = ?
-        """, (product_id,))
+        price_range = f"{min_price or 0:,.0f}₽ - " + (f"{max_price:,.0f}₽" if max_price is not None else "∞")
 
-        product = cursor.fetchone()
-        conn.close()
+        if not products:
+            bot.send_message(chat_id, f"❌ В диапазоне {price_range} товаров не найдено")
+            return
+
+        response = f"💰 *Товары в диапазоне {price_range}:*\n\n"
+
+        for i, product in enumerate(products, 1):
+            stock_status = "✅" if product['in_stock'] else "⏳"
+            response += f"*{i}. {product['name']}*\n"
+            response += f"   🏷️ {product['brand']} | 📁 {product['category_name']}\n"
+            response += f"   💰 {product['price']:,.0f}₽ | 📊 {stock_status}\n\n"
+
+        response += f"*Показано товаров: {len(products)}*"
+
+        send_products_album(chat_id, products)
+        bot.send_message(chat_id, response, parse_mode='Markdown')
+
+    except Exception as e:
+        logger.error("Ошибка отправки товаров по цене: %s", e)
+        bot.send_message(chat_id, "❌ Ошибка фильтрации по цене")
+
+
+def send_product_details(chat_id, product_id):
+    """Отправка детальной информации о товаре"""
+    try:
+        product = get_catalog().product_details(product_id)
 
         if not product:
             bot.send_message(chat_id, "❌ Товар не найден")
@@ -853,36 +1540,62 @@ def send_product_details(chat_id, product_id):
 *Для заказа используйте Web App интерфейс!*
         """
 
+        if config.PHOTOS_ENABLED and send_product_photo(chat_id, product, response.strip()):
+            return
+
         bot.send_message(chat_id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка отправки деталей товара: {e}")
+        logger.error("Ошибка отправки деталей товара: %s", e)
         bot.send_message(chat_id, "❌ Ошибка получения информации")
 
 
-def search_products_web(chat_id, query):
-    """Поиск товаров из Web App"""
+def send_product_photo(chat_id, product, response):
+    """Карточка товара фотографией; False, если фото нет или отправить не удалось"""
+    caption = response if len(response) <= product_photos.MAX_CAPTION else \
+        f"🛒 *{product['name']}*\n💰 {product['price']:,.0f}₽"
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        message = get_photo_sender().send_photo(
+            chat_id, product['id'], product['image_url'], caption, parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.warning("Фото товара %s не отправлено: %s", product['id'], e)
+        return False
+    if message is None:
+        return False
+    if caption is not response:
+        # Описание не помещается в подпись к фото - отправляем его отдельно
+        bot.send_message(chat_id, response, parse_mode='Markdown')
+    return True
 
-        cursor.execute("""
-            SELECT p.name, p.brand, p.price, p.in_stock, p.rating, c.name as category_name
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-            WHERE p.name LIKE ? OR p.brand LIKE ? OR p.description LIKE ? OR c.name LIKE ?
-            ORDER BY p.rating DESC, p.price
-            LIMIT 15
-        """, (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%'))
 
-        products = cursor.fetchall()
+def find_products(query, limit=15):
+    """Поиск товаров по подстроке в названии, бренде, описании и категории"""
+    conn = get_db_connection()
+    try:
+        pattern = f'%{query}%'
+        return conn.execute(SQL_FIND_PRODUCTS, (pattern, pattern, pattern, pattern, limit)).fetchall()
+    finally:
         conn.close()
 
+
+def search_products_web(chat_id, query):
+    """Поиск товаров из Web App"""
+    try:
+        products = find_products(query)
+        fuzzy = not products
+        if fuzzy:
+            # Точный поиск пуст - пробуем с учетом опечаток и транслитерации
+            products = get_fuzzy_search().search(query, 15)
+
         if not products:
             bot.send_message(chat_id, f"❌ По запросу '{query}' ничего не найдено")
             return
 
-        response = f"🔍 *Результаты поиска: '{query}'*\n\n"
+        if fuzzy:
+            response = f"🔍 *По запросу '{query}' точных совпадений нет. Возможно, вы искали:*\n\n"
+        else:
+            response = f"🔍 *Результаты поиска: '{query}'*\n\n"
 
         for i, product in enumerate(products, 1):
             stock_status = "✅" if product['in_stock'] else "⏳"
@@ -902,30 +1615,68 @@ def search_products_web(chat_id, query):
         response += f"*Найдено товаров: {len(products)}*\n"
         response += "*Для уточнения используйте более конкретный запрос*"
 
+        send_products_album(chat_id, products)
         bot.send_message(chat_id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка поиска из Web App: {e}")
+        logger.error("Ошибка поиска из Web App: %s", e)
         bot.send_message(chat_id, "❌ Ошибка поиска")
 
 
-def send_top_products(chat_id):
-    """Отправка топа товаров"""
+ORDER_STATUSES = {
+    'pending': '🕐 Оформлен',
+    'confirmed': '📋 Подтвержден',
+    'shipped': '🚚 Отправлен',
+    'delivered': '✅ Доставлен',
+    'cancelled': '❌ Отменен',
+}
+
+
+def send_my_orders(chat_id, user_id, cursor=None):
+    """Отправка страницы истории заказов пользователя"""
+    from telebot import types
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        orders, next_cursor = get_user_orders(user_id, cursor)
 
-        cursor.execute("""
-            SELECT p.name, p.brand, p.price, p.rating, p.popularity, c.name as category_name
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-            WHERE p.rating > 0 
-            ORDER BY p.rating DESC, p.popularity DESC 
-            LIMIT 10
-        """)
+        if not orders:
+            if cursor:
+                bot.send_message(chat_id, "📭 Больше заказов нет")
+            else:
+                bot.send_message(chat_id, "📭 У вас пока нет заказов\n\nОформить заказ можно в Web App: /web")
+            return
 
-        products = cursor.fetchall()
-        conn.close()
+        if cursor:
+            response = "🧾 *Ваши заказы (продолжение):*\n\n"
+        else:
+            response = "🧾 *Ваши заказы:*\n\n"
+            totals = get_user_totals(user_id)
+            if totals and totals['total_orders']:
+                response += f"Всего заказов: *{totals['total_orders']}* на *{totals['total_spent']:,.0f}₽*\n\n"
+
+        for order in orders:
+            status = ORDER_STATUSES.get(order['status'], order['status'])
+            response += f"*#{order['id']}* от {order['created_at'][:16]} | {status}\n"
+            if order['summary']:
+                response += f"   📦 {order['summary']} ({order['items_count']} шт.)\n"
+            response += f"   💰 {order['total_price']:,.0f}₽\n\n"
+
+        keyboard = None
+        if next_cursor:
+            keyboard = types.InlineKeyboardMarkup()
+            keyboard.add(types.InlineKeyboardButton(text="➡️ Еще заказы", callback_data=f"myorders:{next_cursor}"))
+
+        bot.send_message(chat_id, response, reply_markup=keyboard, parse_mode='Markdown')
+
+    except Exception as e:
+        logger.error("Ошибка получения истории заказов: %s", e)
+        bot.send_message(chat_id, "❌ Ошибка получения истории заказов")
+
+
+def send_top_products(chat_id):
+    """Отправка топа товаров"""
+    try:
+        products = get_catalog().top_products(10)
 
         if not products:
             bot.send_message(chat_id, "❌ Нет данных для топа")
@@ -945,25 +1696,52 @@ def send_top_products(chat_id):
 
         response += "*Рейтинг основан на оценках покупателей*"
 
+        send_products_album(chat_id, products)
         bot.send_message(chat_id, response, parse_mode='Markdown')
 
     except Exception as e:
-        logger.error(f"Ошибка отправки топа: {e}")
+        logger.error("Ошибка отправки топа: %s", e)
         bot.send_message(chat_id, "❌ Ошибка получения топа")
 
 
 def create_order_web(chat_id, user, order_data):
     """Создание заказа из Web App"""
     try:
-        if not order_data or 'items' not in order_data or not order_data['items']:
+        try:
+            if order_data and order_data.get('cart'):
+                # Компактная корзина (cart_codec)
+                entries = decode_cart(order_data['cart'])
+            elif order_data and order_data.get('items'):
+                # Полные позиции от старых версий Web App: берутся только id и количество
+                entries = entries_from_items(order_data['items'])
+            else:
+                bot.send_message(chat_id, "❌ Корзина пуста!")
+                return
+        except CartDecodeError as e:
+            logger.warning("Некорректная корзина Web App: %s", e)
+            bot.send_message(chat_id, "❌ Не удалось прочитать корзину. Обновите Web App и попробуйте снова.")
+            return
+
+        # Названия и цены - из каталога, клиентским ценам бот не доверяет
+        items, missing = hydrate_cart(entries)
+        if missing:
+            bot.send_message(chat_id, f"⚠️ Товары больше не продаются и убраны из заказа: "
+                                      f"{', '.join(map(str, missing))}")
+        if not items:
             bot.send_message(chat_id, "❌ Корзина пуста!")
             return
+        total_price = sum(item['price'] * item['quantity'] for item in items)
 
-        items = order_data['items']
-        total_price = order_data.get('total', 0)
         address = order_data.get('address', 'Не указан')
         phone = order_data.get('phone', 'Не указан')
         notes = order_data.get('notes', '')
+        idempotency_key = order_data.get('idempotency_key')
+
+        # Двойное нажатие: заказ уже оформлен, повторно в БД не идем
+        existing_order_id = recent_order_keys.get(idempotency_key) if idempotency_key else None
+        if existing_order_id:
+            bot.send_message(chat_id, f"ℹ️ Заказ #{existing_order_id} уже оформлен")
+            return
 
         # Создаем заказ в БД
         order_id = create_order(
@@ -973,7 +1751,8 @@ def create_order_web(chat_id, user, order_data):
             total_price,
             address,
             phone,
-            notes
+            notes,
+            idempotency_key
         )
 
         if order_id:
@@ -1009,7 +1788,7 @@ def create_order_web(chat_id, user, order_data):
             bot.send_message(chat_id, "❌ Ошибка при создании заказа. Попробуйте еще раз.")
 
     except Exception as e:
-        logger.error(f"Ошибка создания заказа из Web App: {e}")
+        logger.error("Ошибка создания заказа из Web App: %s", e)
         bot.send_message(chat_id, "❌ Ошибка оформления заказа. Попробуйте еще раз.")
 
 
@@ -1030,28 +1809,56 @@ def search_products(message):
     search_products_web(message.chat.id, query)
 
 
-# ========== ОБРАБОТКА ТЕКСТОВЫХ КОМАНД ==========
+# Обработчики следующего шага диалога по состоянию чата: (действие для лимитов, обработчик)
+NEXT_STEP_HANDLERS = {
+    STATE_AWAITING_SEARCH: ('search_query', search_products),
+}
 
-@bot.message_handler(func=lambda message: True)
-def handle_text_commands(message):
-    """Обработка текстовых команд через кнопки"""
 
-    if message.text == '📁 Категории':
-        categories_command(message)
+# ========== INLINE-РЕЖИМ ==========
 
-    elif message.text == '🔍 Поиск':
-        search_command(message)
+@traced('inline')
+def handle_inline_query(inline_query):
+    """Inline-поиск товаров: @bot запрос"""
+    from telebot import types
 
-    elif message.text == '📊 Статистика':
-        stats_command(message)
+    try:
+        offset = int(inline_query.offset or 0)
+        products, next_offset = get_inline_search().search(
+            inline_query.query, offset, config.INLINE_PAGE_SIZE
+        )
+        if not products and not offset and inline_query.query.strip():
+            products = get_fuzzy_search().search(inline_query.query, config.INLINE_PAGE_SIZE)
 
-    elif message.text == '🆘 Помощь':
-        help_command(message)
+        results = []
+        for product in products:
+            stock_status = "✅ В наличии" if product['in_stock'] else "⏳ Под заказ"
+            text = (
+                f"🛒 *{product['name']}*\n"
+                f"🏷️ {product['brand']} | 📁 {product['category_name']}\n"
+                f"💰 {product['price']:,.0f}₽ | 📊 {stock_status}"
+            )
+            results.append(types.InlineQueryResultArticle(
+                id=str(product['id']),
+                title=product['name'],
+                description=f"{product['price']:,.0f}₽ • {product['brand']} • {product['category_name']}",
+                input_message_content=types.InputTextMessageContent(text, parse_mode='Markdown')
+            ))
+
+        bot.answer_inline_query(
+            inline_query.id, results,
+            cache_time=config.INLINE_CACHE_TIME, next_offset=next_offset
+        )
+
+    except Exception as e:
+        logger.error("Ошибка inline-поиска: %s", e)
 
-    elif message.text == '⭐ Топ товары':
-        top_command(message)
 
-    elif message.text == '📞 Контакты':
+# ========== ОБРАБОТКА ТЕКСТОВЫХ КОМАНД ==========
+
+def reply_text(message):
+    """Ответ на остальной текст: контакты, приветствие, подсказка"""
+    if message.text == '📞 Контакты':
         bot.send_message(
             message.chat.id,
             "📞 *Контакты магазина компьютерных комплектующих:*\n\n"
@@ -1081,27 +1888,347 @@ def handle_text_commands(message):
         )
 
 
-# ========== ЗАПУСК БОТА ==========
+# Кнопки меню: текст -> (действие для лимитов, обработчик без проверки лимитов)
+MENU_BUTTONS = {
+    '📁 Категории': ('categories', show_categories),
+    '🔍 Поиск': ('search', prompt_search),
+    '📊 Статистика': ('stats', show_stats),
+    '🆘 Помощь': ('help', show_help),
+    '⭐ Топ товары': ('top', show_top),
+}
 
-if __name__ == '__main__':
-    print("🚀 Инициализация бота компьютерных комплектующих...")
 
-    # Инициализация базы данных
+@traced('text')
+def handle_text_commands(message):
+    """Обработка текстовых команд через кнопки.
+
+    Лимиты проверяются здесь один раз, по действию, в которое разрешается
+    сообщение; вызываемые обработчики сами лимиты не проверяют.
+    """
+    store = get_state_store()
+    # Следующий шаг диалога (например, ответ на /search)
+    pending = store.get(message.chat.id)
+    if pending is not None and pending[0] in NEXT_STEP_HANDLERS:
+        action, handler = NEXT_STEP_HANDLERS[pending[0]]
+    else:
+        pending = None
+        action, handler = MENU_BUTTONS.get(message.text, ('text', reply_text))
+    set_context(action=action)
+
+    def run(message):
+        # Состояние снимается только после допуска: при отказе запрос можно повторить
+        if pending is not None:
+            store.delete(message.chat.id)
+        handler(message)
+
+    run_admitted(action, run, message)
+
+
+# ========== РАССЫЛКА УВЕДОМЛЕНИЙ ==========
+
+_alert_sender_stopped = threading.Event()
+_alert_sender_thread = None
+
+
+def send_price_alerts(batch_size=None):
+    """Отправка пачки уведомлений из очереди; возвращает price_alerts.Delivery"""
+    conn = get_db_connection()
+    try:
+        return price_alerts.deliver_notifications(
+            conn,
+            lambda user_id, text: bot.send_message(user_id, text, parse_mode='Markdown'),
+            write_transaction,
+            batch_size or config.ALERTS_BATCH_SIZE,
+            rate=config.ALERTS_SEND_RATE,
+            stopped=_alert_sender_stopped
+        )
+    finally:
+        conn.close()
+
+
+def start_alert_sender():
+    """Фоновый поток рассылки уведомлений о ценах (один на все процессы)"""
+    global _alert_sender_thread
+
+    def loop():
+        delay = config.ALERTS_DELIVERY_INTERVAL
+        while not _alert_sender_stopped.wait(delay):
+            delay = config.ALERTS_DELIVERY_INTERVAL
+            try:
+                while not _alert_sender_stopped.is_set():
+                    delivery = send_price_alerts()
+                    if delivery.retry_after:
+                        # Telegram ответил 429: следующая пачка - не раньше retry_after
+                        delay = max(delay, delivery.retry_after)
+                        break
+                    # Полная пачка - в очереди, вероятно, есть еще
+                    if delivery.processed < config.ALERTS_BATCH_SIZE:
+                        break
+            except Exception as e:
+                logger.error("Ошибка рассылки уведомлений: %s", e)
+
+    _alert_sender_stopped.clear()
+    thread = _alert_sender_thread = threading.Thread(target=loop, name='price-alerts', daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_alert_sender(timeout=10):
+    """Остановка рассылки до остановки очереди записи.
+
+    Пачка прерывается перед следующей отправкой, и уже отправленные
+    уведомления отмечаются через очередь записи: без ожидания отметка не
+    успела бы записаться, и уведомления ушли бы повторно после запуска.
+    """
+    global _alert_sender_thread
+    _alert_sender_stopped.set()
+    if _alert_sender_thread is not None:
+        _alert_sender_thread.join(timeout)
+        if _alert_sender_thread.is_alive():
+            logger.warning("Рассылка уведомлений не завершилась за %s с", timeout)
+        _alert_sender_thread = None
+
+
+# ========== РЕЗЕРВНОЕ КОПИРОВАНИЕ ==========
+
+_backup_scheduler = None
+
+
+def start_backup_scheduler():
+    """Резервные копии БД по расписанию (BACKUP_INTERVAL, 0 - выключено)"""
+    global _backup_scheduler
+    if config.BACKUP_INTERVAL <= 0:
+        return None
+    _backup_scheduler = backup.BackupScheduler(
+        DB_PATH, config.BACKUP_DIR, config.BACKUP_INTERVAL, config.BACKUP_KEEP,
+        config.BACKUP_STEP_PAGES, config.BACKUP_STEP_PAUSE, config.DB_BUSY_TIMEOUT
+    ).start()
+    return _backup_scheduler
+
+
+def stop_backup_scheduler():
+    global _backup_scheduler
+    if _backup_scheduler is not None:
+        _backup_scheduler.stop()
+        _backup_scheduler = None
+
+
+# ========== АРХИВ ЗАКАЗОВ ==========
+
+_archive_scheduler = None
+
+
+def start_archive_scheduler():
+    """Перенос старых заказов в архив по расписанию (ARCHIVE_INTERVAL, 0 - выключено)"""
+    global _archive_scheduler
+    if config.ARCHIVE_INTERVAL <= 0:
+        return None
+    statuses = [status.strip() for status in config.ARCHIVE_STATUSES.split(',') if status.strip()]
+    _archive_scheduler = order_archive.ArchiveScheduler(
+        write_transaction, get_db_connection, config.ARCHIVE_INTERVAL, config.ARCHIVE_AFTER_DAYS,
+        statuses, config.ARCHIVE_BATCH_SIZE, config.ARCHIVE_BATCH_PAUSE
+    ).start()
+    return _archive_scheduler
+
+
+def stop_archive_scheduler():
+    global _archive_scheduler
+    if _archive_scheduler is not None:
+        _archive_scheduler.stop()
+        _archive_scheduler = None
+
+
+# ========== ПРОФИЛИРОВАНИЕ ==========
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+def is_admin(message):
+    """Сообщение от администратора: id отправителя в ADMIN_CHAT_ID (можно несколько через запятую).
+
+    Проверяется пользователь, а не чат: в группе с администратором команду
+    может отправить любой участник.
+    """
+    admins = {user_id.strip() for user_id in config.ADMIN_CHAT_ID.split(',') if user_id.strip()}
+    return message.from_user is not None and str(message.from_user.id) in admins
+
+
+def start_profiling(seconds, on_done=None):
+    """Сеанс профилирования обработчиков; None, если сеанс уже идет"""
+    # cProfile, pstats и tracemalloc загружаются только при первом сеансе
+    import profiling
+    return profiling.start(
+        seconds, config.PROFILE_DIR, on_done,
+        sample_interval=config.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        memory_frames=config.PROFILE_MEMORY_FRAMES, top=config.PROFILE_TOP,
+    )
+
+
+def install_profile_signal():
+    """SIGUSR1 - профилирование на PROFILE_SECONDS со сводкой в лог (вызывать из главного потока)"""
+    return profiling_state.install_signal_handler(
+        config.PROFILE_SECONDS, config.PROFILE_DIR,
+        sample_interval=config.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        memory_frames=config.PROFILE_MEMORY_FRAMES, top=config.PROFILE_TOP,
+    )
+
+
+@traced('profile')
+def profile_command(message):
+    """Профилирование (только администратор): /profile [секунды], /profile stop"""
+    if not is_admin(message):
+        logger.warning("Команда /profile от %s отклонена: не администратор", message.from_user.id)
+        return
+
+    args = message.text.split()[1:]
+    if args and args[0] == 'stop':
+        if profiling_state.active is None:
+            bot.send_message(message.chat.id, "ℹ️ Профилирование не запущено")
+            return
+        # Модуль уже загружен: сеанс запущен через него
+        import profiling
+        profiling.stop()
+        return
+    try:
+        seconds = float(args[0]) if args else config.PROFILE_SECONDS
+    except ValueError:
+        bot.send_message(message.chat.id, "❌ Формат: /profile [секунды] или /profile stop")
+        return
+    seconds = min(max(seconds, 1), config.PROFILE_MAX_SECONDS)
+
+    chat_id = message.chat.id
+    # Сводка без Markdown: в именах функций и файлов есть "_"
+    session = start_profiling(
+        seconds, on_done=lambda session: bot.send_message(chat_id, session.summary[:MESSAGE_LIMIT])
+    )
+    if session is None:
+        bot.send_message(chat_id, "ℹ️ Профилирование уже идет, /profile stop - завершить")
+        return
+    bot.send_message(chat_id, f"⏱️ Профилирование запущено на {seconds:g} с, сводка придет по завершении")
+
+
+# ========== ФАБРИКА ПРИЛОЖЕНИЯ ==========
+
+def check_config():
+    """Проверка конфигурации бота"""
+    if not TOKEN or ':' not in TOKEN:
+        logger.error("❌ Неправильный формат токена!")
+        return False
+    return True
+
+
+def setup_database():
+    """Создание схемы, начальных данных и применение миграций"""
     if not os.path.exists(DB_PATH):
         print("📁 Создание новой базы данных...")
-        init_database()
-    else:
-        print("📁 База данных уже существует, проверяем структуру...")
+    init_database()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        # WAL: читатели не блокируют писателя, несколько процессов работают с одной БД
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = apply_migrations(conn)
+        if config.QUERY_AUDIT_ON_STARTUP:
+            log_audit(conn)
+        return version
+    finally:
+        conn.close()
+
+
+def warm_caches():
+    """Прогрев кэшей перед началом обработки сообщений"""
+    get_catalog()
+    get_inline_search().index()
+    return get_store_statistics(use_cache=False)
+
+
+def register_handlers(telegram_bot):
+    """Регистрация обработчиков (порядок важен: текстовый обработчик последним)"""
+    telegram_bot.register_message_handler(send_welcome, commands=['start'])
+    telegram_bot.register_message_handler(help_command, commands=['help'])
+    telegram_bot.register_message_handler(stats_command, commands=['stats'])
+    telegram_bot.register_message_handler(search_command, commands=['search'])
+    telegram_bot.register_message_handler(top_command, commands=['top'])
+    telegram_bot.register_message_handler(categories_command, commands=['categories'])
+    telegram_bot.register_message_handler(web_command, commands=['web'])
+    telegram_bot.register_message_handler(subscribe_command, commands=['subscribe'])
+    telegram_bot.register_message_handler(unsubscribe_command, commands=['unsubscribe'])
+    telegram_bot.register_message_handler(subscriptions_command, commands=['subscriptions'])
+    telegram_bot.register_message_handler(my_orders_command, commands=['myorders'])
+    telegram_bot.register_message_handler(profile_command, commands=['profile'])
+    telegram_bot.register_message_handler(handle_web_app_data, content_types=['web_app_data'])
+    telegram_bot.register_message_handler(handle_text_commands, func=lambda message: True)
+    telegram_bot.register_inline_handler(handle_inline_query, func=lambda inline_query: True)
+    telegram_bot.register_callback_query_handler(
+        my_orders_page_callback, func=lambda call: (call.data or '').startswith('myorders:')
+    )
+
+
+def create_bot(token=None, threaded=True):
+    """Создание экземпляра бота с зарегистрированными обработчиками"""
+    global bot
+    import telebot
+
+    bot = telebot.TeleBot(token or TOKEN, threaded=threaded)
+    register_handlers(bot)
+    return bot
+
+
+def create_app(token=None):
+    """Фабрика приложения: конфигурация, БД, кэши, бот.
+
+    Возвращает (bot, timings), где timings - длительность этапов в мс.
+    """
+    timings = {}
+
+    def phase(name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[name] = (time.perf_counter() - started) * 1000
+        return result
+
+    setup_logging()
+    phase('database', setup_database)
+    stats = phase('cache_warmup', warm_caches)
+    telegram_bot = phase('bot', create_bot, token)
 
-    # Проверка статистики
-    stats = get_store_statistics()
     if stats:
         print(f"📊 Товаров в базе: {stats['total_products']}")
         print(f"📊 Категорий: {stats['total_categories']}")
         print(f"📊 Пользователей: {stats['total_users']}")
 
+    logger.info("Время запуска: %s", ", ".join(f"{k}={v:.1f} мс" for k, v in timings.items()))
+    return telegram_bot, timings
+
+
+# ========== ЗАПУСК БОТА ==========
+
+def main():
+    """Запуск бота в режиме polling"""
+    started = time.perf_counter()
+    setup_logging()
+
+    if not check_config():
+        print("❌ ОШИБКА: Добавьте токен в файл .env")
+        return 1
+
+    print("=" * 60)
+    print(f"🖥️ {BOT_NAME} v{BOT_VERSION}")
+    print("=" * 60)
+    print(f"🌐 Web App URL: {WEB_APP_URL}")
+    print(f"📁 База данных: {DB_PATH}")
+    print("🚀 Инициализация бота компьютерных комплектующих...")
+
+    telegram_bot, _ = create_app()
+    install_profile_signal()
+    start_db_writer()
+    start_alert_sender()
+    start_backup_scheduler()
+    start_archive_scheduler()
+    start_photo_warmup()
+
     print("=" * 60)
-    print("✅ Бот запущен и готов к работе!")
+    print(f"✅ Бот запущен и готов к работе за {(time.perf_counter() - started) * 1000:.0f} мс!")
     print("📱 Откройте Telegram и найдите бота")
     print("⚡ Используйте /start для начала работы")
     print("🛒 Используйте Web App для удобного заказа")
@@ -1109,9 +2236,23 @@ if __name__ == '__main__':
     print("=" * 60)
 
     try:
-        bot.polling(none_stop=True, interval=0, timeout=30)
+        telegram_bot.polling(none_stop=True, interval=0, timeout=30)
     except KeyboardInterrupt:
         print("\n\n👋 Бот остановлен пользователем")
     except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
-        print(f"❌ Критическая ошибка: {e}")
\ No newline at end of file
+        logger.error("Ошибка при запуске бота: %s", e)
+        print(f"❌ Критическая ошибка: {e}")
+    finally:
+        stop_alert_sender()
+        stop_backup_scheduler()
+        stop_archive_scheduler()
+        stop_photo_warmer()
+        # Состояние диалогов дописывается через очередь записи - до ее остановки
+        close_state_store()
+        stop_db_writer()
+        shutdown_logging()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
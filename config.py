@@ -10,4 +10,113 @@ DB_PATH = 'computer_parts.db'
 WEB_APP_URL = os.getenv('WEB_APP_URL', 'https://chepuhn.github.io/computer-parts-store/')
 BOT_NAME = "Computer Parts Store"
 BOT_VERSION = "1.0.0"
-ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID', '')
\ No newline at end of file
+ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID', '')
+
+# Логирование
+LOG_FILE = os.getenv('LOG_FILE', 'parts_bot.log')
+LOG_JSON = os.getenv('LOG_JSON', '0') == '1'
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')  # например 'midnight'; пусто - ротация по размеру
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '7'))
+LOG_COMPRESS = os.getenv('LOG_COMPRESS', '1') == '1'
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+# Кэширование
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '60'))  # секунды
+
+# База данных и процессы
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '10'))  # секунды ожидания блокировки
+WORKERS = int(os.getenv('WORKERS', '0'))  # 0 - по числу ядер
+
+# Состояние диалогов
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')  # 'sqlite' или 'memory'
+STATE_TTL = float(os.getenv('STATE_TTL', '900'))  # секунды до сброса незавершенного диалога
+STATE_CACHE_SIZE = int(os.getenv('STATE_CACHE_SIZE', '10000'))
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '1.0'))
+
+# Реплика каталога в памяти
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', '2.0'))  # секунды между проверками версии
+
+# Защита от повторной обработки
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+
+# Диагностика запросов
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))  # порог журнала медленных запросов, 0 - выключен
+QUERY_AUDIT_ON_STARTUP = os.getenv('QUERY_AUDIT_ON_STARTUP', '0') == '1'
+
+# Inline-режим (включается в @BotFather командой /setinline)
+INLINE_PAGE_SIZE = int(os.getenv('INLINE_PAGE_SIZE', '20'))  # результатов на страницу (максимум 50)
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '60'))  # секунды кэширования на стороне Telegram
+INLINE_CACHE_IDS = int(os.getenv('INLINE_CACHE_IDS', '2000000'))  # id товаров во всех префиксах кэша (4 байта на id)
+
+# Уведомления о снижении цены и поступлении товара
+ALERTS_DELIVERY_INTERVAL = float(os.getenv('ALERTS_DELIVERY_INTERVAL', '5'))  # секунды между рассылками
+ALERTS_BATCH_SIZE = int(os.getenv('ALERTS_BATCH_SIZE', '100'))  # уведомлений за одну пачку
+ALERTS_SEND_RATE = float(os.getenv('ALERTS_SEND_RATE', '25'))  # сообщений в секунду (лимит Telegram - около 30)
+
+# Фотографии товаров
+PHOTOS_ENABLED = os.getenv('PHOTOS_ENABLED', '0') == '1'  # включать после заполнения products.image_url
+PHOTO_SOURCE_DIR = os.getenv('PHOTO_SOURCE_DIR', 'images')  # каталог для локальных image_url
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', 'photo_cache')  # миниатюры по хэшу содержимого
+PHOTO_MAX_SIZE = int(os.getenv('PHOTO_MAX_SIZE', '800'))  # максимальная сторона миниатюры, px
+PHOTO_QUALITY = int(os.getenv('PHOTO_QUALITY', '85'))  # качество JPEG
+PHOTO_DOWNLOAD_TIMEOUT = float(os.getenv('PHOTO_DOWNLOAD_TIMEOUT', '10'))  # секунды
+PHOTO_WARMUP_DEADLINE = float(os.getenv('PHOTO_WARMUP_DEADLINE', '120'))  # секунд на фоновую загрузку всех фото каталога при запуске
+
+# Нечеткий поиск (запасной вариант, когда точный поиск ничего не нашел)
+FUZZY_THRESHOLD = float(os.getenv('FUZZY_THRESHOLD', '0.3'))  # минимальное сходство по триграммам
+
+# Резервное копирование (python backup.py create|list|verify|restore)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL = float(os.getenv('BACKUP_INTERVAL', '21600'))  # секунды между копиями, 0 - выключено
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))  # сколько последних копий хранить
+BACKUP_STEP_PAGES = int(os.getenv('BACKUP_STEP_PAGES', '256'))  # страниц за один шаг копирования
+BACKUP_STEP_PAUSE = float(os.getenv('BACKUP_STEP_PAUSE', '0.005'))  # пауза между шагами, секунды
+
+# История заказов (/myorders)
+ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_PAGE_SIZE', '10'))
+
+# Синхронизация с прайсом поставщика (python supplier_sync.py FEED)
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', '1000'))  # строк прайса на одну транзакцию
+
+# Ограничение частоты запросов (корзина токенов на пользователя)
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_RATE = float(os.getenv('ADMISSION_RATE', '1'))  # токенов в секунду
+ADMISSION_BURST = float(os.getenv('ADMISSION_BURST', '10'))  # емкость корзины
+# Стоимость действий (по умолчанию 1); web_<action> - действия Web App
+ADMISSION_COSTS = os.getenv(
+    'ADMISSION_COSTS',
+    'stats=4,search_query=3,web_search_products=3,web_get_products_by_price=2,'
+    'web_create_order=3,myorders=2,myorders_page=2,web_get_my_orders=2'
+)
+# Дорогие действия: ограничено число одновременно выполняемых
+ADMISSION_EXPENSIVE = os.getenv(
+    'ADMISSION_EXPENSIVE', 'stats,search_query,web_search_products,web_get_products_by_price,web_create_order'
+)
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '4'))
+ADMISSION_WAIT_TIMEOUT = float(os.getenv('ADMISSION_WAIT_TIMEOUT', '0.5'))  # ожидание свободного слота, секунды
+ADMISSION_NOTICE_INTERVAL = float(os.getenv('ADMISSION_NOTICE_INTERVAL', '10'))  # не чаще одного ответа об отказе
+ADMISSION_MAX_USERS = int(os.getenv('ADMISSION_MAX_USERS', '50000'))  # корзин в памяти
+
+# Архив заказов (python order_archive.py)
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL', '86400'))  # секунды между запусками, 0 - выключено
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))  # возраст заказа для переноса
+ARCHIVE_STATUSES = os.getenv('ARCHIVE_STATUSES', 'delivered,cancelled')  # только завершенные заказы
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))  # заказов на одну транзакцию
+ARCHIVE_BATCH_PAUSE = float(os.getenv('ARCHIVE_BATCH_PAUSE', '0.05'))  # пауза между пачками, секунды
+
+# Очередь записи в БД: один поток записи на процесс, групповая фиксация
+DB_WRITER_ENABLED = os.getenv('DB_WRITER_ENABLED', '1') == '1'
+DB_WRITER_MAX_BATCH = int(os.getenv('DB_WRITER_MAX_BATCH', '256'))  # операций на одну транзакцию
+DB_WRITER_MAX_DELAY_MS = float(os.getenv('DB_WRITER_MAX_DELAY_MS', '0'))  # ожидание операций для группы
+DB_WRITER_SYNCHRONOUS = os.getenv('DB_WRITER_SYNCHRONOUS', 'FULL')  # FULL или NORMAL (быстрее, см. db_writer.py)
+DB_WRITER_QUEUE_SIZE = int(os.getenv('DB_WRITER_QUEUE_SIZE', '10000'))
+DB_WRITER_TIMEOUT = float(os.getenv('DB_WRITER_TIMEOUT', '10'))  # ожидание фиксации, секунды
+
+# Профилирование по запросу: /profile [секунды] из ADMIN_CHAT_ID или сигнал SIGUSR1
+PROFILE_SECONDS = float(os.getenv('PROFILE_SECONDS', '30'))  # длительность по умолчанию
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '300'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # .pstats, .collapsed, .memory.txt
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))  # период выборки стеков
+PROFILE_MEMORY_FRAMES = int(os.getenv('PROFILE_MEMORY_FRAMES', '10'))  # глубина стеков tracemalloc
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', '15'))  # строк в отчете о памяти
@@ -0,0 +1,253 @@
+"""
+Хранилище состояния диалогов (вместо register_next_step_handler)
+
+Состояние чата ("ждем поисковый запрос" и т.п.) хранится в SQLite и
+переживает перезапуск бота, а при многопроцессном запуске доступно любому
+рабочему процессу. Перед SQLite стоит LRU-кэш в памяти; изменения пишутся
+в БД пакетами фоновым потоком. Просроченные состояния удаляются по TTL.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+# Маркер удаленного состояния в очереди записи
+_DELETED = object()
+
+# Таблица создается миграцией схемы бота (computer_parts_bot.MIGRATIONS)
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS conversation_state (
+        chat_id INTEGER PRIMARY KEY,
+        state TEXT NOT NULL,
+        data TEXT,
+        expires_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_conversation_state_expires ON conversation_state (expires_at)",
+]
+
+SQL_STATE_GET = register_query('state_get', """
+    SELECT state, data, expires_at FROM conversation_state WHERE chat_id = ?
+""")
+
+SQL_STATE_PUT = register_query('state_put', """
+    INSERT OR REPLACE INTO conversation_state (chat_id, state, data, expires_at) VALUES (?, ?, ?, ?)
+""")
+
+SQL_STATE_DELETE = register_query('state_delete', """
+    DELETE FROM conversation_state WHERE chat_id = ?
+""")
+
+SQL_STATE_EXPIRE = register_query('state_expire', """
+    DELETE FROM conversation_state WHERE expires_at <= ?
+""")
+
+
+def _write_changes(conn, upserts, deletes):
+    if upserts:
+        conn.executemany(SQL_STATE_PUT, upserts)
+    if deletes:
+        conn.executemany(SQL_STATE_DELETE, deletes)
+
+
+def _expire(conn, now):
+    return conn.execute(SQL_STATE_EXPIRE, (now,)).rowcount
+
+
+class MemoryStateStore:
+    """Состояние диалогов в памяти: LRU с ограничением размера и TTL"""
+
+    def __init__(self, ttl=900, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chat_id -> (state, data, expires_at)
+        self._lock = threading.Lock()
+
+    def _load(self, chat_id):
+        """Чтение из постоянного хранилища при промахе кэша"""
+        return None
+
+    def get(self, chat_id):
+        """Текущее состояние чата: (state, data) или None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is not None:
+                self._entries.move_to_end(chat_id)
+        if entry is None:
+            entry = self._load(chat_id)
+            if entry is None:
+                return None
+            self._remember(chat_id, entry)
+        state, data, expires_at = entry
+        if expires_at <= now:
+            self.delete(chat_id)
+            return None
+        return state, data
+
+    def set(self, chat_id, state, data=None, ttl=None):
+        entry = (state, data or {}, time.time() + (ttl or self.ttl))
+        self._remember(chat_id, entry)
+        self._changed(chat_id, entry)
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+        self._changed(chat_id, _DELETED)
+
+    def pop(self, chat_id):
+        """Получение и удаление состояния одним вызовом"""
+        current = self.get(chat_id)
+        if current is not None:
+            self.delete(chat_id)
+        return current
+
+    def _remember(self, chat_id, entry):
+        with self._lock:
+            self._entries[chat_id] = entry
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _changed(self, chat_id, entry):
+        """Изменение состояния (для записи в постоянное хранилище)"""
+
+    def evict_expired(self):
+        """Удаление просроченных состояний из памяти"""
+        now = time.time()
+        with self._lock:
+            expired = [chat_id for chat_id, entry in self._entries.items() if entry[2] <= now]
+            for chat_id in expired:
+                del self._entries[chat_id]
+        return len(expired)
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStateStore(MemoryStateStore):
+    """Состояние диалогов в SQLite с LRU-кэшем и пакетной записью.
+
+    Изменения копятся в памяти и записываются одной транзакцией раз в
+    flush_interval секунд (или при достижении flush_batch изменений).
+    Просроченные состояния удаляются из БД раз в sweep_interval секунд
+    (по умолчанию ttl / 2). Таблица conversation_state (SCHEMA) должна быть
+    создана миграцией.
+
+    write(func, *args) выполняет func(conn, *args) в транзакции записи и
+    возвращает результат (в боте - run_write, то есть через общую очередь
+    записи процесса). Без него изменения пишутся на собственном соединении
+    хранилища, которое в любом случае используется для чтения.
+    """
+
+    def __init__(self, db_path, ttl=900, max_entries=10000, flush_interval=1.0,
+                 flush_batch=500, busy_timeout=10, write=None, sweep_interval=None):
+        super().__init__(ttl, max_entries)
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.sweep_interval = ttl / 2 if sweep_interval is None else sweep_interval
+        self.flush_batch = flush_batch
+        self._conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+        self._write = write or self._write_own
+        self._conn_lock = threading.Lock()
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._last_sweep = time.monotonic()
+        self._thread = threading.Thread(target=self._flush_loop, name='state-flush', daemon=True)
+        self._thread.start()
+
+    def _load(self, chat_id):
+        with self._dirty_lock:
+            pending = self._dirty.get(chat_id)
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return pending
+        with self._conn_lock:
+            row = self._conn.execute(SQL_STATE_GET, (chat_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else {}, row[2]
+
+    def _changed(self, chat_id, entry):
+        with self._dirty_lock:
+            self._dirty[chat_id] = entry
+            pending = len(self._dirty)
+        if pending >= self.flush_batch:
+            self._wakeup.set()
+
+    def flush(self):
+        """Запись накопленных изменений одной транзакцией"""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        upserts = [
+            (chat_id, entry[0], json.dumps(entry[1], ensure_ascii=False), entry[2])
+            for chat_id, entry in dirty.items() if entry is not _DELETED
+        ]
+        deletes = [(chat_id,) for chat_id, entry in dirty.items() if entry is _DELETED]
+        try:
+            self._write(_write_changes, upserts, deletes)
+        except sqlite3.Error as e:
+            logger.error("Ошибка записи состояния диалогов: %s", e)
+            self._requeue(dirty)
+            return 0
+        except Exception:
+            self._requeue(dirty)
+            raise
+        return len(dirty)
+
+    def _requeue(self, dirty):
+        """Возврат изменений в очередь, если их не перезаписали новые"""
+        with self._dirty_lock:
+            for chat_id, entry in dirty.items():
+                self._dirty.setdefault(chat_id, entry)
+
+    def evict_expired(self):
+        """Удаление просроченных состояний из памяти и из БД"""
+        evicted = super().evict_expired()
+        return evicted + self._write(_expire, time.time())
+
+    def _write_own(self, func, *args):
+        with self._conn_lock, self._conn:
+            return func(self._conn, *args)
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Любая ошибка итерации только логируется: упавший поток молча перестал бы сохранять состояние
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Ошибка фоновой записи состояния диалогов: %s", e)
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                try:
+                    self.evict_expired()
+                except Exception as e:
+                    logger.error("Ошибка очистки состояния диалогов: %s", e)
+
+    def close(self):
+        """Остановка фонового потока с записью оставшихся изменений"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,277 @@
+"""
+Очередь записи в SQLite с групповой фиксацией
+
+Единственное соединение записи процесса принадлежит отдельному потоку.
+Обработчики не открывают свои транзакции, а ставят операции в очередь:
+операция - функция func(conn, *args), выполняемая в потоке записи.
+Поток берет из очереди все накопившиеся операции (до max_batch), выполняет
+их в одной транзакции и фиксирует одним COMMIT - одна синхронизация с
+диском на группу вместо одной на операцию. Результат возвращается через
+concurrent.futures.Future после COMMIT, то есть когда запись уже
+сохранена.
+
+Каждая операция выполняется внутри SAVEPOINT: исключение откатывает
+только ее, остальные операции группы фиксируются.
+
+Длинные пакетные задачи (архив, синхронизация прайса, рассылка) пишут
+через transaction(): поток записи фиксирует текущую группу, открывает
+транзакцию и передает соединение вызывающему потоку до конца блока with.
+
+Задержка и надежность настраиваются:
+    max_delay     сколько ждать новых операций для группы (0 - не ждать,
+                  группа - то, что накопилось, пока шел предыдущий COMMIT)
+    max_batch     максимум операций в одной транзакции
+    synchronous   FULL - COMMIT переживает отключение питания; NORMAL -
+                  быстрее, в режиме WAL при сбое питания можно потерять
+                  последние транзакции, но не целостность БД
+    timeout       сколько вызывающий поток ждет результата
+Между процессами (supervisor.py) запись по-прежнему разделяется
+блокировкой SQLite: у каждого процесса своя очередь.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Маркер остановки потока записи
+_STOP = object()
+
+
+class WriteQueueError(sqlite3.OperationalError):
+    """Очередь записи переполнена, остановлена или не ответила вовремя"""
+
+
+class _Operation:
+    __slots__ = ('func', 'args', 'future')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.future = Future()
+
+
+class _Exclusive:
+    """Передача соединения записи вызывающему потоку на время транзакции"""
+
+    def __init__(self):
+        self.granted = Future()  # -> соединение с открытой транзакцией
+        self.released = threading.Event()
+        self.done = threading.Event()
+        self.commit = False
+        self.error = None
+
+
+class WriteQueue:
+    """Поток записи с очередью операций и групповой фиксацией.
+
+    connect() должен открывать соединение с check_same_thread=False: оно
+    используется потоком записи и (в transaction()) вызывающими потоками,
+    но всегда только одним потоком одновременно.
+    """
+
+    def __init__(self, connect, max_batch=256, max_delay=0.0, synchronous='FULL', max_queue=10000,
+                 timeout=10.0):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous должен быть одним из {', '.join(SYNCHRONOUS_MODES)}")
+        self.connect = connect
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._queue = queue.Queue(max_queue)
+        self._local = threading.local()
+        self._thread = None
+        self._pid = None
+        self._closed = True
+        # Счетчики: операций выполнено, с ошибкой, транзакций зафиксировано
+        self.operations = 0
+        self.failed = 0
+        self.commits = 0
+
+    @property
+    def running(self):
+        """Поток записи работает в этом процессе (после fork очередь родителя не обслуживается)"""
+        return not self._closed and self._pid == os.getpid()
+
+    def start(self):
+        conn = self.connect()
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        self._closed = False
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._loop, args=(conn,), name='db-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка: операции, уже стоящие в очереди, выполняются"""
+        if not self.running:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info("Очередь записи: %s операций (%s с ошибкой), %s транзакций",
+                    self.operations, self.failed, self.commits)
+
+    # ---------- вызывающие потоки ----------
+
+    def _put(self, item):
+        if self._closed:
+            raise WriteQueueError("очередь записи остановлена")
+        if getattr(self._local, 'exclusive', False) or threading.current_thread() is self._thread:
+            # Поток записи ждет этот же поток - ожидание никогда не закончится
+            raise RuntimeError("запись в очередь изнутри транзакции записи")
+        try:
+            self._queue.put(item, timeout=self.timeout)
+        except queue.Full:
+            raise WriteQueueError(f"очередь записи переполнена ({self._queue.maxsize} операций)") from None
+
+    def submit(self, func, *args):
+        """Постановка операции func(conn, *args) в очередь; Future с результатом после COMMIT"""
+        operation = _Operation(func, args)
+        self._put(operation)
+        return operation.future
+
+    def execute(self, func, *args):
+        """Выполнение операции с ожиданием фиксации; исключение операции пробрасывается"""
+        future = self.submit(func, *args)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # Операция может быть выполнена позже, но вызывающий поток уже не ждет
+            raise WriteQueueError(f"запись не зафиксирована за {self.timeout} с") from None
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция в вызывающем потоке на соединении записи (BEGIN IMMEDIATE ... COMMIT)"""
+        request = _Exclusive()
+        self._put(request)
+        try:
+            conn = request.granted.result(self.timeout)
+        except FutureTimeoutError:
+            if request.granted.cancel():
+                raise WriteQueueError(f"очередь записи не освободилась за {self.timeout} с") from None
+            # Поток записи уже открывает транзакцию - дожидаемся
+            conn = request.granted.result()
+
+        self._local.exclusive = True
+        try:
+            yield conn
+            request.commit = True
+        finally:
+            self._local.exclusive = False
+            request.released.set()
+            request.done.wait()
+        if request.error is not None:
+            raise request.error
+
+    # ---------- поток записи ----------
+
+    def _loop(self, conn):
+        carry = None
+        try:
+            while True:
+                item = carry if carry is not None else self._queue.get()
+                carry = None
+                if item is _STOP:
+                    break
+                if isinstance(item, _Exclusive):
+                    self._run_exclusive(conn, item)
+                    continue
+
+                group = [item]
+                deadline = time.monotonic() + self.max_delay
+                while len(group) < self.max_batch:
+                    try:
+                        if self.max_delay > 0:
+                            item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if not isinstance(item, _Operation):
+                        carry = item
+                        break
+                    group.append(item)
+                self._run_group(conn, group)
+        finally:
+            conn.close()
+
+    def _run_group(self, conn, group):
+        group = [operation for operation in group if operation.future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            logger.error("Очередь записи: не удалось начать транзакцию: %s", e)
+            for operation in group:
+                operation.future.set_exception(e)
+            self.failed += len(group)
+            return
+
+        done = []
+        try:
+            for operation in group:
+                conn.execute("SAVEPOINT operation")
+                try:
+                    result = operation.func(conn, *operation.args)
+                except Exception as e:
+                    operation.future.set_exception(e)
+                    self.failed += 1
+                    # Некоторые ошибки (например, SQLITE_FULL) откатывают всю транзакцию
+                    conn.execute("ROLLBACK TO operation")
+                    conn.execute("RELEASE operation")
+                    continue
+                conn.execute("RELEASE operation")
+                done.append((operation.future, result))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("Очередь записи: транзакция отменена: %s", e)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Результаты выполненных операций еще не отданы - они тоже отменены
+            failed = [operation.future for operation in group if not operation.future.done()]
+            for future in failed:
+                future.set_exception(e)
+            self.failed += len(failed)
+            return
+        self.commits += 1
+        self.operations += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+    def _run_exclusive(self, conn, request):
+        if not request.granted.set_running_or_notify_cancel():
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            request.granted.set_exception(e)
+            return
+        request.granted.set_result(conn)
+        request.released.wait()
+        try:
+            if request.commit:
+                conn.execute("COMMIT")
+                self.commits += 1
+                self.operations += 1
+            else:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            request.error = e
+        finally:
+            request.done.set()
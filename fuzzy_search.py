@@ -0,0 +1,241 @@
+"""
+Нечеткий поиск товаров по триграммам
+
+Используется, когда поиск по подстроке ничего не нашел ("райзен",
+"rtx4060", "видюха", "samsnug"). Запрос и строки товаров (название, бренд,
+категория) приводятся к одному виду: нижний регистр, кириллица
+транслитерируется в латиницу, буквы отделяются от цифр ("rtx4060" ->
+"rtx 4060"), разговорные названия категорий заменяются по словарю.
+
+Индекс двухуровневый: триграмма -> слова словаря, слово -> товары. Для
+слова запроса кандидаты берутся только из списков его триграмм, поэтому
+поиск не просматривает весь каталог. Сходство слов - коэффициент Жаккара
+по триграммам (как в pg_trgm), числа сравниваются точно или по префиксу.
+"""
+
+import copy
+import logging
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Минимальное сходство слова и итоговой оценки товара
+SIMILARITY_THRESHOLD = 0.3
+
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+}
+# После транслитерации "c" и "k" звучат одинаково ("корсар" / "corsair")
+_TRANSLIT_TABLE = str.maketrans({**_TRANSLIT, 'c': 'k'})
+
+# Разговорные названия -> слова из названий категорий и товаров
+SYNONYMS = {
+    'видюха': 'видеокарта', 'видюшка': 'видеокарта', 'видяха': 'видеокарта', 'видеокарточка': 'видеокарта',
+    'проц': 'процессор', 'камень': 'процессор',
+    'мать': 'материнская плата', 'материнка': 'материнская плата', 'мамка': 'материнская плата',
+    'мп': 'материнская плата',
+    'оперативка': 'оперативная память', 'оператива': 'оперативная память', 'озу': 'оперативная память',
+    'оперативки': 'оперативная память', 'рам': 'ram',
+    # "ssd" и "hdd" есть только в описаниях, которые не индексируются: ведем в категорию
+    'ссд': 'накопители', 'ssd': 'накопители', 'хдд': 'накопители', 'hdd': 'накопители',
+    'винт': 'накопители', 'хард': 'накопители', 'диск': 'накопители',
+    'бп': 'блок питания', 'блок': 'блок питания',
+    'кулер': 'охлаждение', 'охлад': 'охлаждение', 'вентилятор': 'охлаждение', 'водянка': 'охлаждение',
+    'моник': 'монитор', 'монитор': 'мониторы',
+    'клава': 'клавиатура', 'клавиатура': 'клавиатуры',
+    'мышка': 'мыши', 'мышь': 'мыши',
+    'уши': 'наушники аудио', 'наушники': 'наушники аудио', 'колонки': 'аудио',
+    'роутер': 'сеть роутер', 'вайфай': 'wi-fi сеть',
+}
+
+_SPLIT_RE = re.compile(r'[^\W_]+')
+_DIGIT_BOUNDARY_RE = re.compile(r'(?<=\d)(?=[^\W\d_])|(?<=[^\W\d_])(?=\d)')
+
+
+def _words(text):
+    text = _DIGIT_BOUNDARY_RE.sub(' ', (text or '').lower())
+    return _SPLIT_RE.findall(text)
+
+
+def normalize(text, synonyms=True):
+    """Слова строки в нормальном виде: латиница, буквы отдельно от цифр"""
+    words = []
+    for word in _words(text):
+        if synonyms and word in SYNONYMS:
+            words.extend(_words(SYNONYMS[word]))
+        else:
+            words.append(word)
+    return [word.translate(_TRANSLIT_TABLE) for word in words if word]
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """Триграммный индекс по названиям, брендам и категориям одного снимка каталога"""
+
+    def __init__(self, snapshot, threshold=SIMILARITY_THRESHOLD):
+        self.snapshot = snapshot
+        self.threshold = threshold
+        self._word_ids = {}
+        self._words = []
+        postings = []
+        brand_words = [normalize(brand, synonyms=False) for brand in snapshot.brands]
+        category_words = [
+            normalize(f"{category['name']} {category['slug']}", synonyms=False)
+            for category in snapshot.categories
+        ]
+        for i in range(len(snapshot)):
+            words = set(normalize(snapshot.names[i], synonyms=False))
+            words.update(brand_words[snapshot.brand_codes[i]])
+            words.update(category_words[snapshot.category_codes[i]])
+            for word in words:
+                word_id = self._word_ids.get(word)
+                if word_id is None:
+                    word_id = self._word_ids[word] = len(self._words)
+                    self._words.append(word)
+                    postings.append(array('I'))
+                postings[word_id].append(i)
+        self._postings = postings
+
+        by_trigram = defaultdict(lambda: array('I'))
+        self._trigram_counts = array('H')
+        for word_id, word in enumerate(self._words):
+            grams = trigrams(word)
+            self._trigram_counts.append(len(grams))
+            if not word.isdigit():
+                for gram in grams:
+                    by_trigram[gram].append(word_id)
+        self._by_trigram = dict(by_trigram)
+        self._numbers = sorted(word for word in self._words if word.isdigit())
+
+    def __len__(self):
+        return len(self._words)
+
+    def rebind(self, snapshot):
+        """Индекс для снимка с теми же названиями: словарь и списки общие"""
+        index = copy.copy(self)
+        index.snapshot = snapshot
+        return index
+
+    def similar_words(self, word):
+        """Слова словаря, похожие на слово запроса: {word_id: сходство}"""
+        if word.isdigit():
+            # Числа (модели, объемы) - точное совпадение или префикс: "406" -> "4060"
+            exact = self._word_ids.get(word)
+            if exact is not None:
+                return {exact: 1.0}
+            return {
+                self._word_ids[number]: len(word) / len(number)
+                for number in self._numbers_with_prefix(word)
+            }
+
+        grams = trigrams(word)
+        shared = defaultdict(int)
+        for gram in grams:
+            for word_id in self._by_trigram.get(gram, ()):
+                shared[word_id] += 1
+        result = {}
+        for word_id, count in shared.items():
+            similarity = count / (len(grams) + self._trigram_counts[word_id] - count)
+            if similarity >= self.threshold:
+                result[word_id] = similarity
+        return result
+
+    def _numbers_with_prefix(self, prefix):
+        numbers = self._numbers
+        i = bisect_left(numbers, prefix)
+        while i < len(numbers) and numbers[i].startswith(prefix):
+            yield numbers[i]
+            i += 1
+
+    def scores(self, query):
+        """Оценка товаров: {позиция в снимке: среднее сходство слов запроса}"""
+        words = normalize(query)
+        if not words:
+            return {}
+        best = defaultdict(lambda: [0.0] * len(words))
+        for n, word in enumerate(words):
+            for word_id, similarity in self.similar_words(word).items():
+                for i in self._postings[word_id]:
+                    row = best[i]
+                    if similarity > row[n]:
+                        row[n] = similarity
+        return {i: sum(row) / len(words) for i, row in best.items()}
+
+    def search(self, query, limit=15):
+        """Товары по убыванию сходства (с шагом 0.1), затем рейтинга"""
+        snapshot = self.snapshot
+        scores = {i: score for i, score in self.scores(query).items() if score >= self.threshold}
+        ranked = sorted(scores, key=lambda i: (-round(scores[i], 1), -snapshot.ratings[i], snapshot.prices[i]))
+        return [snapshot.row(i) for i in ranked[:limit]]
+
+
+class FuzzySearch:
+    """Индекс для актуального снимка каталога.
+
+    Первый индекс строится сразу; при смене снимка новый строится в фоновом
+    потоке (при частичном обновлении снимка - только переключается на новый
+    снимок) и подменяет старый по готовности, а до тех пор отвечает старый.
+    background=False - строить в вызывающем потоке (утилиты, тесты).
+    """
+
+    def __init__(self, get_snapshot, threshold=SIMILARITY_THRESHOLD, background=True):
+        self._get_snapshot = get_snapshot
+        self.threshold = threshold
+        self.background = background
+        self._index = None
+        self._building = None  # снимок, для которого сейчас строится индекс
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def index(self):
+        snapshot = self._get_snapshot()
+        index = self._index
+        if index is not None and index.snapshot is snapshot:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None:
+                index = self._index = FuzzyIndex(snapshot, self.threshold)
+                return index
+            if index.snapshot is snapshot or self._building is snapshot:
+                return index
+            self._building = snapshot
+        if not self.background:
+            self._rebuild(snapshot, index)
+            return self._index
+        threading.Thread(target=self._rebuild, args=(snapshot, index), name='fuzzy-index', daemon=True).start()
+        return index
+
+    def _rebuild(self, snapshot, previous):
+        try:
+            if previous.snapshot.names is snapshot.names:
+                index = previous.rebind(snapshot)
+            else:
+                index = FuzzyIndex(snapshot, self.threshold)
+        except Exception as e:
+            logger.error("Ошибка построения индекса нечеткого поиска: %s", e)
+            with self._lock:
+                if self._building is snapshot:
+                    self._building = None
+            return
+        with self._lock:
+            # Пока строился индекс, мог появиться еще более новый снимок
+            if self._building is snapshot:
+                self._index = index
+                self._building = None
+                self.rebuilds += 1
+
+    def search(self, query, limit=15):
+        return self.index().search(query, limit)
@@ -0,0 +1,56 @@
+"""
+Защита от повторной обработки
+
+Повторно доставленные обновления (ретраи webhook, перезапуск посреди
+polling) и двойные нажатия не должны создавать второй заказ. Недавно
+обработанные ключи хранятся в ограниченном LRU в памяти и проверяются до
+обращения к БД; окончательную гарантию дает уникальный индекс на
+orders.idempotency_key.
+"""
+
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class RecentKeys:
+    """Ограниченный по размеру LRU недавно обработанных ключей"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def add(self, key, value=True):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def check_and_add(self, key, value=True):
+        """True, если ключ уже встречался; иначе запоминает его"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return False
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
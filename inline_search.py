@@ -0,0 +1,180 @@
+"""
+Поиск для inline-режима (@bot запрос)
+
+Каждое нажатие клавиши присылает новый inline-запрос, поэтому поиск идет
+по снимку каталога в памяти, а результаты кэшируются по префиксу: при
+наборе "ry" -> "ryz" -> "ryzen" кандидаты для "ryz" берутся из уже
+найденных для "ry" (подстрока "ryz" встречается только там, где есть "ry").
+Размер кэша ограничен суммарным числом id товаров во всех префиксах
+(4 байта на id): короткий префикс может совпасть с большей частью каталога.
+
+Индекс для нового снимка каталога строится в фоновом потоке; до его
+готовности запросы обслуживает индекс предыдущего снимка.
+"""
+
+import copy
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    return ' '.join((text or '').lower().split())
+
+
+def display_order(snapshot):
+    """Позиции товаров в порядке выдачи find_products: рейтинг по убыванию, затем цена.
+
+    Две устойчивые сортировки по float вместо одной по кортежу: сравнение
+    float в sort вдвое быстрее, а фоновая перестройка индекса меньше держит
+    GIL, пока обработчики ждут.
+    """
+    ratings = snapshot.ratings
+    order = sorted(range(len(snapshot)), key=snapshot.prices.__getitem__)
+    order.sort(key=lambda i: -ratings[i])
+    return array('I', order)
+
+
+class InlineSearchIndex:
+    """Поисковые строки товаров одного снимка каталога и кэш по префиксам"""
+
+    def __init__(self, snapshot, cache_ids=2000000):
+        self.snapshot = snapshot
+        self.cache_ids = cache_ids
+        category_names = [category['name'].lower() for category in snapshot.categories]
+        brands = [brand.lower() for brand in snapshot.brands]
+        # Строка поиска: название, бренд, категория (как в find_products, без описания)
+        self._haystacks = [
+            f"{snapshot.names[i].lower()} {brands[snapshot.brand_codes[i]]} "
+            f"{category_names[snapshot.category_codes[i]]}"
+            for i in range(len(snapshot))
+        ]
+        self._order = display_order(snapshot)
+        self._cache = OrderedDict()
+        self._cached_ids = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rebind(self, snapshot):
+        """Индекс для снимка с теми же названиями (изменились только цены и остатки).
+
+        Поисковые строки общие; порядок выдачи и кэш пересчитываются, только
+        если изменились цены.
+        """
+        index = copy.copy(self)
+        index.snapshot = snapshot
+        if snapshot.prices is not self.snapshot.prices:
+            index._order = display_order(snapshot)
+            index._cache = OrderedDict()
+            index._cached_ids = 0
+            index._lock = threading.Lock()
+        return index
+
+    def _cached_prefix(self, query):
+        """Самый длинный закэшированный префикс запроса и его кандидаты"""
+        with self._lock:
+            for length in range(len(query), 0, -1):
+                candidates = self._cache.get(query[:length])
+                if candidates is not None:
+                    self._cache.move_to_end(query[:length])
+                    return length, candidates
+        return 0, self._order
+
+    def _remember(self, query, matches):
+        if len(matches) > self.cache_ids:
+            return
+        with self._lock:
+            previous = self._cache.pop(query, None)
+            if previous is not None:
+                self._cached_ids -= len(previous)
+            self._cache[query] = matches
+            self._cached_ids += len(matches)
+            while self._cached_ids > self.cache_ids:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_ids -= len(evicted)
+
+    def matches(self, query):
+        """Позиции подходящих товаров в порядке выдачи"""
+        query = normalize_query(query)
+        if not query:
+            return self._order
+        length, candidates = self._cached_prefix(query)
+        if length == len(query):
+            self.hits += 1
+            return candidates
+        self.misses += 1
+        haystacks = self._haystacks
+        found = array('I', (i for i in candidates if query in haystacks[i]))
+        self._remember(query, found)
+        return found
+
+    def search(self, query, offset=0, limit=20):
+        """Страница результатов и смещение следующей страницы ('' - страниц больше нет)"""
+        found = self.matches(query)
+        page = [self.snapshot.row(i) for i in found[offset:offset + limit]]
+        next_offset = str(offset + limit) if offset + limit < len(found) else ''
+        return page, next_offset
+
+
+class InlineSearch:
+    """Индекс для актуального снимка каталога.
+
+    Первый индекс строится сразу; при смене снимка новый строится в фоновом
+    потоке (при частичном обновлении снимка - с общими поисковыми строками)
+    и подменяет старый по готовности. background=False - строить в
+    вызывающем потоке (утилиты, тесты).
+    """
+
+    def __init__(self, get_snapshot, cache_ids=2000000, background=True):
+        self._get_snapshot = get_snapshot
+        self.cache_ids = cache_ids
+        self.background = background
+        self._index = None
+        self._building = None  # снимок, для которого сейчас строится индекс
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def index(self):
+        snapshot = self._get_snapshot()
+        index = self._index
+        if index is not None and index.snapshot is snapshot:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None:
+                index = self._index = InlineSearchIndex(snapshot, self.cache_ids)
+                return index
+            if index.snapshot is snapshot or self._building is snapshot:
+                return index
+            self._building = snapshot
+        if not self.background:
+            self._rebuild(snapshot, index)
+            return self._index
+        threading.Thread(target=self._rebuild, args=(snapshot, index), name='inline-index', daemon=True).start()
+        return index
+
+    def _rebuild(self, snapshot, previous):
+        try:
+            if previous.snapshot.names is snapshot.names:
+                index = previous.rebind(snapshot)
+            else:
+                index = InlineSearchIndex(snapshot, self.cache_ids)
+        except Exception as e:
+            logger.error("Ошибка построения индекса inline-поиска: %s", e)
+            with self._lock:
+                if self._building is snapshot:
+                    self._building = None
+            return
+        with self._lock:
+            # Пока строился индекс, мог появиться еще более новый снимок
+            if self._building is snapshot:
+                self._index = index
+                self._building = None
+                self.rebuilds += 1
+
+    def search(self, query, offset=0, limit=20):
+        return self.index().search(query, offset, limit)
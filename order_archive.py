@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Архив старых заказов
+
+Заказы старше ARCHIVE_AFTER_DAYS в завершенных статусах (доставлен,
+отменен) переносятся из orders в orders_archive небольшими пачками: каждая
+пачка - отдельная короткая транзакция записи, между пачками пауза, так
+что оформление новых заказов ждет не дольше одной пачки.
+
+Таблица orders остается маленькой: по ней идут оформление заказа,
+проверка ключа идемпотентности и подсчет для статистики (число
+архивных заказов хранится в order_archive_meta, архив не пересчитывается).
+Уникальный индекс ключей идемпотентности есть только у orders, поэтому
+create_order дополнительно ищет ключ в orders_archive (по индексу): повтор
+давнего заказа не создает новый.
+История пользователя (/myorders) читает обе таблицы слиянием по индексам,
+для отчетов есть представление orders_all.
+
+Архив лежит в той же БД: представление и запросы истории работают без
+ATTACH, а резервная копия остается одним файлом.
+
+Удаленные строки оставляют в индексах orders полупустые страницы (по
+user_id заказы разбросаны). Сжать их может только VACUUM, который на
+время выполнения блокирует запись, поэтому он запускается отдельно
+(--vacuum), в окно обслуживания.
+
+Запуск:
+    python order_archive.py                # перенести подходящие заказы
+    python order_archive.py --dry-run      # только посчитать
+    python order_archive.py --days 365     # другой возраст заказов
+    python order_archive.py --vacuum       # перенести и сжать файл БД (бот лучше остановить)
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+# Столбцы заказа (в том же порядке в orders и orders_archive)
+ORDER_COLUMNS = ('id, user_id, user_name, user_phone, products, total_price, status, address, notes, '
+                 'created_at, idempotency_key, items_count, summary')
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS orders_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        user_name TEXT,
+        user_phone TEXT,
+        products TEXT,
+        total_price REAL,
+        status TEXT,
+        address TEXT,
+        notes TEXT,
+        created_at TIMESTAMP,
+        idempotency_key TEXT,
+        items_count INTEGER,
+        summary TEXT,
+        archived_at INTEGER NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_orders_archive_user_history
+       ON orders_archive (user_id, created_at DESC, id DESC, total_price, status, items_count, summary)""",
+    # Кандидаты на перенос: пачка начинается сразу с подходящих строк
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at)",
+    """CREATE TABLE IF NOT EXISTS order_archive_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        archived_orders INTEGER NOT NULL DEFAULT 0
+    )""",
+    "INSERT OR IGNORE INTO order_archive_meta (id, archived_orders) VALUES (1, 0)",
+    f"""CREATE VIEW IF NOT EXISTS orders_all AS
+        SELECT {ORDER_COLUMNS}, NULL AS archived_at FROM orders
+        UNION ALL
+        SELECT {ORDER_COLUMNS}, archived_at FROM orders_archive""",
+]
+
+# SCAN json_each - перебор списка статусов, сами заказы ищутся по idx_orders_status_created
+SQL_ARCHIVE_CANDIDATES = register_query('archive_candidates', """
+    SELECT id FROM orders
+    WHERE status IN (SELECT value FROM json_each(?)) AND created_at < ?
+    LIMIT ?
+""", params=('["cancelled", "delivered"]', '2025-01-01', 500), allow_scan=True)
+
+SQL_ARCHIVE_PENDING = register_query('archive_pending', """
+    SELECT COUNT(*) FROM orders
+    WHERE status IN (SELECT value FROM json_each(?)) AND created_at < ?
+""", params=('["cancelled", "delivered"]', '2025-01-01'), allow_scan=True)
+
+SQL_ARCHIVE_COPY = f"""
+    INSERT INTO orders_archive ({ORDER_COLUMNS}, archived_at)
+    SELECT {ORDER_COLUMNS}, ? FROM orders
+    WHERE id IN (SELECT value FROM json_each(?))
+      AND status IN (SELECT value FROM json_each(?)) AND created_at < ?
+"""
+
+SQL_ARCHIVE_DELETE = """
+    DELETE FROM orders
+    WHERE id IN (SELECT value FROM json_each(?))
+      AND status IN (SELECT value FROM json_each(?)) AND created_at < ?
+"""
+
+SQL_ARCHIVE_COUNT = "UPDATE order_archive_meta SET archived_orders = archived_orders + ? WHERE id = 1"
+
+SQL_ARCHIVED_ORDERS = register_query('archived_orders', """
+    SELECT archived_orders FROM order_archive_meta WHERE id = 1
+""")
+
+
+def cutoff(days, now=None):
+    """Граница created_at (UTC, в формате CURRENT_TIMESTAMP) для заказов старше days дней"""
+    now = now or datetime.utcnow()
+    return (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def pending_count(connect, before, statuses):
+    """Сколько заказов подлежит переносу"""
+    conn = connect()
+    try:
+        return conn.execute(SQL_ARCHIVE_PENDING, (json.dumps(sorted(statuses)), before)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def archive_orders(write_transaction, connect, before, statuses, batch_size=500, pause=0.05):
+    """Перенос заказов старше before в статусах statuses; возвращает число перенесенных.
+
+    Условия повторяются в транзакции записи: заказ, статус которого
+    изменился после выборки кандидатов, остается в orders.
+    """
+    statuses = json.dumps(sorted(statuses))
+    moved = 0
+    batches = 0
+    started = time.perf_counter()
+    while True:
+        conn = connect()
+        try:
+            ids = [row[0] for row in conn.execute(SQL_ARCHIVE_CANDIDATES, (statuses, before, batch_size))]
+        finally:
+            conn.close()
+        if not ids:
+            break
+
+        ids = json.dumps(ids)
+        with write_transaction() as conn:
+            copied = conn.execute(SQL_ARCHIVE_COPY, (int(time.time()), ids, statuses, before)).rowcount
+            deleted = conn.execute(SQL_ARCHIVE_DELETE, (ids, statuses, before)).rowcount
+            if copied != deleted:
+                raise sqlite3.DatabaseError(f"скопировано {copied} заказов, удалено {deleted}")
+            conn.execute(SQL_ARCHIVE_COUNT, (copied,))
+        moved += copied
+        batches += 1
+        if pause:
+            time.sleep(pause)
+
+    if moved:
+        logger.info("Архив заказов: перенесено %s заказов за %s пачек, %.1f с",
+                    moved, batches, time.perf_counter() - started)
+    return moved
+
+
+def table_sizes(conn, tables=('orders', 'orders_archive')):
+    """Размер таблиц вместе с их индексами в байтах (пустой словарь без dbstat)"""
+    names = {name: table for table in tables for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE tbl_name = ? AND type IN ('table', 'index')", (table,)
+    )}
+    sizes = dict.fromkeys(tables, 0)
+    try:
+        for name, size in conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"):
+            if name in names:
+                sizes[names[name]] += size
+    except sqlite3.OperationalError:
+        # SQLite собран без SQLITE_ENABLE_DBSTAT_VTAB
+        return {}
+    return sizes
+
+
+def compact(connect):
+    """VACUUM всей БД: пересборка таблиц и индексов без пустого места"""
+    conn = connect()
+    try:
+        conn.isolation_level = None
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+class ArchiveScheduler:
+    """Фоновый поток, переносящий старые заказы раз в interval секунд"""
+
+    def __init__(self, write_transaction, connect, interval, days, statuses, batch_size=500, pause=0.05):
+        self.write_transaction = write_transaction
+        self.connect = connect
+        self.interval = interval
+        self.days = days
+        self.statuses = statuses
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        try:
+            return archive_orders(self.write_transaction, self.connect, cutoff(self.days), self.statuses,
+                                  self.batch_size, self.pause)
+        except Exception as e:
+            logger.error("Ошибка архивации заказов: %s", e)
+            return 0
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='order-archive', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка; начатая пачка дожидается завершения"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="путь к файлу БД (по умолчанию из config)")
+    parser.add_argument('--days', type=int, help="возраст заказов в днях (по умолчанию ARCHIVE_AFTER_DAYS)")
+    parser.add_argument('--dry-run', action='store_true', help="только посчитать заказы для переноса")
+    parser.add_argument('--vacuum', action='store_true', help="после переноса сжать БД (блокирует запись)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    import computer_parts_bot as bot
+    config = bot.config
+    if args.db:
+        bot.DB_PATH = args.db
+    bot.setup_database()
+    before = cutoff(args.days if args.days is not None else config.ARCHIVE_AFTER_DAYS)
+    statuses = [status.strip() for status in config.ARCHIVE_STATUSES.split(',') if status.strip()]
+
+    count = pending_count(bot.get_db_connection, before, statuses)
+    print(f"🗄️ Заказов до {before} в статусах {', '.join(statuses)}: {count}")
+    if args.dry_run:
+        return 0
+    moved = archive_orders(bot.write_transaction, bot.get_db_connection, before, statuses,
+                           config.ARCHIVE_BATCH_SIZE, config.ARCHIVE_BATCH_PAUSE)
+    if args.vacuum:
+        started = time.perf_counter()
+        compact(bot.get_db_connection)
+        print(f"🧹 VACUUM за {time.perf_counter() - started:.1f} с")
+    conn = bot.get_db_connection()
+    sizes = table_sizes(conn)
+    archived = conn.execute(SQL_ARCHIVED_ORDERS).fetchone()[0]
+    conn.close()
+    print(f"✅ Перенесено в архив: {moved}, всего в архиве: {archived}")
+    for table, size in sizes.items():
+        print(f"💾 {table}: {size / 2 ** 20:.1f} МБ")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
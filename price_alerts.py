@@ -0,0 +1,281 @@
+"""
+История цен и подписки на снижение цены / поступление в продажу
+
+Обновление каталога применяется пакетом: изменения загружаются во
+временную таблицу, products обновляется одним UPDATE с подзапросом по
+первичному ключу временной таблицы (только товары из пакета), в
+price_history дописываются только реально изменившиеся товары, а
+подписки сопоставляются с изменениями одним INSERT ... SELECT по индексу
+subscriptions (product_id, max_price). Уведомления попадают в очередь
+notification_queue и рассылаются отдельно, пачками.
+
+Подписка срабатывает при пересечении порога: цена была выше max_price и
+стала не выше, либо товара не было в наличии и он появился.
+
+Рассылка отмечает уведомление обработанным после успешной отправки или
+окончательного отказа (бот заблокирован пользователем). Временные ошибки
+(сеть, 429 Too Many Requests, 5xx) оставляют его в очереди до следующей
+пачки, а retry_after из ответа 429 возвращается вызывающему.
+"""
+
+import logging
+import time
+from collections import namedtuple
+
+from catalog import record_catalog_changes
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+KIND_PRICE_DROP = 'price_drop'
+KIND_BACK_IN_STOCK = 'back_in_stock'
+
+# Схема (применяется миграцией в computer_parts_bot.MIGRATIONS)
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS price_history (
+        product_id INTEGER NOT NULL,
+        changed_at INTEGER NOT NULL,
+        price REAL NOT NULL,
+        in_stock INTEGER NOT NULL,
+        PRIMARY KEY (product_id, changed_at)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS subscriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        max_price REAL,
+        notify_in_stock INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_subscriptions_product ON subscriptions (product_id, max_price, notify_in_stock, user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id, product_id)",
+    """CREATE TABLE IF NOT EXISTS notification_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        price REAL,
+        created_at INTEGER NOT NULL,
+        sent_at INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_notification_queue_pending ON notification_queue (id) WHERE sent_at IS NULL",
+]
+
+SQL_SUBSCRIBE = register_query('subscribe', """
+    INSERT INTO subscriptions (user_id, product_id, max_price, notify_in_stock, created_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        max_price = excluded.max_price,
+        notify_in_stock = excluded.notify_in_stock
+""")
+
+SQL_UNSUBSCRIBE = register_query('unsubscribe', """
+    DELETE FROM subscriptions WHERE user_id = ? AND product_id = ?
+""")
+
+SQL_USER_SUBSCRIPTIONS = register_query('user_subscriptions', """
+    SELECT s.product_id, s.max_price, s.notify_in_stock, p.name, p.price, p.in_stock
+    FROM subscriptions s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.user_id = ?
+    ORDER BY s.product_id
+""")
+
+# Использует временную таблицу пакета, поэтому не регистрируется для аудита планов.
+# У временных таблиц нет статистики, и без CROSS JOIN планировщик может начать
+# с полного просмотра subscriptions даже для пачки из нескольких товаров.
+SQL_MATCH_SUBSCRIPTIONS = """
+    INSERT INTO notification_queue (user_id, product_id, kind, price, created_at)
+    SELECT s.user_id, c.product_id, 'price_drop', c.new_price, ?
+    FROM temp.catalog_changes c
+    CROSS JOIN subscriptions s ON s.product_id = c.product_id AND s.max_price >= c.new_price
+    WHERE c.old_price > s.max_price
+    UNION ALL
+    SELECT s.user_id, c.product_id, 'back_in_stock', c.new_price, ?
+    FROM temp.catalog_changes c
+    CROSS JOIN subscriptions s ON s.product_id = c.product_id
+    WHERE c.old_in_stock = 0 AND c.new_in_stock = 1 AND s.notify_in_stock = 1
+"""
+
+# Просмотр частичного индекса: в нем только неотправленные уведомления
+SQL_PENDING_NOTIFICATIONS = register_query('pending_notifications', """
+    SELECT q.id, q.user_id, q.product_id, q.kind, q.price, p.name
+    FROM notification_queue q
+    JOIN products p ON p.id = q.product_id
+    WHERE q.sent_at IS NULL
+    ORDER BY q.id
+    LIMIT ?
+""", allow_scan=True)
+
+SQL_MARK_SENT = register_query('notification_sent', """
+    UPDATE notification_queue SET sent_at = ? WHERE id = ?
+""")
+
+SQL_PRICE_HISTORY = register_query('price_history', """
+    SELECT changed_at, price, in_stock FROM price_history
+    WHERE product_id = ?
+    ORDER BY changed_at DESC
+    LIMIT ?
+""")
+
+
+# ========== ПОДПИСКИ ==========
+
+def subscribe(conn, user_id, product_id, max_price=None, notify_in_stock=True):
+    conn.execute(SQL_SUBSCRIBE, (user_id, product_id, max_price, int(notify_in_stock), int(time.time())))
+
+
+def unsubscribe(conn, user_id, product_id):
+    return conn.execute(SQL_UNSUBSCRIBE, (user_id, product_id)).rowcount
+
+
+def user_subscriptions(conn, user_id):
+    return conn.execute(SQL_USER_SUBSCRIPTIONS, (user_id,)).fetchall()
+
+
+def price_history(conn, product_id, limit=30):
+    return conn.execute(SQL_PRICE_HISTORY, (product_id, limit)).fetchall()
+
+
+# ========== ПРИМЕНЕНИЕ ИЗМЕНЕНИЙ КАТАЛОГА ==========
+
+def _update_row(update):
+    """(product_id, price, in_stock[, stock_quantity]) -> строка временной таблицы"""
+    product_id, price, in_stock, *rest = update
+    return product_id, price, int(bool(in_stock)), rest[0] if rest else None
+
+
+def apply_catalog_updates(conn, updates, now=None):
+    """Пакетное обновление цен и наличия с историей и сопоставлением подписок.
+
+    updates - итерация (product_id, price, in_stock) или (product_id, price,
+    in_stock, stock_quantity). Вызывать внутри транзакции записи. Возвращает
+    (список измененных product_id, число поставленных в очередь уведомлений).
+    Изменения записываются в журнал каталога, чтобы реплики обновили в
+    памяти только эти товары.
+    """
+    now = int(now or time.time())
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS catalog_updates (
+            product_id INTEGER PRIMARY KEY, price REAL NOT NULL, in_stock INTEGER NOT NULL,
+            stock_quantity INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS catalog_changes (
+            product_id INTEGER PRIMARY KEY,
+            old_price REAL, new_price REAL, old_in_stock INTEGER, new_in_stock INTEGER,
+            new_stock_quantity INTEGER
+        )
+    """)
+    conn.execute("DELETE FROM temp.catalog_updates")
+    conn.execute("DELETE FROM temp.catalog_changes")
+    conn.executemany(
+        "INSERT OR REPLACE INTO temp.catalog_updates (product_id, price, in_stock, stock_quantity)"
+        " VALUES (?, ?, ?, ?)",
+        (_update_row(update) for update in updates)
+    )
+
+    # Только реально изменившиеся товары (stock_quantity NULL - остаток не передан)
+    conn.execute("""
+        INSERT INTO temp.catalog_changes (product_id, old_price, new_price, old_in_stock, new_in_stock,
+                                          new_stock_quantity)
+        SELECT p.id, p.price, u.price, p.in_stock, u.in_stock, COALESCE(u.stock_quantity, p.stock_quantity)
+        FROM temp.catalog_updates u
+        CROSS JOIN products p ON p.id = u.product_id
+        WHERE p.price IS NOT u.price OR p.in_stock IS NOT u.in_stock
+           OR p.stock_quantity IS NOT COALESCE(u.stock_quantity, p.stock_quantity)
+    """)
+    changed_ids = [row[0] for row in conn.execute("SELECT product_id FROM temp.catalog_changes")]
+    if not changed_ids:
+        return [], 0
+
+    version = conn.execute("SELECT version FROM catalog_meta").fetchone()[0]
+    conn.execute("""
+        UPDATE products SET (price, in_stock, stock_quantity) = (
+            SELECT new_price, new_in_stock, new_stock_quantity
+            FROM temp.catalog_changes c WHERE c.product_id = products.id
+        )
+        WHERE id IN (SELECT product_id FROM temp.catalog_changes)
+    """)
+    record_catalog_changes(conn, version, changed_ids)
+    # В историю попадают только изменения цены или наличия (не остатка)
+    conn.execute("""
+        INSERT OR REPLACE INTO price_history (product_id, changed_at, price, in_stock)
+        SELECT product_id, ?, new_price, new_in_stock FROM temp.catalog_changes
+        WHERE old_price IS NOT new_price OR old_in_stock IS NOT new_in_stock
+    """, (now,))
+    queued = conn.execute(SQL_MATCH_SUBSCRIPTIONS, (now, now)).rowcount
+
+    logger.info("Каталог: изменено товаров %s, уведомлений в очереди %s", len(changed_ids), queued)
+    return changed_ids, queued
+
+
+# ========== РАССЫЛКА ==========
+
+def format_notification(row):
+    if row['kind'] == KIND_PRICE_DROP:
+        return f"📉 *Цена снизилась!*\n{row['name']}: *{row['price']:,.0f}₽*"
+    return f"📦 *Снова в наличии!*\n{row['name']}: *{row['price']:,.0f}₽*"
+
+
+# Ошибки Telegram, которые повтор не исправит: бот заблокирован или
+# пользователь удален (403), чат не найден или текст некорректен (400)
+PERMANENT_ERRORS = (400, 403)
+
+# processed - отмечено обработанными; retry_after - сколько секунд ждать
+# до следующей пачки (Telegram вернул 429), иначе 0
+Delivery = namedtuple('Delivery', 'processed retry_after')
+
+
+def _api_error(e):
+    """(код ошибки Telegram API или None, retry_after из ответа или None)"""
+    code = getattr(e, 'error_code', None)
+    result = getattr(e, 'result_json', None) or {}
+    return code, (result.get('parameters') or {}).get('retry_after')
+
+
+def deliver_notifications(conn, send, write_transaction, batch_size=100, rate=None, sleep=time.sleep,
+                          stopped=None):
+    """Отправка пачки уведомлений из очереди; send(user_id, text).
+
+    Очередь читается через conn, а отметка об отправке пишется через
+    write_transaction() уже после отправки, чтобы не держать блокировку
+    записи во время сетевых запросов. rate - не больше rate сообщений в
+    секунду. При временной ошибке пачка прерывается, уведомление остается
+    в очереди. stopped - событие остановки: пачка прерывается перед
+    следующей отправкой, уже отправленное отмечается. Возвращает Delivery.
+    """
+    rows = conn.execute(SQL_PENDING_NOTIFICATIONS, (batch_size,)).fetchall()
+    done = []
+    retry_after = 0
+    interval = 1 / rate if rate else 0
+    next_send = time.monotonic()
+    try:
+        for row in rows:
+            if interval:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    sleep(delay)
+                next_send = max(next_send, time.monotonic()) + interval
+            if stopped is not None and stopped.is_set():
+                break
+            try:
+                send(row['user_id'], format_notification(row))
+            except Exception as e:
+                code, wait = _api_error(e)
+                if code == 429:
+                    retry_after = wait or 1
+                    logger.warning("Рассылка: лимит Telegram, пауза %s с", retry_after)
+                    break
+                if (code is None and isinstance(e, OSError)) or (code is not None and code not in PERMANENT_ERRORS):
+                    logger.warning("Уведомление %s не отправлено, повтор позже: %s", row['id'], e)
+                    break
+                # Окончательный отказ: уведомление снимается, чтобы не блокировать очередь
+                logger.warning("Уведомление %s не доставлено: %s", row['id'], e)
+            done.append((int(time.time()), row['id']))
+    finally:
+        if done:
+            with write_transaction() as write_conn:
+                write_conn.executemany(SQL_MARK_SENT, done)
+    return Delivery(len(done), retry_after)
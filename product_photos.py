@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Фотографии товаров: миниатюры и кэш file_id Telegram
+
+Исходное изображение (локальный файл в PHOTO_SOURCE_DIR или URL) один раз
+уменьшается, сжимается в JPEG и кладется в кэш на диске, адресуемый хэшем
+содержимого источника. После первой загрузки Telegram возвращает file_id;
+он сохраняется в БД по (товар, хэш изображения), и дальше фото
+отправляется по file_id без повторной передачи байтов. Смена картинки
+меняет хэш, и фото загружается заново.
+
+Обработчики не скачивают изображения: для URL используется только уже
+готовая миниатюра, а отсутствующая ставится в очередь фонового потока
+(ThumbnailWarmer). При запуске бота миниатюры каталога готовятся в фоне с
+общим ограничением времени на все загрузки.
+
+Pillow необязателен: без него в кэш кладется исходный файл как есть.
+Вместо бота можно передать заглушку с методами send_photo и
+send_media_group, а вместо URL - локальные файлы изображений.
+
+Подготовка миниатюр для всего каталога заранее:
+    python product_photos.py --db computer_parts.db
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import queue
+import tempfile
+import threading
+import time
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+MAX_CAPTION = 1024
+MAX_MEDIA_GROUP = 10
+
+# Сигнатуры форматов, которые Telegram принимает как фото (проверка без Pillow)
+_IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+# Схема (применяется миграцией в computer_parts_bot.MIGRATIONS)
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS product_photos (
+        product_id INTEGER NOT NULL,
+        image_hash TEXT NOT NULL,
+        file_id TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        PRIMARY KEY (product_id, image_hash)
+    ) WITHOUT ROWID""",
+]
+
+SQL_PHOTO_FILE_ID = register_query('photo_file_id', """
+    SELECT file_id FROM product_photos WHERE product_id = ? AND image_hash = ?
+""")
+
+SQL_PHOTO_SAVE = register_query('photo_save', """
+    INSERT OR REPLACE INTO product_photos (product_id, image_hash, file_id, created_at) VALUES (?, ?, ?, ?)
+""")
+
+SQL_PHOTO_FORGET = register_query('photo_forget', """
+    DELETE FROM product_photos WHERE product_id = ? AND image_hash = ?
+""")
+
+
+def is_remote(image_url):
+    return image_url.startswith(('http://', 'https://'))
+
+
+def _write_atomic(path, data):
+    """Запись через временный файл: другой процесс не увидит недописанный файл"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# ========== МИНИАТЮРЫ ==========
+
+class ThumbnailCache:
+    """Миниатюры на диске: <cache_dir>/<hh>/<hash>.jpg.
+
+    hash - sha256 содержимого источника и параметров сжатия. Для URL
+    соответствие адрес -> хэш тоже хранится в кэше, чтобы после перезапуска
+    не скачивать изображение повторно.
+    """
+
+    def __init__(self, cache_dir, source_dir='.', max_size=800, quality=85,
+                 download_timeout=10, retry_after=300):
+        self.cache_dir = cache_dir
+        self.source_dir = source_dir
+        self.max_size = max_size
+        self.quality = quality
+        self.download_timeout = download_timeout
+        self.retry_after = retry_after
+        self._known = {}  # image_url -> (отметка источника, (image_hash, path))
+        self._failed = {}  # image_url -> время неудачи
+        self._lock = threading.Lock()
+
+    def _params(self):
+        return f"{self.max_size}q{self.quality}" if Image is not None else "orig"
+
+    def _path(self, image_hash):
+        return os.path.join(self.cache_dir, image_hash[:2], image_hash + '.jpg')
+
+    def _url_path(self, image_url):
+        return os.path.join(self.cache_dir, 'urls', hashlib.sha256(image_url.encode()).hexdigest())
+
+    def _local_path(self, image_url):
+        """Путь к файлу внутри source_dir; пути за его пределы ("../", абсолютные) отклоняются"""
+        root = os.path.realpath(self.source_dir)
+        path = os.path.realpath(os.path.join(root, image_url))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"путь вне каталога изображений: {image_url}")
+        return path
+
+    def _source_stamp(self, image_url):
+        """Отметка, по которой видно изменение источника (для URL содержимое считается неизменным)"""
+        if is_remote(image_url):
+            return None
+        stat = os.stat(self._local_path(image_url))
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, image_url, download=True, timeout=None):
+        """(image_hash, путь к миниатюре) или None, если изображение недоступно.
+
+        download=False: для URL только уже готовая миниатюра, без сети
+        (так вызывают обработчики). timeout ограничивает скачивание.
+        """
+        if not image_url:
+            return None
+        try:
+            stamp = self._source_stamp(image_url)
+        except (OSError, ValueError) as e:
+            logger.warning("Изображение %s недоступно: %s", image_url, e)
+            return None
+
+        with self._lock:
+            known = self._known.get(image_url)
+            failed_at = self._failed.get(image_url)
+        if known is not None and known[0] == stamp:
+            return known[1]
+        if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+            return None
+        if not download and is_remote(image_url):
+            result = self._cached_remote(image_url)
+            if result is not None:
+                with self._lock:
+                    self._known[image_url] = (stamp, result)
+            return result
+
+        try:
+            result = self._build(image_url, timeout)
+        except Exception as e:
+            logger.warning("Изображение %s недоступно: %s", image_url, e)
+            with self._lock:
+                self._failed[image_url] = time.monotonic()
+            return None
+        with self._lock:
+            self._known[image_url] = (stamp, result)
+            self._failed.pop(image_url, None)
+        return result
+
+    def _cached_remote(self, image_url):
+        """Миниатюра URL, подготовленная раньше (в том числе до перезапуска), или None"""
+        try:
+            with open(self._url_path(image_url), encoding='ascii') as f:
+                image_hash = f.read().strip()
+        except OSError:
+            return None
+        path = self._path(image_hash)
+        return (image_hash, path) if os.path.exists(path) else None
+
+    def _build(self, image_url, timeout=None):
+        url_path = self._url_path(image_url) if is_remote(image_url) else None
+        if url_path is not None:
+            cached = self._cached_remote(image_url)
+            if cached is not None:
+                return cached
+
+        data = self._read_source(image_url, timeout)
+        image_hash = hashlib.sha256(data + self._params().encode()).hexdigest()
+        path = self._path(image_hash)
+        if not os.path.exists(path):
+            _write_atomic(path, self._render(data))
+        if url_path is not None:
+            _write_atomic(url_path, image_hash.encode('ascii'))
+        return image_hash, path
+
+    def _read_source(self, image_url, timeout=None):
+        if is_remote(image_url):
+            return self._download(image_url, timeout or self.download_timeout)
+        with open(self._local_path(image_url), 'rb') as f:
+            return f.read()
+
+    def _download(self, image_url, timeout):
+        # urllib.request импортируется только при первой загрузке: фото могут быть выключены
+        import urllib.request
+
+        with urllib.request.urlopen(image_url, timeout=timeout) as response:
+            return response.read()
+
+    def _render(self, data):
+        """Уменьшение и сжатие в JPEG (без Pillow - исходные байты после проверки)"""
+        if Image is None:
+            if not data.startswith(_IMAGE_SIGNATURES):
+                raise ValueError("неизвестный формат изображения")
+            if len(data) > MAX_PHOTO_BYTES:
+                raise ValueError("изображение больше 10 МБ, а Pillow не установлен")
+            return data
+
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() для JPEG декодирует сразу в уменьшенном масштабе
+            image.draft('RGB', (self.max_size, self.max_size))
+            image = image.convert('RGB')
+            image.thumbnail((self.max_size, self.max_size))
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+# ========== ФОНОВАЯ ПОДГОТОВКА ==========
+
+class ThumbnailWarmer:
+    """Фоновый поток, скачивающий изображения по URL в кэш миниатюр.
+
+    request() - миниатюра понадобилась обработчику (сам он не ждет);
+    warm_up() - пачка URL с общим сроком: каждая загрузка ограничена
+    оставшимся временем, после срока остаток пачки пропускается.
+    """
+
+    def __init__(self, thumbnails, max_pending=1000):
+        self.thumbnails = thumbnails
+        self._queue = queue.Queue(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.ready = 0
+        self.skipped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='photo-warmer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка: URL, оставшиеся в очереди, не скачиваются"""
+        if self._thread is not None:
+            self._stopped.set()
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join()
+            self._thread = None
+
+    def request(self, image_url, deadline=None):
+        """Постановка URL в очередь (повторы и переполнение очереди пропускаются)"""
+        with self._lock:
+            if image_url in self._pending:
+                return False
+            self._pending.add(image_url)
+        try:
+            self._queue.put_nowait((image_url, deadline))
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(image_url)
+            return False
+        return True
+
+    def warm_up(self, image_urls, seconds):
+        """Подготовка миниатюр для image_urls не дольше seconds в сумме"""
+        deadline = time.monotonic() + seconds
+        return sum(1 for image_url in image_urls if is_remote(image_url) and self.request(image_url, deadline))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None or self._stopped.is_set():
+                break
+            image_url, deadline = item
+            try:
+                timeout = None
+                if deadline is not None:
+                    timeout = min(self.thumbnails.download_timeout, deadline - time.monotonic())
+                if timeout is not None and timeout <= 0:
+                    self.skipped += 1
+                elif self.thumbnails.get(image_url, timeout=timeout) is not None:
+                    self.ready += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(image_url)
+
+
+# ========== FILE_ID TELEGRAM ==========
+
+class FileIdStore:
+    """file_id по (товар, хэш изображения): кэш в памяти поверх таблицы product_photos"""
+
+    def __init__(self, connect, write_transaction):
+        self._connect = connect
+        self._write_transaction = write_transaction
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, product_id, image_hash):
+        key = (product_id, image_hash)
+        with self._lock:
+            file_id = self._cache.get(key)
+        if file_id is not None:
+            return file_id
+        conn = self._connect()
+        try:
+            row = conn.execute(SQL_PHOTO_FILE_ID, key).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        with self._lock:
+            self._cache[key] = row[0]
+        return row[0]
+
+    def put(self, product_id, image_hash, file_id):
+        with self._write_transaction() as conn:
+            conn.execute(SQL_PHOTO_SAVE, (product_id, image_hash, file_id, int(time.time())))
+        with self._lock:
+            self._cache[(product_id, image_hash)] = file_id
+
+    def forget(self, product_id, image_hash):
+        with self._lock:
+            self._cache.pop((product_id, image_hash), None)
+        with self._write_transaction() as conn:
+            conn.execute(SQL_PHOTO_FORGET, (product_id, image_hash))
+
+
+# ========== ОТПРАВКА ==========
+
+def _telebot_input_media(media, **kwargs):
+    from telebot import types
+    return types.InputMediaPhoto(media, **kwargs)
+
+
+def is_rejected_file_id(e):
+    """Telegram отклонил file_id (400 "wrong file identifier" и подобные).
+
+    Остальные ошибки (429, таймауты, сеть) file_id не портят: его нельзя забывать.
+    """
+    if getattr(e, 'error_code', None) != 400:
+        return False
+    description = (getattr(e, 'description', None) or str(e)).lower()
+    return any(marker in description for marker in ('file identifier', 'file_id', 'file reference'))
+
+
+class PhotoSender:
+    """Отправка фото товаров: по file_id, если он известен, иначе загрузка миниатюры.
+
+    api - бот (или заглушка) с методами send_photo и send_media_group;
+    input_media - фабрика элементов альбома (по умолчанию InputMediaPhoto);
+    warmer - ThumbnailWarmer: если задан, изображения по URL не скачиваются
+    в вызывающем потоке, а недостающие ставятся ему в очередь.
+    """
+
+    def __init__(self, api, thumbnails, file_ids, input_media=_telebot_input_media, warmer=None):
+        self.api = api
+        self.thumbnails = thumbnails
+        self.file_ids = file_ids
+        self.input_media = input_media
+        self.warmer = warmer
+        self.uploads = 0
+        self.reuses = 0
+
+    def _media(self, product_id, image_url):
+        """(image_hash, file_id или байты миниатюры) или None"""
+        thumbnail = self.thumbnails.get(image_url, download=self.warmer is None)
+        if thumbnail is None:
+            if self.warmer is not None and image_url and is_remote(image_url):
+                self.warmer.request(image_url)
+            return None
+        image_hash, path = thumbnail
+        file_id = self.file_ids.get(product_id, image_hash)
+        if file_id:
+            return image_hash, file_id
+        with open(path, 'rb') as f:
+            return image_hash, f.read()
+
+    def _remember(self, product_id, image_hash, photo, message):
+        if isinstance(photo, str):
+            self.reuses += 1
+            return
+        self.uploads += 1
+        sizes = getattr(message, 'photo', None)
+        if not sizes:
+            return
+        try:
+            # Последний размер - самый большой, его file_id и переиспользуем
+            self.file_ids.put(product_id, image_hash, sizes[-1].file_id)
+        except Exception as e:
+            # Фото уже отправлено: ошибка записи не должна превращать отправку в неудачу
+            logger.error("Не удалось сохранить file_id фото товара %s: %s", product_id, e)
+
+    def send_photo(self, chat_id, product_id, image_url, caption=None, **kwargs):
+        """Фото товара с подписью; None, если изображения нет (тогда отправляется текст)"""
+        media = self._media(product_id, image_url)
+        if media is None:
+            return None
+        image_hash, photo = media
+        try:
+            message = self.api.send_photo(chat_id, photo, caption=caption, **kwargs)
+        except Exception as e:
+            if not isinstance(photo, str) or not is_rejected_file_id(e):
+                raise
+            # file_id стал недействительным: забываем и загружаем заново
+            logger.warning("file_id фото товара %s отклонен: %s", product_id, e)
+            self.file_ids.forget(product_id, image_hash)
+            return self.send_photo(chat_id, product_id, image_url, caption, **kwargs)
+        self._remember(product_id, image_hash, photo, message)
+        return message
+
+    def send_album(self, chat_id, items, **kwargs):
+        """Альбом из items = [(product_id, image_url, caption), ...] (не больше 10).
+
+        Возвращает список сообщений или None, если фото меньше двух.
+        """
+        prepared = []
+        for product_id, image_url, caption in items[:MAX_MEDIA_GROUP]:
+            media = self._media(product_id, image_url)
+            if media is not None:
+                prepared.append((product_id, media[0], media[1], caption))
+        if len(prepared) < 2:
+            return None
+
+        group = [self.input_media(photo, caption=caption, **kwargs) for _, _, photo, caption in prepared]
+        try:
+            messages = self.api.send_media_group(chat_id, group)
+        except Exception as e:
+            reused = [(product_id, image_hash) for product_id, image_hash, photo, _ in prepared
+                      if isinstance(photo, str)]
+            if not reused or not is_rejected_file_id(e):
+                raise
+            logger.warning("file_id в альбоме отклонены: %s", e)
+            for product_id, image_hash in reused:
+                self.file_ids.forget(product_id, image_hash)
+            return self.send_album(chat_id, items, **kwargs)
+
+        for (product_id, image_hash, photo, _), message in zip(prepared, messages):
+            self._remember(product_id, image_hash, photo, message)
+        return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="путь к файлу БД (по умолчанию из config)")
+    args = parser.parse_args()
+
+    import config
+    thumbnails = ThumbnailCache(
+        config.PHOTO_CACHE_DIR, config.PHOTO_SOURCE_DIR, config.PHOTO_MAX_SIZE,
+        config.PHOTO_QUALITY, config.PHOTO_DOWNLOAD_TIMEOUT
+    )
+    if Image is None:
+        print("⚠️ Pillow не установлен: миниатюры не уменьшаются (pip install Pillow)")
+
+    conn = sqlite3.connect(args.db or config.DB_PATH)
+    rows = conn.execute("SELECT id, image_url FROM products WHERE image_url IS NOT NULL").fetchall()
+    conn.close()
+
+    started = time.perf_counter()
+    ready = sum(1 for _, image_url in rows if thumbnails.get(image_url) is not None)
+    print(f"✅ Миниатюр готово: {ready} из {len(rows)} за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,281 @@
+"""
+Профилирование работающего бота по запросу
+
+Сеанс профилирования длится заданное число секунд и собирает:
+    - выборки стеков потоков, обрабатывающих обновления (раз в
+      sample_interval), в формате collapsed stacks для flamegraph.pl и
+      speedscope: "действие;функция;функция ... число_выборок";
+    - cProfile, сохраненный в файл .pstats (python -m pstats, snakeviz): до
+      Python 3.12 - профиль каждого вызова обработчика в его потоке, с 3.12 -
+      один профилировщик на весь процесс на время сеанса (cProfile работает
+      через sys.monitoring, и второй активный профилировщик в интерпретаторе
+      невозможен);
+    - снимки tracemalloc в начале и в конце сеанса: места с наибольшим
+      объемом выделенной памяти и разница между снимками.
+
+Пока сеанса нет, профилирование ничего не стоит: обработчик (traced в
+bot_logging) проверяет только profiling_state.active is None, этот модуль
+не импортирован, поток выборки не запущен, tracemalloc выключен.
+
+Запуск: команда /profile администратора или сигнал SIGUSR1 процессу
+(при многопроцессном запуске профилируется процесс, получивший команду
+или сигнал).
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import profiling_state
+
+logger = logging.getLogger(__name__)
+
+_start_lock = threading.Lock()
+
+# С 3.12 cProfile видит события всех потоков, и активным может быть только один
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class ProfileSession:
+    """Сеанс профилирования обработчиков на duration секунд"""
+
+    def __init__(self, duration, out_dir, sample_interval=0.005, memory_frames=10, top=15):
+        self.duration = duration
+        self.out_dir = out_dir
+        self.sample_interval = sample_interval
+        self.memory_frames = memory_frames
+        self.top = top
+        self.started_at = None
+        self.files = {}
+        self.summary = ""
+        self._threads = {}  # ident потока -> действие обрабатываемого обновления
+        self._started = {}  # ident потока -> начало вызова (perf_counter)
+        self._running = Counter()  # действие -> вызовов, не завершенных к остановке
+        self._running_ms = Counter()
+        self._profiles = []
+        self._profile = None  # общий профилировщик процесса (PROCESS_WIDE)
+        self._unprofiled = 0  # вызовов без cProfile: профилировщик занят другим инструментом
+        self._calls = Counter()
+        self._call_ms = Counter()
+        self._stacks = Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._finish = threading.Event()
+        self._sampler = None
+        self._own_tracing = False
+        self._snapshot = None
+
+    # ---------- обработчики ----------
+
+    def call(self, action, func, *args, **kwargs):
+        """Вызов обработчика под cProfile (вложенные обработчики входят во внешний)"""
+        ident = threading.get_ident()
+        if ident in self._threads or self._stopped.is_set():
+            return func(*args, **kwargs)
+        profile = None if PROCESS_WIDE else self._enable(cProfile.Profile())
+        self._threads[ident] = action
+        started = self._started[ident] = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            action = self._threads.pop(ident, action)
+            self._started.pop(ident, None)
+            with self._lock:
+                if not self._stopped.is_set():
+                    if profile is not None:
+                        self._profiles.append(profile)
+                    elif self._profile is None:
+                        self._unprofiled += 1
+                    self._calls[action] += 1
+                    self._call_ms[action] += elapsed_ms
+
+    def _enable(self, profile):
+        """Включение cProfile; None, если профилировщик уже занят (другой сеанс, отладчик, coverage)"""
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Обработчик при этом выполняется без cProfile: выборки стеков и время вызова остаются
+            logger.warning("cProfile недоступен: %s", e)
+            return None
+        return profile
+
+    def label(self, action):
+        """Уточнение действия текущего обновления (например, действие Web App)"""
+        ident = threading.get_ident()
+        if ident in self._threads:
+            self._threads[ident] = f"{self._threads[ident]}:{action}"
+
+    # ---------- выборка стеков ----------
+
+    def _sample_loop(self):
+        root = self.call.__code__
+        while not self._stopped.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for ident, action in list(self._threads.items()):
+                frame = frames.get(ident)
+                stack = []
+                # Стек от обработчика до текущей функции, без кадров самого профилировщика
+                while frame is not None and frame.f_code is not root:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(action)
+                    self._stacks[';'.join(reversed(stack))] += 1
+                    self._samples += 1
+            del frames
+
+    # ---------- начало и конец ----------
+
+    def start(self):
+        self.started_at = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.memory_frames)
+            self._own_tracing = True
+        self._snapshot = tracemalloc.take_snapshot()
+        if PROCESS_WIDE:
+            self._profile = self._enable(cProfile.Profile())
+        self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        """Завершение сеанса: файлы результатов и текстовая сводка"""
+        with self._lock:
+            self._stopped.set()
+            # Вызовы, еще идущие к остановке, попадают в сводку с временем до остановки
+            now = time.perf_counter()
+            for ident, action in list(self._threads.items()):
+                started = self._started.get(ident)
+                if started is not None:
+                    self._running[action] += 1
+                    self._running_ms[action] += (now - started) * 1000
+        if self._profile is not None:
+            self._profile.disable()
+            self._profiles.append(self._profile)
+        self._sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        if self._own_tracing:
+            tracemalloc.stop()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        prefix = os.path.join(self.out_dir, time.strftime('profile_%Y%m%d_%H%M%S', time.localtime(self.started_at)))
+        prefix += f"_{os.getpid()}"
+        stats = self._write_pstats(f"{prefix}.pstats")
+        self._write_collapsed(f"{prefix}.collapsed")
+        memory = self._write_memory(f"{prefix}.memory.txt", snapshot)
+        self.summary = self._format_summary(stats, memory)
+        return self.summary
+
+    def _write_pstats(self, path):
+        if not self._profiles:
+            return None
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        self.files['pstats'] = path
+        return stats
+
+    def _write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.files['collapsed'] = path
+
+    def _write_memory(self, path, snapshot):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = snapshot.filter_traces(filters)
+        top = snapshot.statistics('lineno')[:self.top]
+        diff = snapshot.compare_to(self._snapshot.filter_traces(filters), 'lineno')[:self.top]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Выделено за сеанс и не освобождено, топ {self.top} мест:\n")
+            for stat in top:
+                f.write(f"{stat}\n")
+            f.write(f"\nРазница снимков (конец - начало), топ {self.top}:\n")
+            for stat in diff:
+                f.write(f"{stat}\n")
+            f.write(f"\nСтеки {self.top} мест с наибольшим ростом:\n")
+            for stat in snapshot.compare_to(self._snapshot.filter_traces(filters), 'traceback')[:self.top]:
+                f.write(f"\n{stat}\n")
+                f.write("\n".join(stat.traceback.format()) + "\n")
+        self.files['memory'] = path
+        return diff
+
+    def _format_summary(self, stats, memory):
+        lines = [f"⏱️ Профиль за {time.time() - self.started_at:.0f} с (pid {os.getpid()})"]
+        if not self._calls and not self._running:
+            lines.append("Обработчики не вызывались")
+        for action, calls in self._calls.most_common():
+            lines.append(f"• {action}: {calls} вызовов, среднее {self._call_ms[action] / calls:.1f} мс")
+        for action, calls in self._running.most_common():
+            lines.append(f"• {action}: {calls} не завершено к концу сеанса, выполнялись в среднем "
+                         f"{self._running_ms[action] / calls:.1f} мс (в .pstats не входят)")
+        if self._unprofiled:
+            lines.append(f"• без cProfile (профилировщик занят другим инструментом): {self._unprofiled} вызовов")
+        if stats is not None:
+            lines.append("")
+            lines.append("🔥 Функции по собственному времени:")
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in sorted(
+                    stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:8]:
+                lines.append(f"• {name} ({os.path.basename(filename)}:{line}): "
+                             f"{tottime * 1000:.1f} мс, всего {cumtime * 1000:.1f} мс, {calls} вызовов")
+        lines.append(f"📚 Выборок стеков: {self._samples}")
+        if memory:
+            lines.append("")
+            lines.append("🧠 Рост памяти:")
+            for stat in memory[:5]:
+                frame = stat.traceback[0]
+                lines.append(f"• {os.path.basename(frame.filename)}:{frame.lineno}: "
+                             f"{stat.size_diff / 1024:+.1f} КБ ({stat.count_diff:+d} блоков)")
+        lines.append("")
+        lines.append("📁 " + ", ".join(self.files.values()))
+        return "\n".join(lines)
+
+
+def start(duration, out_dir, on_done=None, **kwargs):
+    """Запуск сеанса на duration секунд; on_done(сеанс) вызывается по завершении.
+
+    Возвращает сеанс или None, если профилирование уже идет.
+    """
+    with _start_lock:
+        if profiling_state.active is not None:
+            return None
+        session = ProfileSession(duration, out_dir, **kwargs).start()
+        profiling_state.active = session
+
+    def finish():
+        session._finish.wait(duration)
+        try:
+            session.stop()
+        except Exception as e:
+            logger.error("Ошибка сохранения профиля: %s", e)
+            session.summary = f"❌ Ошибка сохранения профиля: {e}"
+        profiling_state.active = None
+        logger.info("Профилирование завершено: %s", ", ".join(session.files.values()))
+        if on_done is not None:
+            on_done(session)
+
+    threading.Thread(target=finish, name='profile-timer', daemon=True).start()
+    logger.info("Профилирование запущено на %s с", duration)
+    return session
+
+
+def stop():
+    """Досрочное завершение текущего сеанса; False, если сеанса нет"""
+    session = profiling_state.active
+    if session is None:
+        return False
+    session._finish.set()
+    return True
+
@@ -0,0 +1,33 @@
+"""
+Текущий сеанс профилирования и запуск по сигналу
+
+Легкий модуль без cProfile, pstats и tracemalloc: обработчики (traced в
+bot_logging) проверяют active на каждом обновлении, а сам profiling
+импортируется только при запуске сеанса (/profile или сигнал).
+"""
+
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Текущий сеанс профилирования (None - профилирование выключено)
+active = None
+
+
+def install_signal_handler(duration, out_dir, sig=getattr(signal, 'SIGUSR1', None), **kwargs):
+    """Профилирование по сигналу (только из главного потока; сводка пишется в лог)"""
+    if sig is None:
+        return False
+
+    def start():
+        import profiling
+        profiling.start(duration, out_dir, on_done=lambda session: logger.info("%s", session.summary), **kwargs)
+
+    def handler(signum, frame):
+        # Импорт и запуск - в отдельном потоке: обработчик сигнала прерывает главный поток где угодно
+        threading.Thread(target=start, name='profile-start', daemon=True).start()
+
+    signal.signal(sig, handler)
+    return True
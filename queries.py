@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Реестр SQL-запросов, журнал медленных запросов и аудит планов
+
+Все запросы бота регистрируются под именем через register_query().
+Аудитор выполняет EXPLAIN QUERY PLAN для каждого зарегистрированного
+запроса и отмечает полные просмотры таблиц, временные B-деревья для
+ORDER BY / GROUP BY и поиск по индексу без покрывающего индекса.
+
+Запуск аудита для любого файла БД (код возврата 1 при замечаниях уровня
+ERROR - удобно для CI):
+    python queries.py --db computer_parts.db
+"""
+
+import argparse
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+RegisteredQuery = namedtuple('RegisteredQuery', 'name sql params allow_scan')
+
+_registry = {}
+
+
+def register_query(name, sql, params=None, allow_scan=False):
+    """Регистрация именованного запроса; возвращает текст SQL.
+
+    params - пример параметров для EXPLAIN (по умолчанию NULL вместо каждого ?).
+    allow_scan - полный просмотр ожидаем (например, подсчет всей таблицы).
+    """
+    _registry[name] = RegisteredQuery(name, sql, params, allow_scan)
+    return sql
+
+
+def registered_queries():
+    return list(_registry.values())
+
+
+# ========== ЖУРНАЛ МЕДЛЕННЫХ ЗАПРОСОВ ==========
+
+_trace = threading.local()
+_names_by_sql = {}
+
+slow_logger = logging.getLogger('bot.slow_queries')
+
+
+def _query_name(sql):
+    """Имя зарегистрированного запроса по его тексту"""
+    if not _names_by_sql or len(_names_by_sql) != len(_registry):
+        _names_by_sql.clear()
+        _names_by_sql.update({' '.join(q.sql.split()): q.name for q in _registry.values()})
+    return _names_by_sql.get(' '.join(sql.split()), '-')
+
+
+def _trace_callback(statement):
+    # sqlite передает текст с подставленными параметрами; запоминаем первый
+    # оператор (последующие - это, например, тела триггеров)
+    if getattr(_trace, 'statement', None) is None:
+        _trace.statement = statement
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, который пишет в журнал запросы дольше порога.
+
+    SQLite выполняет SELECT по шагам: execute() делает первый шаг, остальные
+    выполняются при чтении строк. Поэтому время запроса - сумма execute() и
+    всех fetch*/итераций, а запись в журнал делается, когда запрос закончен:
+    строки прочитаны, курсор закрыт, удален или выполняет следующий запрос.
+    """
+
+    slow_threshold_ms = 100.0
+    _sql = None
+    _statement = None
+    _elapsed = 0.0
+
+    def _step(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def _report(self):
+        sql, self._sql = self._sql, None
+        if sql is None:
+            return
+        elapsed_ms = self._elapsed * 1000
+        if elapsed_ms >= self.slow_threshold_ms:
+            slow_logger.warning(
+                "Медленный запрос %s: %.1f мс: %s", _query_name(sql), elapsed_ms,
+                ' '.join((self._statement or sql).split())[:500],
+                extra={'query': _query_name(sql), 'duration_ms': round(elapsed_ms, 2)}
+            )
+
+    def _start(self, method, sql, args):
+        self._report()
+        self._sql = sql
+        self._elapsed = 0.0
+        _trace.statement = None
+        try:
+            self._step(method, sql, *args)
+        except BaseException:
+            self._report()
+            raise
+        finally:
+            self._statement = _trace.statement
+            _trace.statement = None
+        if self.description is None:
+            # Запрос без строк результата (INSERT, UPDATE ...) уже выполнен
+            self._report()
+        return self
+
+    def execute(self, sql, *args):
+        return self._start(super().execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._start(super().executemany, sql, args)
+
+    def fetchone(self):
+        row = self._step(super().fetchone)
+        if row is None:
+            self._report()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._step(super().fetchmany, size)
+        if len(rows) < size:
+            self._report()
+        return rows
+
+    def fetchall(self):
+        rows = self._step(super().fetchall)
+        self._report()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._step(super().__next__)
+        except StopIteration:
+            self._report()
+            raise
+
+    def close(self):
+        self._report()
+        super().close()
+
+    def __del__(self):
+        self._report()
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, курсоры которого пишут в журнал медленные запросы (TracedCursor)"""
+
+    slow_threshold_ms = 100.0
+
+    def cursor(self, factory=TracedCursor):
+        cursor = super().cursor(factory)
+        cursor.slow_threshold_ms = self.slow_threshold_ms
+        return cursor
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+def connect(db_path, slow_threshold_ms=0, **kwargs):
+    """Соединение с журналом медленных запросов (0 - журнал выключен, без накладных расходов)"""
+    if slow_threshold_ms <= 0:
+        return sqlite3.connect(db_path, **kwargs)
+    conn = sqlite3.connect(db_path, factory=TracedConnection, **kwargs)
+    conn.slow_threshold_ms = slow_threshold_ms
+    conn.set_trace_callback(_trace_callback)
+    return conn
+
+
+# ========== АУДИТ ПЛАНОВ ==========
+
+Finding = namedtuple('Finding', 'level query detail')
+
+
+def explain(conn, query):
+    """Строки EXPLAIN QUERY PLAN для зарегистрированного запроса"""
+    params = query.params if query.params is not None else (None,) * query.sql.count('?')
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query.sql, params)]
+
+
+def audit(conn, queries=None):
+    """Проверка планов всех зарегистрированных запросов; возвращает список Finding"""
+    findings = []
+    for query in queries or registered_queries():
+        try:
+            plan = explain(conn, query)
+        except sqlite3.Error as e:
+            findings.append(Finding('ERROR', query.name, f"не удалось построить план: {e}"))
+            continue
+        for detail in plan:
+            if detail.startswith('SCAN') and 'COVERING INDEX' not in detail \
+                    and detail != 'SCAN CONSTANT ROW':
+                level = 'INFO' if query.allow_scan else 'ERROR'
+                findings.append(Finding(level, query.name, f"полный просмотр: {detail}"))
+            elif 'USE TEMP B-TREE' in detail:
+                findings.append(Finding('WARN', query.name, detail))
+            elif detail.startswith('SEARCH') and 'USING INDEX' in detail \
+                    and 'COVERING' not in detail and 'INTEGER PRIMARY KEY' not in detail:
+                findings.append(Finding('INFO', query.name, f"индекс не покрывающий: {detail}"))
+    return findings
+
+
+def log_audit(conn):
+    """Аудит при запуске: замечания пишутся в лог"""
+    findings = audit(conn)
+    for finding in findings:
+        level = {'ERROR': logging.WARNING, 'WARN': logging.WARNING}.get(finding.level, logging.INFO)
+        logger.log(level, "План запроса %s: %s", finding.query, finding.detail)
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help="путь к файлу БД")
+    parser.add_argument('--plans', action='store_true', help="вывести полные планы запросов")
+    args = parser.parse_args()
+
+    # Импорт модулей бота регистрирует их запросы. При запуске скриптом этот
+    # файл выполняется как __main__, поэтому реестр берется из модуля queries.
+    import computer_parts_bot  # noqa: F401
+    import queries
+
+    conn = sqlite3.connect(args.db)
+    if args.plans:
+        for query in queries.registered_queries():
+            print(f"\n== {query.name}")
+            try:
+                for detail in queries.explain(conn, query):
+                    print(f"   {detail}")
+            except sqlite3.Error as e:
+                print(f"   ошибка: {e}")
+        print()
+
+    findings = queries.audit(conn)
+    conn.close()
+    icons = {'ERROR': '❌', 'WARN': '⚠️', 'INFO': 'ℹ️'}
+    for finding in findings:
+        print(f"{icons[finding.level]} {finding.level:5} {finding.query}: {finding.detail}")
+    errors = sum(1 for finding in findings if finding.level == 'ERROR')
+    print(f"\nЗапросов: {len(queries.registered_queries())}, замечаний: {len(findings)}, ошибок: {errors}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Многопроцессный режим бота
+
+Процесс-супервизор получает обновления Telegram (long polling) и раздает их
+N рабочим процессам по хэшу chat_id: все сообщения одного чата обрабатывает
+один и тот же процесс, поэтому порядок внутри чата сохраняется.
+Упавший рабочий процесс перезапускается. Очередь процесса ограничена
+QUEUE_SIZE: если она заполнена (процесс упал или завис), обновление
+отбрасывается с записью в лог, а не останавливает опрос для всех чатов.
+
+Запись в БД: у каждого процесса (N рабочих и супервизор) своя очередь записи
+(db_writer.py), то есть писателей N + 1. Их транзакции (BEGIN IMMEDIATE)
+разделяются блокировкой записи SQLite: в режиме WAL читатели не ждут, а
+писатель, не получивший блокировку, ждет ее до DB_BUSY_TIMEOUT секунд.
+Поэтому DB_BUSY_TIMEOUT должен быть больше самой долгой транзакции записи
+любого процесса; иначе операция завершится ошибкой "database is locked".
+
+Запуск:
+    python supervisor.py --workers 4
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+
+import config
+from bot_logging import bound_context, reset_after_fork, setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений может ждать в очереди одного процесса
+QUEUE_SIZE = 1000
+
+
+# ========== МАРШРУТИЗАЦИЯ ==========
+
+def update_shard_key(update):
+    """Ключ шардирования обновления: chat_id (или id пользователя)"""
+    for field in ('message', 'edited_message', 'channel_post', 'my_chat_member', 'chat_member'):
+        if field in update:
+            return update[field]['chat']['id']
+    if 'callback_query' in update:
+        callback = update['callback_query']
+        if callback.get('message'):
+            return callback['message']['chat']['id']
+        return callback['from']['id']
+    for field in ('inline_query', 'chosen_inline_result', 'pre_checkout_query', 'shipping_query'):
+        if field in update:
+            return update[field]['from']['id']
+    return update.get('update_id', 0)
+
+
+def shard_for(update, num_workers):
+    """Номер рабочего процесса для обновления"""
+    return update_shard_key(update) % num_workers
+
+
+# ========== РАБОЧИЙ ПРОЦЕСС ==========
+
+def _telegram_handler():
+    """Обработчик обновлений рабочего процесса: бот без собственных потоков"""
+    import computer_parts_bot
+    from telebot import types
+
+    telegram_bot = computer_parts_bot.create_bot(threaded=False)
+    computer_parts_bot.warm_caches()
+    # Очередь записи своя у каждого процесса (поток записи родителя после fork не работает);
+    # между процессами запись разделяется блокировкой SQLite, см. docstring модуля
+    computer_parts_bot.start_db_writer()
+    # kill -USR1 <pid рабочего процесса> - профилирование этого процесса
+    computer_parts_bot.install_profile_signal()
+
+    def handle(raw_update):
+        telegram_bot.process_new_updates([types.Update.de_json(raw_update)])
+
+    return handle
+
+
+def worker_main(index, update_queue, handler_factory=_telegram_handler):
+    """Цикл рабочего процесса: обработка обновлений из своей очереди"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    reset_after_fork()
+    root, ext = os.path.splitext(config.LOG_FILE)
+    setup_logging(log_file=f"{root}.worker{index}{ext}")
+    handle = handler_factory()
+    logger.info("Рабочий процесс %s запущен (pid %s)", index, os.getpid())
+
+    try:
+        while True:
+            raw_update = update_queue.get()
+            if raw_update is None:
+                break
+            try:
+                # update_id Telegram есть только в исходном обновлении - добавляем его в записи
+                with bound_context(update_id=raw_update.get('update_id')):
+                    handle(raw_update)
+            except Exception as e:
+                logger.error("Ошибка обработки обновления %s: %s", raw_update.get('update_id'), e)
+    finally:
+        if 'computer_parts_bot' in sys.modules:
+            sys.modules['computer_parts_bot'].stop_photo_warmer()
+            sys.modules['computer_parts_bot'].close_state_store()
+            sys.modules['computer_parts_bot'].stop_db_writer()
+        shutdown_logging()
+
+
+# ========== СУПЕРВИЗОР ==========
+
+class Supervisor:
+    """Пул рабочих процессов с очередью на каждый процесс"""
+
+    def __init__(self, num_workers, handler_factory=_telegram_handler):
+        self.num_workers = num_workers
+        self.handler_factory = handler_factory
+        self.queues = [mp.Queue(QUEUE_SIZE) for _ in range(num_workers)]
+        self.processes = [None] * num_workers
+        self.restarts = 0
+        self.dropped = 0
+
+    def _spawn(self, index):
+        process = mp.Process(
+            target=worker_main,
+            args=(index, self.queues[index], self.handler_factory),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.num_workers):
+            self._spawn(index)
+
+    def check_workers(self):
+        """Перезапуск упавших процессов"""
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.warning("Рабочий процесс %s завершился (код %s), перезапуск",
+                               index, process.exitcode)
+                self.restarts += 1
+                # Процесс, убитый внутри get(), оставляет занятой блокировку чтения очереди:
+                # новый процесс получает новую очередь, необработанные обновления теряются
+                self.queues[index].cancel_join_thread()
+                self.queues[index].close()
+                self.queues[index] = mp.Queue(QUEUE_SIZE)
+                self._spawn(index)
+
+    def dispatch(self, raw_update):
+        """Постановка обновления в очередь процесса без ожидания; False - обновление отброшено"""
+        index = shard_for(raw_update, self.num_workers)
+        try:
+            self.queues[index].put_nowait(raw_update)
+            return True
+        except queue.Full:
+            pass
+        # Очередь полна: процесс мог упасть - перезапускаем и пробуем еще раз
+        self.check_workers()
+        try:
+            self.queues[index].put_nowait(raw_update)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.error("Очередь рабочего процесса %s заполнена, обновление %s отброшено",
+                         index, raw_update.get('update_id'))
+            return False
+
+    def stop(self, timeout=10):
+        """Мягкая остановка: дообработка очередей и завершение процессов"""
+        for update_queue in self.queues:
+            try:
+                update_queue.put_nowait(None)
+            except queue.Full:
+                # Процесс не разбирает очередь - он будет завершен по истечении timeout
+                update_queue.cancel_join_thread()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+
+def run_polling(supervisor, token, poll_timeout=30):
+    """Long polling в процессе-супервизоре с раздачей обновлений"""
+    from telebot import apihelper
+
+    offset = None
+    while True:
+        supervisor.check_workers()
+        try:
+            updates = apihelper.get_updates(token, offset=offset, timeout=poll_timeout,
+                                            long_polling_timeout=poll_timeout)
+        except Exception as e:
+            logger.error("Ошибка получения обновлений: %s", e)
+            time.sleep(1)
+            continue
+
+        for raw_update in updates:
+            supervisor.dispatch(raw_update)
+            offset = raw_update['update_id'] + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Многопроцессный запуск бота")
+    parser.add_argument('--workers', type=int, default=config.WORKERS or os.cpu_count() or 1,
+                        help="число рабочих процессов")
+    args = parser.parse_args()
+
+    setup_logging()
+    if not config.BOT_TOKEN or ':' not in config.BOT_TOKEN:
+        print("❌ ОШИБКА: Добавьте токен в файл .env")
+        return 1
+
+    # Схема, миграции и режим WAL настраиваются один раз до запуска процессов
+    import computer_parts_bot
+    computer_parts_bot.setup_database()
+    # Рабочие процессы запускаются до фоновых потоков супервизора: fork копирует
+    # только вызвавший поток, и потоки родителя в дочернем процессе не работают
+    supervisor = Supervisor(args.workers)
+    supervisor.start()
+    print(f"✅ Запущено рабочих процессов: {args.workers}")
+
+    # Уведомления о ценах рассылает только супервизор, иначе процессы дублировали бы друг друга
+    computer_parts_bot.create_bot(threaded=False)
+    computer_parts_bot.start_db_writer()
+    computer_parts_bot.start_alert_sender()
+    computer_parts_bot.start_backup_scheduler()
+    computer_parts_bot.start_archive_scheduler()
+    # Фото каталога скачиваются один раз в кэш на диске, общий с рабочими процессами
+    computer_parts_bot.start_photo_warmup()
+
+    try:
+        run_polling(supervisor, config.BOT_TOKEN)
+    except KeyboardInterrupt:
+        print("\n\n👋 Бот остановлен пользователем")
+    finally:
+        computer_parts_bot.stop_alert_sender()
+        computer_parts_bot.stop_backup_scheduler()
+        computer_parts_bot.stop_archive_scheduler()
+        computer_parts_bot.stop_photo_warmer()
+        supervisor.stop()
+        computer_parts_bot.stop_db_writer()
+        shutdown_logging()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Синхронизация цен и остатков с прайсом поставщика
+
+Прайс (CSV или JSON Lines) читается потоком, по batch_size строк. Для
+каждого товара в БД хранится хэш последнего примененного содержимого
+(цена, остаток, наличие); строка прайса с тем же хэшем пропускается без
+записи. Для товаров, которые еще ни разу не синхронизировались, хэш
+считается по текущим значениям в products, поэтому первый прогон тоже
+пишет только реальные расхождения.
+Ручная правка цены в боте не перезаписывается, пока строка поставщика
+не изменится.
+
+Измененные строки каждой пачки записываются одной транзакцией через
+price_alerts.apply_catalog_updates: история цен, уведомления подписчикам и
+журнал изменений каталога, по которому реплики в памяти обновляют только
+затронутые товары.
+
+Формат прайса: столбцы id (или product_id), price, stock_quantity и
+необязательный in_stock (по умолчанию - stock_quantity > 0).
+
+Запуск:
+    python supplier_sync.py feed.csv
+    python supplier_sync.py feed.jsonl --db computer_parts.db
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import sys
+import time
+from collections import namedtuple
+
+from price_alerts import apply_catalog_updates
+from queries import register_query
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS product_sync_state (
+        product_id INTEGER PRIMARY KEY,
+        content_hash INTEGER NOT NULL,
+        synced_at INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+# Просматривается только JSON-список id пачки, строки ищутся по первичному ключу
+SQL_SYNC_HASHES = register_query('sync_hashes', """
+    SELECT product_id, content_hash FROM product_sync_state
+    WHERE product_id IN (SELECT value FROM json_each(?))
+""", params=('[1, 2]',), allow_scan=True)
+
+SQL_SYNC_CURRENT = register_query('sync_current_products', """
+    SELECT id, price, stock_quantity, in_stock FROM products
+    WHERE id IN (SELECT value FROM json_each(?))
+""", params=('[1, 2]',), allow_scan=True)
+
+SQL_SYNC_SAVE_HASH = """
+    INSERT INTO product_sync_state (product_id, content_hash, synced_at) VALUES (?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET content_hash = excluded.content_hash, synced_at = excluded.synced_at
+"""
+
+FeedRow = namedtuple('FeedRow', 'product_id price stock_quantity in_stock')
+
+
+def content_hash(price, stock_quantity, in_stock):
+    """64-битный хэш содержимого строки (знаковый, помещается в INTEGER SQLite)"""
+    data = f"{float(price or 0):.2f}|{int(stock_quantity or 0)}|{int(bool(in_stock))}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+# ========== ЧТЕНИЕ ПРАЙСА ==========
+
+def parse_row(record):
+    """Строка прайса из словаря или None, если строка некорректна"""
+    try:
+        product_id = int(record.get('id') or record['product_id'])
+        price = round(float(record['price']), 2)
+        stock_quantity = int(record.get('stock_quantity') or 0)
+        in_stock = record.get('in_stock')
+        if in_stock is None or in_stock == '':
+            in_stock = stock_quantity > 0
+        elif isinstance(in_stock, str):
+            in_stock = in_stock.strip().lower() in ('1', 'true', 'yes', 'да')
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    if price < 0 or stock_quantity < 0:
+        return None
+    return FeedRow(product_id, price, stock_quantity, bool(in_stock))
+
+
+def read_feed(lines, fmt='csv'):
+    """Записи прайса (словари) из итерации строк файла"""
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {}
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ========== СИНХРОНИЗАЦИЯ ==========
+
+class SyncReport:
+    """Итог синхронизации: измененные товары и счетчики строк"""
+
+    def __init__(self):
+        self.rows = 0
+        self.unchanged = 0
+        self.invalid = 0
+        self.unknown_ids = []
+        self.changed_ids = set()
+        self.notifications = 0
+        self.transactions = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        return (f"строк {self.rows}, изменено {len(self.changed_ids)}, без изменений {self.unchanged}, "
+                f"неизвестных {len(self.unknown_ids)}, ошибочных {self.invalid}, "
+                f"уведомлений {self.notifications}, транзакций {self.transactions}, {self.elapsed:.2f} с")
+
+
+def _stored_hashes(conn, product_ids):
+    """Хэши товаров: сохраненные при прошлой синхронизации или по текущим значениям.
+
+    Возвращает (хэши, товары без сохраненного хэша). Товаров, которых нет
+    в каталоге, в результате нет.
+    """
+    ids = json.dumps(product_ids)
+    hashes = dict(conn.execute(SQL_SYNC_HASHES, (ids,)).fetchall())
+    missing = [product_id for product_id in product_ids if product_id not in hashes]
+    baseline = set()
+    if missing:
+        for product_id, price, stock_quantity, in_stock in conn.execute(SQL_SYNC_CURRENT, (json.dumps(missing),)):
+            hashes[product_id] = content_hash(price, stock_quantity, in_stock)
+            baseline.add(product_id)
+    return hashes, baseline
+
+
+def sync_feed(records, write_transaction, connect, batch_size=1000, now=None):
+    """Применение прайса: пишутся только строки с изменившимся хэшем.
+
+    records - словари строк прайса, write_transaction и connect - функции
+    бота для записи и чтения. Возвращает SyncReport с точным набором
+    измененных товаров.
+    """
+    report = SyncReport()
+    started = time.perf_counter()
+    for batch in _batches(records, batch_size):
+        rows = {}
+        for record in batch:
+            report.rows += 1
+            row = parse_row(record)
+            if row is None:
+                report.invalid += 1
+            else:
+                # Повтор товара в прайсе - действует последняя строка
+                rows[row.product_id] = row
+
+        conn = connect()
+        try:
+            stored, baseline = _stored_hashes(conn, list(rows))
+        finally:
+            conn.close()
+
+        updates = []
+        new_hashes = []
+        for product_id, row in rows.items():
+            if product_id not in stored:
+                report.unknown_ids.append(product_id)
+                continue
+            row_hash = content_hash(row.price, row.stock_quantity, row.in_stock)
+            if row_hash == stored[product_id]:
+                report.unchanged += 1
+                if product_id in baseline:
+                    new_hashes.append((product_id, row_hash))
+                continue
+            updates.append((product_id, row.price, row.in_stock, row.stock_quantity))
+            new_hashes.append((product_id, row_hash))
+
+        if not new_hashes:
+            continue
+        synced_at = int(now or time.time())
+        with write_transaction() as conn:
+            if updates:
+                changed_ids, queued = apply_catalog_updates(conn, updates, now=synced_at)
+                report.changed_ids.update(changed_ids)
+                report.notifications += queued
+            conn.executemany(SQL_SYNC_SAVE_HASH, [(pid, h, synced_at) for pid, h in new_hashes])
+        report.transactions += 1
+
+    report.elapsed = time.perf_counter() - started
+    if report.unknown_ids:
+        logger.warning("Прайс: %s товаров нет в каталоге (например, %s)",
+                       len(report.unknown_ids), report.unknown_ids[:5])
+    logger.info("Синхронизация прайса: %s", report.summary())
+    return report
+
+
+def sync_file(path, write_transaction, connect, batch_size=1000, fmt=None):
+    """Синхронизация из файла; формат по расширению (.jsonl/.ndjson - JSON Lines)"""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        return sync_feed(read_feed(f, fmt), write_transaction, connect, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('feed', help="файл прайса (.csv или .jsonl)")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="формат (по умолчанию по расширению)")
+    parser.add_argument('--db', help="путь к файлу БД (по умолчанию из config)")
+    parser.add_argument('--batch-size', type=int, help="строк прайса на одну транзакцию")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    import computer_parts_bot as bot
+    if args.db:
+        bot.DB_PATH = args.db
+    bot.setup_database()
+    report = sync_file(args.feed, bot.write_transaction, bot.get_db_connection,
+                       args.batch_size or bot.config.SYNC_BATCH_SIZE, args.format)
+    print(f"✅ Прайс применен: {report.summary()}")
+    if report.changed_ids:
+        print(f"🔄 Изменены товары: {', '.join(map(str, sorted(report.changed_ids)[:50]))}"
+              f"{' ...' if len(report.changed_ids) > 50 else ''}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
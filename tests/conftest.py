@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeBot:
+    """Запись отправленных сообщений вместо вызовов Telegram API"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+    def answer_callback_query(self, callback_id, text=None, **kwargs):
+        self.sent.append((callback_id, text))
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    """computer_parts_bot с новой БД (схема, начальные данные, миграции) и FakeBot"""
+    import computer_parts_bot
+
+    monkeypatch.setattr(computer_parts_bot, 'DB_PATH', str(tmp_path / 'shop.db'))
+    monkeypatch.setattr(computer_parts_bot, 'bot', FakeBot())
+    monkeypatch.setattr(computer_parts_bot, '_catalog', None)
+    computer_parts_bot.setup_database()
+    return computer_parts_bot
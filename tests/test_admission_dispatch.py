@@ -0,0 +1,72 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from admission import ADMITTED, RATE_LIMITED, AdmissionControl
+from conversation_state import MemoryStateStore
+
+
+def _message(text, chat_id=7):
+    user = SimpleNamespace(id=chat_id, username='u', first_name='U', last_name=None)
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=user, text=text, message_id=1)
+
+
+@pytest.fixture
+def shop(bot, monkeypatch):
+    monkeypatch.setattr(bot.config, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(bot, '_state_store', MemoryStateStore())
+    return bot
+
+
+def _limits(shop, monkeypatch, burst):
+    # Часы стоят на месте: токены не пополняются
+    admission = AdmissionControl(rate=1, burst=burst, costs={'search_query': 3}, clock=lambda: 0.0)
+    monkeypatch.setattr(shop, '_admission', admission)
+    return admission
+
+
+def test_menu_button_is_charged_once(shop, monkeypatch):
+    admission = _limits(shop, monkeypatch, burst=10)
+
+    shop.handle_text_commands(_message('🆘 Помощь'))
+
+    assert admission.counters[ADMITTED] == 1
+    assert admission._buckets[7].tokens == 9
+    assert 'Справка' in shop.bot.sent[-1][1]
+
+
+def test_rejected_search_keeps_pending_query(shop, monkeypatch):
+    shop.get_state_store().set(7, shop.STATE_AWAITING_SEARCH)
+    admission = _limits(shop, monkeypatch, burst=2)
+
+    shop.handle_text_commands(_message('ryzen'))
+
+    assert admission.counters == {ADMITTED: 0, RATE_LIMITED: 1, 'busy': 0}
+    assert shop.get_state_store().get(7) == (shop.STATE_AWAITING_SEARCH, {})
+
+    admission = _limits(shop, monkeypatch, burst=10)
+    shop.handle_text_commands(_message('ryzen'))
+
+    assert admission.counters[ADMITTED] == 1
+    assert admission._buckets[7].tokens == 7
+    assert shop.get_state_store().get(7) is None
+
+
+def test_counters_are_exact_under_concurrent_admission():
+    admission = AdmissionControl(rate=1, burst=100, clock=lambda: 0.0)
+    calls = 2000
+
+    def user(user_id):
+        for _ in range(calls):
+            with admission.admit(user_id, 'search'):
+                pass
+
+    threads = [threading.Thread(target=user, args=(user_id,)) for user_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(admission.counters.values()) == 8 * calls
+    assert admission.counters[ADMITTED] == 8 * 100
@@ -0,0 +1,32 @@
+import logging
+
+import bot_logging
+
+
+def _record():
+    record = logging.LogRecord('test', logging.INFO, __file__, 0, 'msg', (), None)
+    bot_logging.ContextFilter().filter(record)
+    return record
+
+
+def test_context_outside_update_is_not_shared():
+    bot_logging.set_context(action='leaked')
+
+    with bot_logging.update_context(chat_id=1) as first:
+        assert 'action' not in first
+        bot_logging.set_context(action='search')
+    with bot_logging.update_context(chat_id=2) as second:
+        assert 'action' not in second
+
+    assert first['action'] == 'search'
+    assert not hasattr(_record(), 'action')
+
+
+def test_nested_context_keeps_trace_id_and_update_id():
+    with bot_logging.bound_context(update_id=123456):
+        with bot_logging.update_context(chat_id=1) as outer:
+            with bot_logging.update_context(action='inner') as inner:
+                record = _record()
+
+    assert inner['trace_id'] == outer['trace_id']
+    assert (record.update_id, record.chat_id, record.action) == (123456, 1, 'inner')
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from conversation_state import SQLiteStateStore
+
+
+def test_state_flushed_through_write_queue(bot):
+    writer = bot.start_db_writer()
+    try:
+        store = SQLiteStateStore(bot.DB_PATH, flush_interval=60, write=bot.run_write)
+        store.set(1, 'awaiting_search', {'hint': 'gpu'})
+        store.set(2, 'awaiting_search')
+        assert store.flush() == 2
+        store.delete(2)
+        store.close()
+        # Две записи изменений; очистка просроченных не наступила (sweep_interval = ttl / 2)
+        assert writer.operations == 2
+
+        reopened = SQLiteStateStore(bot.DB_PATH, flush_interval=60, write=bot.run_write)
+        assert reopened.get(1) == ('awaiting_search', {'hint': 'gpu'})
+        assert reopened.get(2) is None
+        reopened.close()
+    finally:
+        bot.stop_db_writer()
+
+
+def test_state_without_write_queue_uses_own_connection(bot):
+    store = SQLiteStateStore(bot.DB_PATH, flush_interval=60)
+    store.set(1, 'awaiting_search')
+    store.close()
+
+    reopened = SQLiteStateStore(bot.DB_PATH, flush_interval=60)
+    assert reopened.get(1) == ('awaiting_search', {})
+    reopened.close()
+
+
+def test_expired_states_swept_on_interval(bot):
+    store = SQLiteStateStore(bot.DB_PATH, ttl=0.05, flush_interval=60, sweep_interval=60)
+    store.set(1, 'awaiting_search')
+    store.flush()
+    time.sleep(0.1)
+    assert store._conn.execute("SELECT COUNT(*) FROM conversation_state").fetchone()[0] == 1
+
+    # Срок очистки наступает: следующая итерация фонового потока удаляет просроченное
+    store.sweep_interval = 0
+    store._wakeup.set()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if store._conn.execute("SELECT COUNT(*) FROM conversation_state").fetchone()[0] == 0:
+            break
+        time.sleep(0.01)
+    store.close()
+
+    reopened = SQLiteStateStore(bot.DB_PATH, flush_interval=60)
+    assert reopened._conn.execute("SELECT COUNT(*) FROM conversation_state").fetchone()[0] == 0
+    reopened.close()
+
+
+def test_flusher_survives_unexpected_error(bot):
+    calls = []
+    written = threading.Event()
+
+    def flaky_write(func, *args):
+        calls.append(func.__name__)
+        if len(calls) == 1:
+            raise RuntimeError("writer stopped")
+        result = store._write_own(func, *args)
+        written.set()
+        return result
+
+    store = SQLiteStateStore(bot.DB_PATH, flush_interval=0.01, write=flaky_write)
+    store.set(1, 'awaiting_search', {'hint': 'ssd'})
+    assert written.wait(5)
+    store.close()
+
+    reopened = SQLiteStateStore(bot.DB_PATH, flush_interval=60)
+    assert reopened.get(1) == ('awaiting_search', {'hint': 'ssd'})
+    reopened.close()
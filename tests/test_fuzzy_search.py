@@ -0,0 +1,85 @@
+import threading
+import time
+
+import fuzzy_search
+from fuzzy_search import FuzzyIndex, FuzzySearch, normalize
+
+
+def test_normalize_transliterates_and_splits_digits():
+    assert normalize('Райзен') == ['rayzen']
+    assert normalize('RTX4060') == ['rtx', '4060']
+    # "c" и "k" после транслитерации совпадают: "корсар" и "Corsair" близки
+    assert normalize('корсар') == ['korsar']
+    assert normalize('Corsair') == ['korsair']
+
+
+def test_synonyms_lead_to_indexed_words(bot):
+    index = FuzzyIndex(bot.get_catalog())
+
+    assert normalize('видюха') == ['videokarta']
+    assert {row['category_slug'] for row in index.search('видюха')} == {'gpu'}
+    assert {row['category_slug'] for row in index.search('ссд')} == {'storage'}
+    assert {row['category_slug'] for row in index.search('хдд')} == {'storage'}
+
+
+def test_typos_and_transliteration_find_products(bot):
+    index = FuzzyIndex(bot.get_catalog())
+
+    assert 'Samsung 980 Pro 1TB' in [row['name'] for row in index.search('samsnug')]
+    assert [row['name'] for row in index.search('райзен')][:1] == ['AMD Ryzen 7 7800X3D']
+    assert [row['name'] for row in index.search('rtx4060')] == ['ASUS TUF RTX 4060 Ti']
+
+
+def test_threshold_cuts_off_weak_matches(bot):
+    snapshot = bot.get_catalog()
+    scores = FuzzyIndex(snapshot).scores('samsnug')
+
+    assert scores and max(scores.values()) < 0.5
+    assert FuzzyIndex(snapshot, threshold=0.5).search('samsnug') == []
+    assert FuzzyIndex(snapshot).search('qwxzj') == []
+
+
+def test_new_snapshot_is_indexed_in_background(bot, monkeypatch):
+    first = bot.get_catalog()
+    monkeypatch.setattr(bot, '_catalog', None)
+    second = bot.get_catalog()
+    current = [first]
+    building, release = threading.Event(), threading.Event()
+
+    class SlowIndex(FuzzyIndex):
+        def __init__(self, snapshot, threshold):
+            if snapshot is second:
+                building.set()
+                release.wait(5)
+            super().__init__(snapshot, threshold)
+
+    monkeypatch.setattr(fuzzy_search, 'FuzzyIndex', SlowIndex)
+    search = FuzzySearch(lambda: current[0])
+    assert search.index().snapshot is first
+
+    current[0] = second
+    # Пока новый индекс строится, отвечает старый
+    assert search.search('samsnug')
+    assert building.wait(5)
+    assert search.index().snapshot is first
+    release.set()
+    for _ in range(500):
+        if search.rebuilds:
+            break
+        time.sleep(0.01)
+
+    assert search.index().snapshot is second
+
+
+def test_partial_update_rebinds_without_rebuilding(bot):
+    snapshot = bot.get_catalog()
+    patched = snapshot.patched([], snapshot.version + 1)
+    current = [snapshot]
+    search = FuzzySearch(lambda: current[0], background=False)
+    first = search.index()
+
+    current[0] = patched
+    index = search.index()
+
+    assert index.snapshot is patched
+    assert index._by_trigram is first._by_trigram
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import inline_search
+from inline_search import InlineSearch, InlineSearchIndex, display_order
+
+
+def test_display_order_matches_rating_then_price(bot):
+    snapshot = bot.get_catalog()
+    expected = sorted(range(len(snapshot)), key=lambda i: (-snapshot.ratings[i], snapshot.prices[i]))
+
+    assert list(display_order(snapshot)) == expected
+
+
+def test_prefix_cache_is_capped_by_ids(bot):
+    snapshot = bot.get_catalog()
+    index = InlineSearchIndex(snapshot, cache_ids=len(snapshot))
+    for query in ('a', 'e', 'i', 'o', 'r', 's'):
+        index.matches(query)
+
+    assert index._cached_ids == sum(len(matches) for matches in index._cache.values())
+    assert index._cached_ids <= len(snapshot)
+    assert index._cache
+
+
+def test_new_snapshot_is_indexed_in_background(bot, monkeypatch):
+    first = bot.get_catalog()
+    monkeypatch.setattr(bot, '_catalog', None)
+    second = bot.get_catalog()
+    current = [first]
+    building, release = threading.Event(), threading.Event()
+
+    class SlowIndex(InlineSearchIndex):
+        def __init__(self, snapshot, cache_ids):
+            if snapshot is second:
+                building.set()
+                release.wait(5)
+            super().__init__(snapshot, cache_ids)
+
+    monkeypatch.setattr(inline_search, 'InlineSearchIndex', SlowIndex)
+    search = InlineSearch(lambda: current[0])
+    assert search.index().snapshot is first
+
+    current[0] = second
+    # Пока новый индекс строится, отвечает старый
+    assert search.index().snapshot is first
+    assert building.wait(5)
+    assert search.index().snapshot is first
+    release.set()
+    for _ in range(500):
+        if search.rebuilds:
+            break
+        time.sleep(0.01)
+
+    assert search.index().snapshot is second
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+import order_archive
+
+
+def _insert(bot, user_id, key):
+    conn = sqlite3.connect(bot.DB_PATH)
+    try:
+        with conn:
+            return bot._insert_order(conn, (user_id, 'u', '', '[]', 100.0, '', '', key, 1, 'CPU'), (100.0, user_id))
+    finally:
+        conn.close()
+
+
+def test_repeated_idempotency_key_returns_existing_order(bot):
+    order_id, created = _insert(bot, 1, 'key-1')
+
+    assert created
+    assert _insert(bot, 1, 'key-1') == (order_id, False)
+
+
+def test_other_constraint_errors_are_not_swallowed(bot):
+    with pytest.raises(sqlite3.IntegrityError, match='NOT NULL'):
+        _insert(bot, None, 'key-2')
+
+
+def test_key_of_archived_order_is_still_a_duplicate(bot):
+    order_id, _ = _insert(bot, 1, 'key-3')
+    conn = sqlite3.connect(bot.DB_PATH)
+    with conn:
+        conn.execute("UPDATE orders SET status = 'delivered', created_at = '2000-01-01 00:00:00' WHERE id = ?",
+                     (order_id,))
+    conn.close()
+    moved = order_archive.archive_orders(bot.write_transaction, lambda: sqlite3.connect(bot.DB_PATH),
+                                         order_archive.cutoff(30), ['delivered'], pause=0)
+    assert moved == 1
+
+    assert _insert(bot, 1, 'key-3') == (order_id, False)
+    conn = sqlite3.connect(bot.DB_PATH)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+    finally:
+        conn.close()
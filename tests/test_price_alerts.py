@@ -0,0 +1,113 @@
+import threading
+import time
+
+import price_alerts
+
+
+class ApiError(Exception):
+    """Как telebot.apihelper.ApiTelegramException: error_code и result_json"""
+
+    def __init__(self, code, retry_after=None):
+        super().__init__(f"Error code: {code}")
+        self.error_code = code
+        self.result_json = {'ok': False, 'error_code': code}
+        if retry_after is not None:
+            self.result_json['parameters'] = {'retry_after': retry_after}
+
+
+def _queue(bot, user_ids):
+    with bot.write_transaction() as conn:
+        conn.executemany(
+            "INSERT INTO notification_queue (user_id, product_id, kind, price, created_at) VALUES (?, 1, ?, 100, 0)",
+            [(user_id, price_alerts.KIND_PRICE_DROP) for user_id in user_ids]
+        )
+
+
+def _pending(bot):
+    conn = bot.get_db_connection()
+    try:
+        return [row[0] for row in conn.execute("SELECT user_id FROM notification_queue WHERE sent_at IS NULL")]
+    finally:
+        conn.close()
+
+
+def _deliver(bot, send, **kwargs):
+    conn = bot.get_db_connection()
+    try:
+        return price_alerts.deliver_notifications(conn, send, bot.write_transaction, **kwargs)
+    finally:
+        conn.close()
+
+
+def _sender(errors):
+    sent = []
+
+    def send(user_id, text):
+        if user_id in errors:
+            raise errors[user_id]
+        sent.append(user_id)
+    return send, sent
+
+
+def test_blocked_user_is_dropped_transient_errors_stay_pending(bot):
+    _queue(bot, [1, 2, 3, 4])
+    send, sent = _sender({2: ApiError(403), 3: ConnectionResetError("reset")})
+
+    assert _deliver(bot, send) == price_alerts.Delivery(2, 0)
+    assert sent == [1]
+    assert _pending(bot) == [3, 4]
+
+
+def test_too_many_requests_returns_retry_after(bot):
+    _queue(bot, [1, 2, 3])
+    send, sent = _sender({2: ApiError(429, retry_after=17)})
+
+    assert _deliver(bot, send) == price_alerts.Delivery(1, 17)
+    assert _pending(bot) == [2, 3]
+
+
+def test_server_error_is_retried(bot):
+    _queue(bot, [1])
+    send, _ = _sender({1: ApiError(502)})
+
+    assert _deliver(bot, send).processed == 0
+    assert _pending(bot) == [1]
+
+
+def test_sending_is_rate_limited(bot):
+    _queue(bot, range(1, 6))
+    send, sent = _sender({})
+    started = time.monotonic()
+
+    assert _deliver(bot, send, rate=50).processed == 5
+    assert time.monotonic() - started >= 4 / 50
+    assert sent == [1, 2, 3, 4, 5]
+
+
+def test_stop_waits_until_sent_notifications_are_marked(bot, monkeypatch):
+    monkeypatch.setattr(bot.config, 'ALERTS_DELIVERY_INTERVAL', 0.01)
+    monkeypatch.setattr(bot.config, 'ALERTS_SEND_RATE', 0)
+    _queue(bot, [1, 2, 3])
+    sending, release = threading.Event(), threading.Event()
+    sent = []
+
+    class SlowBot:
+        def send_message(self, user_id, text, **kwargs):
+            sent.append(user_id)
+            sending.set()
+            release.wait(5)
+
+    monkeypatch.setattr(bot, 'bot', SlowBot())
+    bot.start_db_writer()
+    try:
+        bot.start_alert_sender()
+        assert sending.wait(5)
+        # Отправка еще идет: остановка должна дождаться отметки об отправке
+        threading.Timer(0.1, release.set).start()
+        bot.stop_alert_sender()
+        assert _pending(bot) == [2, 3]
+    finally:
+        bot.stop_alert_sender()
+        bot.stop_db_writer()
+
+    assert sent == [1]
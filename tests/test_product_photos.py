@@ -0,0 +1,213 @@
+import base64
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import product_photos
+from product_photos import FileIdStore, PhotoSender, ThumbnailCache, ThumbnailWarmer
+
+# PNG 1x1: открывается Pillow и проходит проверку сигнатуры без него
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+class ApiError(Exception):
+    """Ошибка Telegram API с кодом, как ApiTelegramException"""
+
+    def __init__(self, error_code, description):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+
+
+class StubApi:
+    """Заглушка бота: send_photo / send_media_group с выдачей file_id"""
+
+    def __init__(self):
+        self.photos = []
+        self.albums = []
+        self.reject_file_ids = False
+        self.error = None
+
+    def _message(self, photo):
+        if self.error is not None:
+            raise self.error
+        if isinstance(photo, str) and self.reject_file_ids:
+            raise ApiError(400, "Bad Request: wrong file identifier/HTTP URL specified")
+        file_id = photo if isinstance(photo, str) else f"file{len(self.photos) + len(self.albums)}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id='small'), SimpleNamespace(file_id=file_id)])
+
+    def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        message = self._message(photo)
+        self.photos.append(photo)
+        return message
+
+    def send_media_group(self, chat_id, media):
+        messages = [self._message(photo) for photo, _ in media]
+        self.albums.append([photo for photo, _ in media])
+        return messages
+
+
+class SlowCache(ThumbnailCache):
+    """Кэш, у которого "скачивание" - пауза и PNG вместо сети"""
+
+    def __init__(self, *args, delay=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.downloads = []
+
+    def _download(self, image_url, timeout):
+        self.downloads.append((image_url, threading.current_thread().name, timeout))
+        time.sleep(min(self.delay, timeout))
+        if self.delay > timeout:
+            raise TimeoutError("timed out")
+        return PNG
+
+
+@pytest.fixture
+def file_ids(tmp_path):
+    path = str(tmp_path / 'photos.db')
+    conn = sqlite3.connect(path)
+    for statement in product_photos.SCHEMA:
+        conn.execute(statement)
+    conn.close()
+
+    @contextmanager
+    def write_transaction():
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    return FileIdStore(lambda: sqlite3.connect(path), write_transaction)
+
+
+@pytest.fixture
+def images(tmp_path):
+    source = tmp_path / 'images'
+    source.mkdir()
+    for name in ('cpu.png', 'gpu.png', 'ram.png'):
+        (source / name).write_bytes(PNG)
+    (tmp_path / 'secret.png').write_bytes(PNG)
+    return source
+
+
+def test_local_photo_uploaded_once_then_sent_by_file_id(tmp_path, images, file_ids):
+    api = StubApi()
+    sender = PhotoSender(api, ThumbnailCache(str(tmp_path / 'cache'), str(images)), file_ids)
+
+    assert sender.send_photo(1, 10, 'cpu.png') is not None
+    assert sender.send_photo(1, 10, 'cpu.png') is not None
+
+    assert isinstance(api.photos[0], bytes)
+    assert api.photos[1] == 'file0'
+    assert (sender.uploads, sender.reuses) == (1, 1)
+
+
+def test_rejected_file_id_is_uploaded_again(tmp_path, images, file_ids):
+    api = StubApi()
+    sender = PhotoSender(api, ThumbnailCache(str(tmp_path / 'cache'), str(images)), file_ids,
+                         input_media=lambda media, **kwargs: (media, kwargs))
+    items = [(10, 'cpu.png', 'CPU'), (11, 'gpu.png', 'GPU'), (12, 'ram.png', 'RAM')]
+    sender.send_album(1, items)
+
+    api.reject_file_ids = True
+    messages = sender.send_album(1, items)
+
+    assert len(messages) == 3
+    assert all(isinstance(photo, bytes) for photo in api.albums[-1])
+
+
+def test_rate_limit_keeps_file_id(tmp_path, images, file_ids):
+    api = StubApi()
+    sender = PhotoSender(api, ThumbnailCache(str(tmp_path / 'cache'), str(images)), file_ids,
+                         input_media=lambda media, **kwargs: (media, kwargs))
+    items = [(10, 'cpu.png', 'CPU'), (11, 'gpu.png', 'GPU')]
+    sender.send_album(1, items)
+
+    api.error = ApiError(429, "Too Many Requests: retry after 5")
+    with pytest.raises(ApiError):
+        sender.send_photo(1, 10, 'cpu.png')
+    with pytest.raises(ApiError):
+        sender.send_album(1, items)
+    api.error = None
+
+    sender.send_album(1, items)
+    assert all(isinstance(photo, str) for photo in api.albums[-1])
+    assert sender.uploads == 2
+
+
+def test_file_id_save_error_does_not_fail_send(tmp_path, images, file_ids, monkeypatch):
+    api = StubApi()
+    sender = PhotoSender(api, ThumbnailCache(str(tmp_path / 'cache'), str(images)), file_ids)
+
+    def broken_put(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(file_ids, 'put', broken_put)
+    assert sender.send_photo(1, 10, 'cpu.png') is not None
+    assert len(api.photos) == 1
+
+
+@pytest.mark.parametrize('image_url', ['../secret.png', 'sub/../../secret.png', '/etc/passwd'])
+def test_local_path_cannot_escape_source_dir(tmp_path, images, image_url):
+    thumbnails = ThumbnailCache(str(tmp_path / 'cache'), str(images))
+
+    with pytest.raises(ValueError):
+        thumbnails._local_path(image_url)
+    assert thumbnails.get(image_url) is None
+
+
+def test_handler_does_not_download_remote_photo(tmp_path, images, file_ids):
+    api = StubApi()
+    thumbnails = SlowCache(str(tmp_path / 'cache'), str(images))
+    warmer = ThumbnailWarmer(thumbnails).start()
+    sender = PhotoSender(api, thumbnails, file_ids, warmer=warmer)
+    url = 'https://img.example/cpu.png'
+    try:
+        # Миниатюры еще нет: сообщение уходит без фото, URL - в фоновую очередь
+        assert sender.send_photo(1, 10, url) is None
+        deadline = time.monotonic() + 5
+        while thumbnails.get(url, download=False) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sender.send_photo(1, 10, url) is not None
+    finally:
+        warmer.stop()
+
+    assert [thread for _, thread, _ in thumbnails.downloads] == ['photo-warmer']
+    assert len(api.photos) == 1
+
+
+def test_remote_thumbnail_survives_restart(tmp_path, images):
+    url = 'https://img.example/cpu.png'
+    SlowCache(str(tmp_path / 'cache'), str(images)).get(url)
+
+    restarted = SlowCache(str(tmp_path / 'cache'), str(images))
+    assert restarted.get(url, download=False) is not None
+    assert restarted.downloads == []
+
+
+def test_warm_up_shares_one_deadline(tmp_path, images):
+    thumbnails = SlowCache(str(tmp_path / 'cache'), str(images), delay=0.2, download_timeout=10)
+    warmer = ThumbnailWarmer(thumbnails)
+    urls = [f'https://img.example/{i}.png' for i in range(10)]
+
+    assert warmer.warm_up(urls + ['cpu.png'], seconds=0.5) == 10
+    started = time.monotonic()
+    warmer.start()
+    while warmer._pending and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    warmer.stop()
+
+    # 10 загрузок по 0.2 с не укладываются в общий срок 0.5 с: остаток пропущен
+    assert time.monotonic() - started < 1.5
+    assert warmer.ready == 2
+    assert warmer.skipped == len(urls) - len(thumbnails.downloads)
+    assert all(timeout <= 0.5 for _, _, timeout in thumbnails.downloads)
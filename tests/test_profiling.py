@@ -0,0 +1,95 @@
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import profiling
+
+
+def test_bot_import_does_not_load_profiler():
+    code = "import sys, computer_parts_bot; print(sorted({'profiling', 'cProfile', 'pstats', 'tracemalloc'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=profiling.os.path.dirname(profiling.__file__), check=True)
+
+    assert result.stdout.strip() == '[]'
+
+
+def test_calls_in_flight_at_stop_are_reported(tmp_path):
+    session = profiling.ProfileSession(60, str(tmp_path), sample_interval=0.001).start()
+    entered, release = threading.Event(), threading.Event()
+
+    def handler():
+        entered.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=session.call, args=('search', handler))
+    thread.start()
+    entered.wait(5)
+    session.call('help', lambda: None)
+    summary = session.stop()
+    release.set()
+    thread.join()
+
+    assert "• help: 1 вызовов" in summary
+    assert "• search: 1 не завершено к концу сеанса" in summary
+    assert "Обработчики не вызывались" not in summary
+
+
+def test_admin_is_checked_by_sender(bot, monkeypatch):
+    monkeypatch.setattr(bot.config, 'ADMIN_CHAT_ID', '42')
+
+    def message(chat_id, user_id):
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=SimpleNamespace(id=user_id))
+
+    assert bot.is_admin(message(-100500, 42))
+    assert not bot.is_admin(message(42, 7))
+
+
+@pytest.mark.parametrize('process_wide', [False, True])
+def test_concurrent_handlers_run_during_session(tmp_path, monkeypatch, process_wide):
+    # process_wide=True - путь Python 3.12+: один cProfile на процесс вместо профиля на вызов
+    monkeypatch.setattr(profiling, 'PROCESS_WIDE', process_wide)
+    session = profiling.ProfileSession(60, str(tmp_path), sample_interval=0.001).start()
+    barrier = threading.Barrier(2, timeout=5)
+    results, errors = [], []
+
+    def handler(value):
+        barrier.wait()  # оба обработчика внутри session.call одновременно
+        results.append(sum(i * i for i in range(20000)) and value)
+        return value
+
+    def worker(action, value):
+        try:
+            session.call(action, handler, value)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(action, value))
+               for action, value in (('search', 1), ('catalog', 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = session.stop()
+
+    assert errors == []
+    assert sorted(results) == [1, 2]
+    assert "• search: 1 вызовов" in summary and "• catalog: 1 вызовов" in summary
+    assert 'pstats' in session.files
+
+
+def test_busy_profiler_runs_handler_unprofiled(tmp_path, monkeypatch):
+    class BusyProfile(profiling.cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(profiling.cProfile, 'Profile', BusyProfile)
+    session = profiling.ProfileSession(60, str(tmp_path), sample_interval=0.001).start()
+
+    assert session.call('help', lambda: 'ok') == 'ok'
+    summary = session.stop()
+
+    assert "• help: 1 вызовов" in summary
+    assert "без cProfile (профилировщик занят другим инструментом): 1 вызовов" in summary
@@ -0,0 +1,44 @@
+import logging
+import sqlite3
+import time
+
+import queries
+
+
+def test_audit_of_migrated_database_has_no_errors(bot):
+    conn = sqlite3.connect(bot.DB_PATH)
+    try:
+        findings = queries.audit(conn)
+    finally:
+        conn.close()
+
+    assert [f for f in findings if f.level == 'ERROR'] == []
+
+
+def _slow_table(slow_threshold_ms):
+    conn = queries.connect(':memory:', slow_threshold_ms=slow_threshold_ms)
+    conn.create_function('slow', 1, lambda x: (time.sleep(0.01), x)[1])
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    return conn
+
+
+def test_slow_log_counts_reading_rows(caplog):
+    conn = _slow_table(50)
+    with caplog.at_level(logging.WARNING, logger='bot.slow_queries'):
+        # Первый шаг (execute) - 10 мс, остальные 90 мс уходят на чтение строк
+        rows = conn.execute("SELECT slow(x) FROM t").fetchall()
+
+    assert len(rows) == 10
+    assert len(caplog.records) == 1
+    assert caplog.records[0].duration_ms >= 90
+
+
+def test_slow_log_skips_fast_partial_read(caplog):
+    conn = _slow_table(50)
+    with caplog.at_level(logging.WARNING, logger='bot.slow_queries'):
+        assert conn.execute("SELECT slow(x) FROM t").fetchone() == (0,)
+        for row in conn.execute("SELECT x FROM t"):
+            pass
+
+    assert caplog.records == []
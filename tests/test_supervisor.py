@@ -0,0 +1,148 @@
+import functools
+import logging
+import multiprocessing as mp
+import os
+import signal
+import sqlite3
+import time
+
+import pytest
+
+import bot_logging
+import config
+import supervisor
+from db_writer import WriteQueue
+from supervisor import Supervisor
+
+
+def _logging_handler():
+    def handle(raw_update):
+        logging.getLogger('test.worker').info("обработано обновление %s", raw_update['update_id'])
+    return handle
+
+
+def test_worker_writes_own_log_file(tmp_path, monkeypatch):
+    """Рабочий процесс после fork пишет в свой файл, а не в очередь без читателя"""
+    log_file = tmp_path / 'bot.log'
+    monkeypatch.setattr(config, 'LOG_FILE', str(log_file))
+    monkeypatch.setattr(config, 'LOG_JSON', False)
+    bot_logging.setup_logging(log_file=str(log_file))
+    try:
+        pool = Supervisor(2, handler_factory=_logging_handler)
+        pool.start()
+        for update_id in range(10):
+            pool.dispatch({'update_id': update_id, 'message': {'chat': {'id': update_id}}})
+        pool.stop(timeout=30)
+    finally:
+        bot_logging.shutdown_logging()
+
+    worker_logs = [tmp_path / f'bot.worker{index}.log' for index in range(2)]
+    assert all(os.path.exists(path) for path in worker_logs)
+    text = ''.join(path.read_text(encoding='utf-8') for path in worker_logs)
+    assert all(f"обработано обновление {update_id}" in text for update_id in range(10))
+
+
+def _recording_handler(path, stall_after=None):
+    def handle(raw_update):
+        if stall_after is not None and raw_update['update_id'] >= stall_after:
+            time.sleep(60)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(f"{raw_update['update_id']}\n")
+    return handle
+
+
+def _processed(path, count, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists() and len(path.read_text(encoding='utf-8').split()) >= count:
+            break
+        time.sleep(0.02)
+    return {int(line) for line in path.read_text(encoding='utf-8').split()} if path.exists() else set()
+
+
+def _update(update_id):
+    return {'update_id': update_id, 'message': {'chat': {'id': 0}}}
+
+
+@pytest.fixture
+def worker_logs(tmp_path, monkeypatch):
+    """Журналы рабочих процессов - во временном каталоге, а не рядом с ботом"""
+    monkeypatch.setattr(config, 'LOG_FILE', str(tmp_path / 'bot.log'))
+
+
+def test_full_queue_of_stalled_worker_does_not_block_dispatch(tmp_path, monkeypatch, worker_logs):
+    monkeypatch.setattr(supervisor, 'QUEUE_SIZE', 2)
+    handled = tmp_path / 'handled.txt'
+    pool = Supervisor(1, handler_factory=functools.partial(_recording_handler, str(handled), stall_after=0))
+    pool.start()
+    try:
+        started = time.monotonic()
+        results = [pool.dispatch(_update(update_id)) for update_id in range(10)]
+        elapsed = time.monotonic() - started
+    finally:
+        pool.stop(timeout=1)
+
+    assert elapsed < 1
+    assert results.count(False) == pool.dropped >= 10 - 1 - supervisor.QUEUE_SIZE
+    assert pool.restarts == 0
+
+
+def test_killed_worker_restarted_with_new_queue(tmp_path, monkeypatch, worker_logs):
+    monkeypatch.setattr(supervisor, 'QUEUE_SIZE', 2)
+    handled = tmp_path / 'handled.txt'
+    pool = Supervisor(1, handler_factory=functools.partial(_recording_handler, str(handled)))
+    pool.start()
+    try:
+        pool.dispatch(_update(0))
+        assert _processed(handled, 1) == {0}
+        # Процесс убит, пока ждет в get(): блокировка чтения старой очереди остается занятой
+        os.kill(pool.processes[0].pid, signal.SIGKILL)
+        pool.processes[0].join(5)
+
+        for update_id in range(1, 1 + supervisor.QUEUE_SIZE):
+            assert pool.dispatch(_update(update_id))
+        # Очередь полна: dispatch перезапускает процесс, и обновления снова обрабатываются
+        assert pool.dispatch(_update(100))
+        assert 100 in _processed(handled, 2)
+        assert pool.dispatch(_update(101))
+        processed = _processed(handled, 3)
+    finally:
+        pool.stop(timeout=5)
+
+    assert pool.restarts == 1
+    # Обновления из очереди убитого процесса потеряны, новые обрабатываются
+    assert processed == {0, 100, 101}
+
+
+def _write_rows(db_path, process_index, count, busy_timeout):
+    writer = WriteQueue(lambda: sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False),
+                        synchronous='NORMAL').start()
+    try:
+        for i in range(count):
+            writer.execute(lambda conn, value: conn.execute("INSERT INTO rows VALUES (?, ?)", value),
+                           (process_index, i))
+    finally:
+        writer.stop()
+    if writer.failed:
+        raise SystemExit(1)
+
+
+def test_worker_write_queues_share_db_through_busy_timeout(tmp_path):
+    """N + 1 процессов со своими очередями записи: блокировку SQLite ждут, а не получают ошибку"""
+    db_path = str(tmp_path / 'shop.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE rows (process INTEGER, value INTEGER)")
+    conn.close()
+
+    context = mp.get_context('fork')
+    processes = [context.Process(target=_write_rows, args=(db_path, index, 200, 10)) for index in range(5)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    assert [process.exitcode for process in processes] == [0] * 5
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0] == 5 * 200
+    conn.close()
@@ -0,0 +1,61 @@
+import json
+import os
+from types import SimpleNamespace
+
+import webapp_catalog
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalog.json')
+
+
+def test_published_catalog_matches_seed_database(bot):
+    """catalog.json рядом с index.html выгружен из той же БД, что создает бот"""
+    with open(CATALOG_PATH, encoding='utf-8') as f:
+        published = json.load(f)
+    conn = bot.get_db_connection()
+    try:
+        exported = webapp_catalog.export_catalog(conn)
+    finally:
+        conn.close()
+
+    assert published['products'] == exported['products']
+    assert published['categories'] == exported['categories']
+
+
+def test_catalog_ids_hydrate_to_same_names_and_prices(bot):
+    with open(CATALOG_PATH, encoding='utf-8') as f:
+        products = json.load(f)['products']
+
+    items, missing = bot.hydrate_cart([(product['id'], 1) for product in products])
+
+    assert missing == []
+    assert [(item['id'], item['name'], item['price']) for item in items] == [
+        (product['id'], product['name'], product['price']) for product in products
+    ]
+
+
+def test_legacy_items_are_repriced_from_catalog(bot):
+    user = SimpleNamespace(id=42, first_name='Test', username='test')
+    order_data = {
+        'items': [{'id': 1, 'name': 'Подделка', 'price': 1, 'quantity': 2}],
+        'total': 2,
+        'idempotency_key': 'legacy-1',
+    }
+
+    bot.create_order_web(100, user, order_data)
+
+    conn = bot.get_db_connection()
+    try:
+        order = conn.execute("SELECT products, total_price FROM orders WHERE idempotency_key = 'legacy-1'").fetchone()
+        price = conn.execute("SELECT price FROM products WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+    assert order['total_price'] == price * 2
+    assert json.loads(order['products'])[0]['price'] == price
+
+
+def test_malformed_legacy_items_are_rejected(bot):
+    user = SimpleNamespace(id=42, first_name='Test', username='test')
+
+    bot.create_order_web(100, user, {'items': [{'name': 'без id'}], 'idempotency_key': 'legacy-2'})
+
+    assert "Не удалось прочитать корзину" in bot.bot.sent[-1][1]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Каталог для Web App (catalog.json)
+
+Web App - статическая страница (index.html), поэтому список товаров она
+получает из файла catalog.json, который лежит рядом с ней. Файл
+выгружается из БД бота: id, названия и цены на странице совпадают с
+каталогом, по которому бот пересчитывает заказ (hydrate_cart).
+
+После изменения каталога (supplier_sync.py, миграции) файл нужно
+выгрузить заново и опубликовать вместе с index.html. Бот в любом случае
+берет цены из БД: устаревший файл влияет только на показ цены в Web App.
+
+Запуск:
+    python webapp_catalog.py                     # catalog.json из DB_PATH
+    python webapp_catalog.py --db shop.db --out site/catalog.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from catalog import SQL_CATALOG_VERSION
+from queries import register_query
+
+SQL_WEBAPP_PRODUCTS = register_query('webapp_products', """
+    SELECT p.id, p.name, p.price, p.description, p.in_stock, c.name AS category
+    FROM products p
+    JOIN categories c ON c.id = p.category_id
+    ORDER BY p.id
+""", allow_scan=True)
+
+SQL_WEBAPP_CATEGORIES = register_query('webapp_categories', """
+    SELECT c.id, c.name, c.icon, COUNT(p.id) AS count
+    FROM categories c
+    LEFT JOIN products p ON p.category_id = c.id
+    GROUP BY c.id
+    ORDER BY c.id
+""", allow_scan=True)
+
+
+def export_catalog(conn):
+    """Каталог в формате catalog.json: версия, категории и товары"""
+    version = conn.execute(SQL_CATALOG_VERSION).fetchone()[0]
+    categories = [
+        {'id': row[0], 'name': row[1], 'icon': row[2] or '', 'count': row[3]}
+        for row in conn.execute(SQL_WEBAPP_CATEGORIES)
+    ]
+    products = [
+        {'id': row[0], 'name': row[1], 'price': row[2], 'description': row[3] or '',
+         'in_stock': bool(row[4]), 'category': row[5]}
+        for row in conn.execute(SQL_WEBAPP_PRODUCTS)
+    ]
+    return {'version': version, 'categories': categories, 'products': products}
+
+
+def write_catalog(conn, path):
+    """Запись catalog.json (через временный файл, страница не прочитает половину)"""
+    data = export_catalog(conn)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+    os.replace(tmp_path, path)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="путь к файлу БД (по умолчанию из config)")
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json'))
+    args = parser.parse_args()
+
+    import computer_parts_bot as bot
+    if args.db:
+        bot.DB_PATH = args.db
+    bot.setup_database()
+    conn = bot.get_db_connection()
+    try:
+        data = write_catalog(conn, args.out)
+    finally:
+        conn.close()
+    print(f"✅ {args.out}: {len(data['products'])} товаров, {len(data['categories'])} категорий")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())